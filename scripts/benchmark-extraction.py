@@ -0,0 +1,167 @@
+#! /usr/bin/env python
+"""
+Measures wall time and peak memory of datasets extraction on a synthetic
+state, e.g. "python scripts/benchmark-extraction.py --activities 1000000".
+Activities are split as 40% commits, 40% pull requests activity (PRs,
+approvals and comments) and 20% Jira activity (items and comments).
+"""
+
+import argparse
+import datetime
+import gc
+import random
+import resource
+import time
+
+from codoscope.datasets import Datasets
+from codoscope.sources import bitbucket, git, jira
+from codoscope.state import StateModel
+
+USERS_COUNT = 500
+
+# rows extracted per pull request (PR, approval, comments) and per Jira item
+PR_COMMENTS_COUNT = 6
+JIRA_COMMENTS_COUNT = 3
+
+
+def build_state(activities: int, seed: int) -> StateModel:
+    rnd = random.Random(seed)
+    timezones = [datetime.timezone(datetime.timedelta(hours=x)) for x in (-5, 0, 1, 2, 3)]
+    base = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    users = ["User %d" % i for i in range(USERS_COUNT)]
+
+    commits_count = activities * 4 // 10
+    prs_count = activities * 4 // 10 // (2 + PR_COMMENTS_COUNT)
+    items_count = activities * 2 // 10 // (1 + JIRA_COMMENTS_COUNT)
+
+    state = StateModel()
+
+    repo = git.RepoModel()
+    for i in range(commits_count):
+        user = rnd.choice(users)
+        timestamp = (base + datetime.timedelta(minutes=i * 7)).astimezone(rnd.choice(timezones))
+        changed_files = {
+            "src/module%d/file%d.py"
+            % (rnd.randrange(200), rnd.randrange(50)): git.ChangedFileStatModel(
+                rnd.randrange(100), rnd.randrange(50)
+            )
+            for _ in range(3)
+        }
+        hexsha = "%040x" % rnd.getrandbits(160)
+        repo.commits_map[hexsha] = git.CommitModel(
+            hexsha,
+            user,
+            "%s@example.com" % user.lower().replace(" ", "."),
+            timestamp,
+            timestamp,
+            "commit message %d\n" % i,
+            git.CommitStats(changed_files),
+            ["%040x" % i],
+        )
+    state.sources["repo"] = repo
+
+    bitbucket_state = bitbucket.BitbucketState()
+    bitbucket_repo = bitbucket_state.projects_map.setdefault(
+        "project", bitbucket.ProjectModel()
+    ).repositories_map.setdefault("repo", bitbucket.RepositoryModel())
+    bitbucket_actors = [
+        bitbucket_state.actors.intern(bitbucket.ActorModel("acc-%d" % i, user))
+        for i, user in enumerate(users)
+    ]
+    for i in range(prs_count):
+        timestamp = base + datetime.timedelta(minutes=i * 50)
+        bitbucket_repo.pull_requests_map[i] = bitbucket.PullRequestModel(
+            i,
+            "https://bitbucket.org/pr/%d" % i,
+            rnd.choice(bitbucket_actors),
+            "title %d" % i,
+            "description",
+            "feature",
+            "master",
+            "MERGED",
+            [bitbucket.PullRequestParticipantModel(rnd.choice(bitbucket_actors), True, timestamp)],
+            [
+                bitbucket.CommentModel(
+                    "%d-%d" % (i, k), rnd.choice(bitbucket_actors), "comment %d" % k, timestamp
+                )
+                for k in range(PR_COMMENTS_COUNT)
+            ],
+            timestamp,
+            timestamp,
+        )
+    state.sources["bitbucket"] = bitbucket_state
+
+    jira_state = jira.JiraState()
+    jira_actors = [
+        jira_state.actors.intern(jira.ActorModel("acc-%d" % i, user, None))
+        for i, user in enumerate(users)
+    ]
+    for i, user in enumerate(users):
+        jira_state.users_map["acc-%d" % i] = jira.UserModel("acc-%d" % i, user, None, True, None)
+    for i in range(items_count):
+        timestamp = base + datetime.timedelta(minutes=i * 50)
+        jira_state.items_map[str(i)] = jira.JiraItemModel(
+            str(i),
+            "PRJ-%d" % i,
+            "Bug",
+            "summary %d" % i,
+            "description",
+            "Done",
+            "Done",
+            rnd.choice(jira_actors),
+            None,
+            None,
+            None,
+            None,
+            [
+                jira.JiraCommentModel(
+                    "%d-%d" % (i, k), "message", rnd.choice(jira_actors), timestamp
+                )
+                for k in range(JIRA_COMMENTS_COUNT)
+            ],
+            [],
+            timestamp,
+            timestamp,
+        )
+    state.sources["jira"] = jira_state
+
+    return state
+
+
+def get_rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    raise RuntimeError("unable to read RSS")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--activities", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    state = build_state(args.activities, args.seed)
+    gc.collect()
+
+    rss_before = get_rss_mb()
+    start_time = time.perf_counter()
+    datasets = Datasets.extract(state)
+    elapsed = time.perf_counter() - start_time
+    # peak RSS (in KB on Linux) of the process so far, which is reached during
+    # extraction as the state is built beforehand
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    activities = sum(len(df) for df in datasets.get_activity_data_frames().values())
+    datasets_size = sum(
+        df.memory_usage(deep=True).sum() for df in datasets.get_all_data_frames().values()
+    )
+    print(
+        "activities: %d, extraction: %.1fs, peak extra RSS: %.0fMB, datasets: %.0fMB"
+        % (activities, elapsed, peak_rss - rss_before, datasets_size / 2**20)
+    )
+
+
+if __name__ == "__main__":
+    main()
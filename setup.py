@@ -19,6 +19,7 @@ if __name__ == "__main__":
             "Jinja2",
             "Faker",
             "pathvalidate",
+            "pyarrow",
         ],
         entry_points={
             "console_scripts": ["codoscope=codoscope.cli:entrypoint"],
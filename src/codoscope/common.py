@@ -24,6 +24,20 @@ WEEKDAY_ORDER = [
 ]
 
 
+def with_category(series: pandas.Series, value: str) -> pandas.Series:
+    """
+    Makes sure that given value can be assigned to categorical series, keeping
+    categories sorted. Non categorical series are returned as is.
+    """
+    if not isinstance(series.dtype, pandas.CategoricalDtype) or value in series.cat.categories:
+        return series
+    return series.cat.set_categories(sorted([*series.cat.categories, value]))
+
+
+def fill_na(series: pandas.Series, value: str) -> pandas.Series:
+    return with_category(series, value).fillna(value)
+
+
 def date_time_minutes_offset(datetime):
     time = datetime.time()
     return time.hour * 60 + time.minute
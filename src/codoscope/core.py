@@ -1,22 +1,33 @@
+import collections
+import concurrent.futures
+import hashlib
+import json
 import logging
+import os.path
+from typing import Callable, Iterable
 
-from codoscope.config import read_mandatory
-from codoscope.datasets import Datasets
+from codoscope.config import read_optional
+from codoscope.datasets import Datasets, get_source_types
 from codoscope.exceptions import ConfigError
-from codoscope.processors.anonymize import AnonymizingProcessor
-from codoscope.processors.expand_references import ExpandReferencesProcessor
-from codoscope.processors.remap_users import RemapUsersProcessor
+from codoscope.processors.common import ALL_COLUMNS, ColumnRef
+from codoscope.processors.pipeline import ProcessorsPipeline
 from codoscope.reports.common import ReportType
 from codoscope.reports.registry import REPORTS_BY_TYPE
+from codoscope.snapshot import load_snapshot, save_snapshot
 from codoscope.sources.bitbucket import ingest_bitbucket
 from codoscope.sources.git import RepoModel, ingest_git_repo
 from codoscope.sources.jira import ingest_jira
-from codoscope.state import SourceState, StateModel
+from codoscope.state import SourceState, SourceType, StateModel
+from codoscope.state_store import StateStoreBase, open_state_store
 
 LOGGER = logging.getLogger(__name__)
 
 
-def ingest_source(source_config: dict, current_state: SourceState | None) -> SourceState:
+def ingest_source(
+    source_config: dict,
+    current_state: SourceState | None,
+    checkpoint: Callable[[SourceState], None] | None = None,
+) -> SourceState:
     source_name = source_config["name"]
 
     LOGGER.info('ingesting "%s" source', source_name)
@@ -29,6 +40,7 @@ def ingest_source(source_config: dict, current_state: SourceState | None) -> Sou
             source_config["path"],
             source_config["branches"],
             source_config.get("ingestion-limit"),
+            checkpoint,
         )
     elif source_config["type"] == "bitbucket":
         source_state = ingest_bitbucket(
@@ -46,64 +58,265 @@ def ingest_source(source_config: dict, current_state: SourceState | None) -> Sou
     return source_state
 
 
-def ingest(ingestion_config: dict, state: StateModel):
-    for source_config in ingestion_config["sources"]:
-        source_name = source_config["name"]
+DEFAULT_INGESTION_MAX_WORKERS = 1
+
+
+def ingest(ingestion_config: dict, state: StateModel, store: StateStoreBase | None = None):
+    """
+    Ingests enabled sources using a thread pool (ingestion is dominated by git
+    processes and HTTP calls) bounded by "max-workers" and optionally by
+    per source type limits from "max-workers-per-type". Failure of a single
+    source is logged and does not prevent other sources from being ingested.
+    Every ingested source is checkpointed into the store when it is given,
+    long running git ingestion is also checkpointed periodically.
+    """
+    max_workers = read_optional(ingestion_config, "max-workers", DEFAULT_INGESTION_MAX_WORKERS)
+    max_workers_per_type: dict[str, int] = read_optional(
+        ingestion_config, "max-workers-per-type", {}
+    )
+
+    if max_workers < 1 or any(limit < 1 for limit in max_workers_per_type.values()):
+        raise ConfigError("ingestion workers limits are expected to be positive")
 
+    pending: list[dict] = []
+    for source_config in ingestion_config["sources"]:
         if not source_config.get("enabled", True):
-            LOGGER.warning('skip disabled "%s" source', source_name)
+            LOGGER.warning('skip disabled "%s" source', source_config["name"])
             continue
+        pending.append(source_config)
+
+    running: dict[concurrent.futures.Future, dict] = {}
+    running_per_type: collections.Counter[str] = collections.Counter()
+    failed_source_names: list[str] = []
+
+    def create_checkpoint(source_name: str) -> Callable[[SourceState], None] | None:
+        if store is None:
+            return None
+
+        def checkpoint(source_state: SourceState) -> None:
+            state.sources[source_name] = source_state
+            store.checkpoint(state, source_name)
+
+        return checkpoint
+
+    def can_schedule(source_config: dict) -> bool:
+        source_type = source_config["type"]
+        type_limit = max_workers_per_type.get(source_type, max_workers)
+        # sources sharing the same name share the same state
+        is_same_name_running = any(
+            config["name"] == source_config["name"] for config in running.values()
+        )
+        return running_per_type[source_type] < type_limit and not is_same_name_running
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="ingest"
+    ) as executor:
+        while pending or running:
+            for source_config in list(pending):
+                if len(running) >= max_workers:
+                    break
+                if not can_schedule(source_config):
+                    continue
+                pending.remove(source_config)
+                current_state = state.sources.get(source_config["name"])
+                future = executor.submit(
+                    ingest_source,
+                    source_config,
+                    current_state,
+                    create_checkpoint(source_config["name"]),
+                )
+                running[future] = source_config
+                running_per_type[source_config["type"]] += 1
+
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
 
-        current_state = state.sources.get(source_name)
-        new_state = ingest_source(source_config, current_state)
-        state.sources[source_name] = new_state
+            for future in done:
+                source_config = running.pop(future)
+                source_name = source_config["name"]
+                running_per_type[source_config["type"]] -= 1
+                try:
+                    state.sources[source_name] = future.result()
+                    if store is not None:
+                        store.checkpoint(state, source_name)
+                except Exception as err:
+                    LOGGER.error(
+                        'ingestion of "%s" source failed! %r', source_name, err, exc_info=err
+                    )
+                    failed_source_names.append(source_name)
 
+    if failed_source_names:
+        LOGGER.error(
+            "ingestion failed for %d source(s): %s",
+            len(failed_source_names),
+            ", ".join(failed_source_names),
+        )
 
-def run_processors(config: dict, datasets: Datasets) -> None:
-    for processor_config in config.get("processors", []):
-        processor_name = processor_config["name"]
-        processor_type = processor_config["type"]
 
-        if not processor_config.get("enabled", True):
-            LOGGER.warning('skip disabled "%s" processor', processor_name)
+def get_consumed_columns(config: dict) -> set[ColumnRef]:
+    consumed: set[ColumnRef] = set()
+    for report_config in config.get("reports", []):
+        if not report_config.get("enabled", True):
             continue
+        report_class = REPORTS_BY_TYPE.get(ReportType(report_config["type"]))
+        if report_class is not None:
+            consumed.update((name, ALL_COLUMNS) for name in report_class.get_consumed_datasets())
+    return consumed
+
+
+def create_processors_pipeline(config: dict, skip_unused: bool = True) -> ProcessorsPipeline:
+    """
+    Creates pipeline of the enabled processors, the ones which output is not
+    used by the enabled reports are skipped unless "skip_unused" is off.
+    """
+    return ProcessorsPipeline(
+        config.get("processors", []),
+        get_consumed_columns(config) if skip_unused else None,
+    )
+
+
+def run_processors(config: dict, datasets: Datasets, skip_unused: bool = True) -> None:
+    create_processors_pipeline(config, skip_unused).execute(datasets)
+
+
+def get_required_source_types(config: dict, pipeline: ProcessorsPipeline) -> set[SourceType]:
+    """
+    Returns types of the sources which datasets are consumed by the enabled
+    reports or read by the processors, other sources are not loaded.
+    """
+    dataset_names = {name for name, _ in get_consumed_columns(config)}
+    dataset_names.update(name for name, _ in pipeline.get_reads())
+    return get_source_types(dataset_names)
+
+
+def get_extracted_datasets_fingerprint(
+    state_fingerprint: str | None, source_types: list[SourceType] | None
+) -> str | None:
+    """
+    Extracted datasets depend both on the state and on the sources they
+    were extracted from.
+    """
+    if state_fingerprint is None:
+        return None
+    data = json.dumps([state_fingerprint, source_types])
+    return hashlib.sha256(data.encode()).hexdigest()
+
 
-        LOGGER.info('handling "%s" processor', processor_name)
-        if processor_type == "remap-users":
-            processor = RemapUsersProcessor(processor_config)
-            processor.execute(datasets)
-        elif processor_type == "anonymize":
-            processor = AnonymizingProcessor(processor_config)
-            processor.execute(datasets)
-        elif processor_type == "expand-references":
-            processor = ExpandReferencesProcessor(processor_config)
-            processor.execute(datasets)
-        else:
-            raise ConfigError('unknown processor type: "%s"' % processor_type)
+def extract_datasets(
+    config: dict,
+    store: StateStoreBase,
+    state: StateModel | None,
+    source_types: Iterable[SourceType] | None = None,
+) -> Datasets:
+    """
+    Extracts datasets from the state (optionally restricted to the sources of
+    the given types) or loads them from the datasets snapshot (if configured)
+    when the state was not loaded yet and did not change since the snapshot
+    was taken.
+    """
+    snapshot_path = read_optional(config, "datasets-snapshot-path")
+    if snapshot_path:
+        snapshot_path = os.path.join(snapshot_path, "extracted")
+
+    if source_types is not None:
+        source_types = sorted(set(source_types))
+
+    if snapshot_path and state is None:
+        fingerprint = get_extracted_datasets_fingerprint(store.get_fingerprint(), source_types)
+        datasets = load_snapshot(snapshot_path, fingerprint)
+        if datasets is not None:
+            return datasets
+
+    if state is None:
+        state = store.load(source_types) or StateModel()
+    elif source_types is not None:
+        # datasets (and the snapshot) are the same as for the restricted load
+        state = state.copy_with_sources(source_types)
+
+    datasets = Datasets.extract(state)
+    LOGGER.info("datasets extraction completed")
+
+    if snapshot_path:
+        fingerprint = get_extracted_datasets_fingerprint(store.get_fingerprint(), source_types)
+        save_snapshot(datasets, snapshot_path, fingerprint)
+
+    return datasets
+
+
+def get_processed_datasets_fingerprint(
+    pipeline: ProcessorsPipeline, extracted_fingerprint: str | None
+) -> str | None:
+    """
+    Processed datasets depend both on the extracted datasets and on the
+    processors configuration, so any change to either of them invalidates
+    the snapshot.
+    """
+    if extracted_fingerprint is None:
+        return None
+    data = json.dumps(
+        [extracted_fingerprint, pipeline.get_configs()],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def prepare_datasets(config: dict, store: StateStoreBase, state: StateModel | None) -> Datasets:
+    """
+    Returns datasets with all the processors applied, reusing the processed
+    datasets snapshot (if configured) when neither the state nor processors
+    configuration changed since it was taken.
+    """
+    snapshot_path = read_optional(config, "datasets-snapshot-path")
+    if snapshot_path:
+        snapshot_path = os.path.join(snapshot_path, "processed")
+
+    pipeline = create_processors_pipeline(config)
+    source_types = sorted(get_required_source_types(config, pipeline))
+
+    def get_fingerprint() -> str | None:
+        return get_processed_datasets_fingerprint(
+            pipeline, get_extracted_datasets_fingerprint(store.get_fingerprint(), source_types)
+        )
+
+    if snapshot_path and state is None:
+        datasets = load_snapshot(snapshot_path, get_fingerprint())
+        if datasets is not None:
+            return datasets
+
+    datasets = extract_datasets(config, store, state, source_types)
+
+    pipeline.execute(datasets)
+
+    if snapshot_path:
+        save_snapshot(datasets, snapshot_path, get_fingerprint())
+
+    return datasets
 
 
 def process(config: dict, skip_ingestion: bool = False):
-    state_path = read_mandatory(config, "state-path")
-    state = StateModel.load(state_path) or StateModel()
+    store = open_state_store(config)
+
+    # state is only loaded when it is needed
+    state: StateModel | None = None
 
     ingestion_config = config.get("ingestion", {})
     if ingestion_config.get("enabled", True) and not skip_ingestion:
+        # all the sources are loaded, as the state is saved back as a whole
+        state = store.load() or StateModel()
         ingestion_rounds = ingestion_config.get("rounds", 1)
         for round_idx in range(1, ingestion_rounds + 1):
             LOGGER.info("ingestion round #%d of %d", round_idx, ingestion_rounds)
             try:
-                ingest(ingestion_config, state)
-                state.save(state_path)
+                ingest(ingestion_config, state, store)
+                store.save(state)
             except Exception as err:
                 LOGGER.error("ingestion round #%d failed! %r", round_idx, err, exc_info=True)
     else:
         LOGGER.warning("skipped ingestion as requested")
 
-    # extract data sets from the state
-    datasets = Datasets.extract(state)
-    LOGGER.info("datasets extraction completed")
-
-    run_processors(config, datasets)
+    datasets = prepare_datasets(config, store, state)
 
     # render reports
     for report_config in config.get("reports", []):
@@ -119,6 +332,10 @@ def process(config: dict, skip_ingestion: bool = False):
         if report_class is None:
             raise ConfigError('unable to find report type "%s"', report_config["type"])
 
+        # such reports (e.g. internal state) cover all the sources
+        if report_class.requires_state() and state is None:
+            state = store.load() or StateModel()
+
         report_instance = report_class()
         report_instance.generate(report_config, state, datasets)
 
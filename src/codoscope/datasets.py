@@ -1,36 +1,154 @@
 import hashlib
 import logging
-import math
+from typing import Iterable
 
+import numpy
 import pandas
 
-from codoscope.sources.bitbucket import BitbucketState
+from codoscope.exceptions import InvalidOperationError
+from codoscope.sources.bitbucket import ActorModel, BitbucketState
 from codoscope.sources.git import RepoModel
 from codoscope.sources.jira import JiraState
-from codoscope.state import StateModel
+from codoscope.state import SourceType, StateModel
 
 LOGGER = logging.getLogger(__name__)
 
+ACTIVITY_DATASETS = ["commits", "bitbucket", "jira"]
+ALL_DATASETS = ACTIVITY_DATASETS + ["commit_files", "reviews", "jira_users", "bitbucket_users"]
+
+# type of the sources every dataset is extracted from
+DATASETS_SOURCE_TYPES = {
+    "commits": SourceType.GIT,
+    "commit_files": SourceType.GIT,
+    "bitbucket": SourceType.BITBUCKET,
+    "reviews": SourceType.BITBUCKET,
+    "bitbucket_users": SourceType.BITBUCKET,
+    "jira": SourceType.JIRA,
+    "jira_users": SourceType.JIRA,
+}
+
+
+def get_source_types(dataset_names: Iterable[str]) -> set[SourceType]:
+    """
+    Returns types of the sources needed to extract the given datasets.
+    """
+    return {DATASETS_SOURCE_TYPES[name] for name in dataset_names}
+
 
 class Datasets:
     def __init__(
         self,
         commits_df: pandas.DataFrame,
+        commit_files_df: pandas.DataFrame,
         bitbucket_df: pandas.DataFrame,
         jira_df: pandas.DataFrame,
         jira_users_df: pandas.DataFrame,
+        bitbucket_users_df: pandas.DataFrame,
         reviews_df: pandas.DataFrame,
     ) -> None:
         self.commits_df: pandas.DataFrame = commits_df
+        self.commit_files_df: pandas.DataFrame = commit_files_df
         self.bitbucket_df: pandas.DataFrame = bitbucket_df
         self.jira_df: pandas.DataFrame = jira_df
         self.jira_users_df: pandas.DataFrame = jira_users_df
+        self.bitbucket_users_df: pandas.DataFrame = bitbucket_users_df
         self.reviews_df: pandas.DataFrame = reviews_df
 
+        # memoized concatenations of activity data frames along with the data
+        # frames those were built from (to detect reassignment of attributes)
+        self._combined_activity: dict[str, pandas.DataFrame] = {}
+        self._combined_activity_sources: tuple[pandas.DataFrame, ...] = ()
+
+    def _get_combined_activity(self, core_only: bool) -> pandas.DataFrame:
+        sources = tuple(self.get_activity_data_frames().values())
+        if len(sources) != len(self._combined_activity_sources) or any(
+            x is not y for x, y in zip(sources, self._combined_activity_sources)
+        ):
+            self._combined_activity = {}
+            self._combined_activity_sources = sources
+
+        key = "core" if core_only else "all"
+        if key not in self._combined_activity:
+            LOGGER.debug('combining activity data frames ("%s")', key)
+            data_frames = [df[ACTIVITY_CORE_COLUMNS] if core_only else df for df in sources]
+            df = pandas.concat(unify_categories(data_frames))
+            df.sort_values(
+                by="timestamp",
+                ascending=True,
+                na_position="first",
+                inplace=True,
+                key=timestamp_sort_key,
+            )
+            self._combined_activity[key] = df
+
+        # modifications of the shallow copy do not affect the memoized data
+        # frame thanks to copy-on-write
+        return self._combined_activity[key].copy(deep=False)
+
+    def get_activity(self, detail_columns: Iterable[str] = ()) -> pandas.DataFrame:
+        """
+        Returns narrow table with the columns common for all the activity
+        (sorted by timestamp) along with the requested source specific detail
+        columns (missing for the activity of other sources).
+        """
+        return self.join_details(self._get_combined_activity(core_only=True), detail_columns)
+
+    def join_details(self, df: pandas.DataFrame, detail_columns: Iterable[str]) -> pandas.DataFrame:
+        """
+        Joins given source specific columns to the activity table (by ID).
+        """
+        detail_columns = [x for x in dict.fromkeys(detail_columns) if x not in df.columns]
+        if not detail_columns:
+            return df
+
+        details_dfs = []
+        for source_df in self.get_activity_data_frames().values():
+            columns = [x for x in detail_columns if x in source_df.columns]
+            if columns:
+                details_dfs.append(source_df[["activity_id", *columns]])
+
+        if details_dfs:
+            details_df = pandas.concat(details_dfs).set_index("activity_id")
+        else:
+            details_df = pandas.DataFrame(index=pandas.Index([], name="activity_id"))
+
+        # otherwise rows would be multiplied and get details of other activity
+        if not details_df.index.is_unique:
+            duplicated_ids = details_df.index[details_df.index.duplicated()].unique()
+            raise InvalidOperationError(
+                "activity IDs are not unique (%d duplicated, e.g. %d)"
+                % (len(duplicated_ids), duplicated_ids[0])
+            )
+
+        return df.join(details_df.reindex(columns=detail_columns), on="activity_id")
+
+    def get_detail_columns(self) -> list[str]:
+        columns: dict[str, None] = {}
+        for source_df in self.get_activity_data_frames().values():
+            columns.update((x, None) for x in source_df.columns if x not in ACTIVITY_CORE_COLUMNS)
+        return list(columns)
+
+    def get_referenced_detail_columns(self, expr: str | None) -> list[str]:
+        """
+        Returns detail columns mentioned in the given (filter) expression.
+        """
+        if not expr:
+            return []
+        return [x for x in self.get_detail_columns() if x in expr]
+
     def get_all_activity(self) -> pandas.DataFrame:
-        df = pandas.concat(self.get_activity_data_frames().values())
-        df.sort_values(by="timestamp", ascending=True, na_position="first", inplace=True)
-        return df
+        """
+        Returns all the activity data frames combined (all the columns) and
+        sorted by timestamp. Prefer get_activity() with required columns only.
+        """
+        return self._get_combined_activity(core_only=False)
+
+    def invalidate(self) -> None:
+        """
+        Must be called after the data frames were modified in place.
+        """
+        self._combined_activity = {}
+        self._combined_activity_sources = ()
 
     def get_activity_data_frames(self) -> dict[str, pandas.DataFrame]:
         return {
@@ -42,6 +160,7 @@ class Datasets:
     def get_all_data_frames(self) -> dict[str, pandas.DataFrame]:
         return dict(
             self.get_activity_data_frames(),
+            commit_files=self.commit_files_df,
             reviews=self.reviews_df,
         )
 
@@ -50,352 +169,535 @@ class Datasets:
         LOGGER.info("extracting datasets...")
         return Datasets(
             commits_df=extract_commits(state),
+            commit_files_df=extract_commit_files(state),
             bitbucket_df=extract_bitbucket(state),
             jira_df=extract_jira(state),
             jira_users_df=extract_jira_users(state),
+            bitbucket_users_df=extract_bitbucket_users(state),
             reviews_df=extract_reviews(state),
         )
 
 
+def timestamp_sort_key(column: pandas.Series) -> pandas.Series:
+    # comparing timezone aware datetime objects having different timezones is
+    # very slow, so they are sorted as UTC datetime64 values instead
+    return pandas.to_datetime(column, utc=True)
+
+
+def unify_categories(data_frames: list[pandas.DataFrame]) -> list[pandas.DataFrame]:
+    """
+    Concatenation of categorical columns only keeps the categorical type when
+    categories match exactly, so they are extended to the union beforehand.
+    """
+    categories: dict[str, set] = {}
+    for df in data_frames:
+        for column in df.columns:
+            if isinstance(df[column].dtype, pandas.CategoricalDtype):
+                categories.setdefault(column, set()).update(df[column].cat.categories)
+
+    # values of the columns which are not categorical in some data frames (e.g.
+    # overwritten by the processors) are not lost
+    for df in data_frames:
+        for column, values in categories.items():
+            if column in df.columns and not isinstance(df[column].dtype, pandas.CategoricalDtype):
+                values.update(df[column].dropna().unique())
+
+    result = []
+    for df in data_frames:
+        df = df.copy(deep=False)
+        for column, values in categories.items():
+            if column in df.columns:
+                df[column] = df[column].astype(pandas.CategoricalDtype(sorted(values)))
+        result.append(df)
+    return result
+
+
+# low cardinality columns are categorical to save memory
 BASE_ACTIVITY_SCHEMA = {
-    "source_name": "string",
-    "source_type": "string",
+    "source_name": "category",
+    "source_type": "category",
     "source_subtype": "string",
-    "activity_id": "string",
-    "activity_type": "string",
+    # 64-bit hash, see build_id
+    "activity_id": "uint64",
+    "activity_type": "category",
     # "timestamp": "datetime64[ns]",
     "timestamp": "object",
-    "user": "string",
+    "user": "category",
     "user_email": "string",
     "size_class": "int",
 }
 
+# columns shared by all the activity data sets
+ACTIVITY_CORE_COLUMNS = list(BASE_ACTIVITY_SCHEMA)
+
+COMMITS_SCHEMA = dict(
+    BASE_ACTIVITY_SCHEMA,
+    **{
+        "commit_sha": "string",
+        "commit_message": "string",
+        # note: Int64 can hold NaN values (as opposed to int)
+        "commit_added_lines": "Int64",
+        "commit_removed_lines": "Int64",
+        "commit_changed_lines": "Int64",
+        "commit_is_merge_commit": "bool",
+    },
+)
+
+# long format table with files changed by commits (joinable by source_name
+# and activity_id)
+COMMIT_FILES_SCHEMA = {
+    "source_name": "category",
+    "activity_id": "uint64",
+    "path": "category",
+    "added": "int64",
+    "deleted": "int64",
+}
 
-def build_id(*components) -> str:
+BITBUCKET_SCHEMA = dict(
+    BASE_ACTIVITY_SCHEMA,
+    **{
+        "bitbucket_project_name": "string",
+        "bitbucket_repo_name": "string",
+        "bitbucket_pr_title": "string",
+        "bitbucket_pr_description": "string",
+        "bitbucket_pr_id": "Int64",
+        "bitbucket_pr_comment_id": "string",
+        "bitbucket_pr_comment": "string",
+    },
+)
+
+JIRA_SCHEMA = dict(
+    BASE_ACTIVITY_SCHEMA,
+    **{
+        "jira_item_key": "string",
+        "jira_description": "string",
+        "jira_summary": "string",
+        "jira_comment_id": "string",
+        "jira_message": "string",
+    },
+)
+
+JIRA_USERS_SCHEMA = {
+    "account_id": "string",
+    "display_name": "string",
+    "email": "string",
+}
+
+BITBUCKET_USERS_SCHEMA = {
+    "account_id": "string",
+    "display_name": "string",
+}
+
+REVIEWS_SCHEMA = {
+    "source_name": "string",
+    "source_type": "string",
+    "reviewer_user": "string",
+    "reviewee_user": "string",
+    "is_self_review": "bool",
+    "has_approved": "bool",
+    "timestamp": "object",
+    "bitbucket_project_name": "string",
+    "bitbucket_repo_name": "string",
+    "bitbucket_pr_title": "string",
+    "bitbucket_pr_id": "Int64",
+    "bitbucket_pr_created_date": "object",
+}
+
+
+def build_id(*components) -> int:
+    """
+    Builds compact (64-bit) activity identifier out of the given components,
+    which must identify the activity across all the sources (e.g. include
+    source name, as the same item can be ingested by multiple sources).
+    """
     data = "_".join(str(x) for x in components)
-    return hashlib.sha256(data.encode()).hexdigest()
+    return int.from_bytes(hashlib.blake2b(data.encode(), digest_size=8).digest(), "big")
+
+
+def build_commit_id(source_id: int, hexsha: str) -> int:
+    # commit hash is already uniformly distributed, no need to hash it again,
+    # it is only combined with the ID of the source (the same commit can be
+    # ingested from multiple repositories, e.g. forks)
+    return int(hexsha[:16], 16) ^ source_id
+
+
+class ColumnsBuilder:
+    """
+    Accumulates data set rows column by column (instead of dict per row) and
+    builds the data frame with every column converted straight into its
+    final type. Scalar values are broadcasted to all the added rows and the
+    columns which were not given are filled with missing values.
+    """
+
+    def __init__(self, schema: dict[str, str]) -> None:
+        self.schema: dict[str, str] = schema
+        self.columns: dict[str, list] = {name: [] for name in schema}
+        self.size: int = 0
+
+    def add_rows(self, count: int, **values) -> None:
+        for name, column in self.columns.items():
+            value = values.get(name)
+            if isinstance(value, list):
+                assert len(value) == count, name
+                column.extend(value)
+            else:
+                column.extend([value] * count)
+        self.size += count
+
+    def build(self) -> pandas.DataFrame:
+        data = {}
+        for name, dtype in self.schema.items():
+            values = self.columns[name]
+            if dtype == "category":
+                data[name] = pandas.Categorical(values)
+            elif dtype == "object":
+                column = numpy.empty(len(values), dtype="object")
+                column[:] = values
+                # explicit type, otherwise pandas infers datetime64 for the
+                # datetime objects sharing the same timezone
+                data[name] = pandas.Series(column, dtype="object", copy=False)
+            elif dtype == "bool":
+                data[name] = numpy.array([bool(x) for x in values], dtype="bool")
+            else:
+                data[name] = pandas.array(values, dtype=dtype)
+        return pandas.DataFrame(data, columns=list(self.schema))
+
+
+def compute_commit_size_class(changed_lines: list[int]) -> numpy.ndarray:
+    size_class = 5 + 3 * numpy.log10(numpy.array(changed_lines, dtype="float64") + 1)
+    return numpy.clip(size_class, 5.0, 20.0).astype("int")
 
 
 def extract_commits(state: StateModel) -> pandas.DataFrame:
-    schema = dict(
-        BASE_ACTIVITY_SCHEMA,
-        **{
-            "commit_sha": "string",
-            "commit_message": "string",
-            # note: Int64 can hold NaN values (as opposed to int)
-            "commit_added_lines": "Int64",
-            "commit_removed_lines": "Int64",
-            "commit_changed_lines": "Int64",
-            "commit_changed_files_map": "object",
-            "commit_is_merge_commit": "bool",
-        }
-    )
+    builder = ColumnsBuilder(COMMITS_SCHEMA)
 
-    data = []
     for source_name, source in state.sources.items():
-        if isinstance(source, RepoModel):
-            for commit in source.commits_map.values():
-                data.append(
-                    {
-                        "source_name": source_name,
-                        "source_type": source.source_type.value,
-                        "source_subtype": None,
-                        "activity_id": build_id("git", commit.hexsha),
-                        "activity_type": "commit",
-                        "timestamp": commit.committed_datetime,
-                        "user": commit.author_name,
-                        "user_email": commit.author_email,
-                        "commit_sha": commit.hexsha,
-                        "commit_message": commit.message,
-                        "commit_added_lines": commit.stats.total_insertions,
-                        "commit_removed_lines": commit.stats.total_deletions,
-                        "commit_changed_lines": commit.stats.total_changed_lines,
-                        "commit_changed_files_map": {
-                            k: {
-                                "added": v.insertions,
-                                "deleted": v.deletions,
-                            }
-                            for k, v in commit.stats.changed_files.items()
-                        },
-                        "commit_is_merge_commit": commit.is_merge_commit,
-                        "size_class": max(
-                            5.0,
-                            min(
-                                20.0,
-                                5 + 3 * math.log(commit.stats.total_changed_lines + 1, 10),
-                            ),
-                        ),
-                    }
-                )
+        if not isinstance(source, RepoModel):
+            continue
+
+        commits = list(source.commits_map.values())
+        changed_lines = [commit.stats.total_changed_lines for commit in commits]
+        source_id = build_id("git", source_name)
+
+        builder.add_rows(
+            len(commits),
+            source_name=source_name,
+            source_type=source.source_type.value,
+            activity_id=[build_commit_id(source_id, commit.hexsha) for commit in commits],
+            activity_type="commit",
+            timestamp=[commit.committed_datetime for commit in commits],
+            user=[commit.author_name for commit in commits],
+            user_email=[commit.author_email for commit in commits],
+            size_class=compute_commit_size_class(changed_lines).tolist(),
+            commit_sha=[commit.hexsha for commit in commits],
+            commit_message=[commit.message for commit in commits],
+            commit_added_lines=[commit.stats.total_insertions for commit in commits],
+            commit_removed_lines=[commit.stats.total_deletions for commit in commits],
+            commit_changed_lines=changed_lines,
+            commit_is_merge_commit=[commit.is_merge_commit for commit in commits],
+        )
 
-    df: pandas.DataFrame = pandas.DataFrame(
-        data=data,
-        columns=list(schema),
-    ).astype(schema)
+    df = builder.build()
 
-    df.sort_values(by="timestamp", ascending=True, na_position="first", inplace=True)
+    df.sort_values(
+        by="timestamp",
+        ascending=True,
+        na_position="first",
+        inplace=True,
+        key=timestamp_sort_key,
+    )
 
     return df
 
 
+def extract_commit_files(state: StateModel) -> pandas.DataFrame:
+    builder = ColumnsBuilder(COMMIT_FILES_SCHEMA)
+
+    for source_name, source in state.sources.items():
+        if not isinstance(source, RepoModel):
+            continue
+
+        changed_files = [
+            (commit.hexsha, path, file_stat)
+            for commit in source.commits_map.values()
+            for path, file_stat in commit.stats.changed_files.items()
+        ]
+        source_id = build_id("git", source_name)
+
+        builder.add_rows(
+            len(changed_files),
+            source_name=source_name,
+            activity_id=[build_commit_id(source_id, hexsha) for hexsha, _, _ in changed_files],
+            path=[path for _, path, _ in changed_files],
+            added=[file_stat.insertions for _, _, file_stat in changed_files],
+            deleted=[file_stat.deletions for _, _, file_stat in changed_files],
+        )
+
+    return builder.build()
+
+
 def extract_bitbucket(state: StateModel) -> pandas.DataFrame:
-    schema = dict(
-        BASE_ACTIVITY_SCHEMA,
-        **{
-            "bitbucket_project_name": "string",
-            "bitbucket_repo_name": "string",
-            "bitbucket_pr_title": "string",
-            "bitbucket_pr_description": "string",
-            "bitbucket_pr_id": "Int64",
-            "bitbucket_pr_comment_id": "string",
-            "bitbucket_pr_comment": "string",
-        }
-    )
-    data = []
+    builder = ColumnsBuilder(BITBUCKET_SCHEMA)
+
     for source_name, source in state.sources.items():
-        if isinstance(source, BitbucketState):
-            for project_name, project in source.projects_map.items():
-                for repo_name, repo in project.repositories_map.items():
-                    for pr_name, pr in repo.pull_requests_map.items():
-                        data.append(
-                            {
-                                "source_name": source_name,
-                                "source_type": source.source_type.value,
-                                "source_subtype": "pr",
-                                "activity_id": build_id("bitbucket", "pr", pr.id),
-                                "activity_type": "pr",
-                                "timestamp": pr.created_on,
-                                "size_class": 15,
-                                "user": (pr.author.display_name if pr.author else None),
-                                # TODO: populate
-                                "user_email": None,
-                                "bitbucket_pr_title": pr.title,
-                                "bitbucket_pr_description": pr.description,
-                                "bitbucket_pr_id": pr.id,
-                                "bitbucket_project_name": project_name,
-                                "bitbucket_repo_name": repo_name,
-                            }
+        if not isinstance(source, BitbucketState):
+            continue
+
+        for project_name, project in source.projects_map.items():
+            for repo_name, repo in project.repositories_map.items():
+                prs = list(repo.pull_requests_map.values())
+                # PR IDs are only unique within the repository
+                repo_key = ("bitbucket", source_name, project_name, repo_name)
+
+                builder.add_rows(
+                    len(prs),
+                    source_name=source_name,
+                    source_type=source.source_type.value,
+                    source_subtype="pr",
+                    activity_id=[build_id(*repo_key, "pr", pr.id) for pr in prs],
+                    activity_type="pr",
+                    timestamp=[pr.created_on for pr in prs],
+                    size_class=15,
+                    user=[(pr.author.display_name if pr.author else None) for pr in prs],
+                    # TODO: populate
+                    user_email=None,
+                    bitbucket_pr_title=[pr.title for pr in prs],
+                    bitbucket_pr_description=[pr.description for pr in prs],
+                    bitbucket_pr_id=[pr.id for pr in prs],
+                    bitbucket_project_name=project_name,
+                    bitbucket_repo_name=repo_name,
+                )
+
+                approvals = []
+                for pr in prs:
+                    for participant in pr.participants or []:
+                        if not participant.has_approved:
+                            continue
+                        if participant.user is None:
+                            LOGGER.warning("skipping PR participant w/o user")
+                            continue
+                        approvals.append((pr, participant))
+
+                builder.add_rows(
+                    len(approvals),
+                    source_name=source_name,
+                    source_type=source.source_type.value,
+                    source_subtype="approved pr",
+                    activity_id=[
+                        build_id(*repo_key, "pr-approve", pr.id, participant.user.account_id)
+                        for pr, participant in approvals
+                    ],
+                    activity_type="approved pr",
+                    timestamp=[participant.participated_on for _, participant in approvals],
+                    size_class=8,
+                    user=[participant.user.display_name for _, participant in approvals],
+                    user_email=None,
+                    bitbucket_pr_title=[pr.title for pr, _ in approvals],
+                    bitbucket_pr_id=[pr.id for pr, _ in approvals],
+                    bitbucket_project_name=project_name,
+                    bitbucket_repo_name=repo_name,
+                )
+
+                comments = [(pr, comment) for pr in prs for comment in pr.commentaries]
+
+                builder.add_rows(
+                    len(comments),
+                    source_name=source_name,
+                    source_type=source.source_type.value,
+                    source_subtype="comment",
+                    activity_id=[
+                        build_id(*repo_key, "pr-comment", pr.id, comment.comment_id)
+                        for pr, comment in comments
+                    ],
+                    activity_type="pr comment",
+                    timestamp=[comment.created_on for _, comment in comments],
+                    size_class=[
+                        (
+                            4
+                            if comment.author
+                            and pr.author
+                            and comment.author.account_id == pr.author.account_id
+                            else 6
                         )
-                        for participant in pr.participants or []:
-                            if not participant.has_approved:
-                                continue
-                            if participant.user is None:
-                                LOGGER.warning("skipping PR participant w/o user")
-                                continue
-                            data.append(
-                                {
-                                    "source_name": source_name,
-                                    "source_type": source.source_type.value,
-                                    "source_subtype": "approved pr",
-                                    "activity_id": build_id(
-                                        "bitbucket",
-                                        "pr-approve",
-                                        pr.id,
-                                        participant.user.account_id,
-                                    ),
-                                    "activity_type": "approved pr",
-                                    "timestamp": participant.participated_on,
-                                    "size_class": 8,
-                                    "user": participant.user.display_name,
-                                    "user_email": None,
-                                    "bitbucket_pr_title": pr.title,
-                                    "bitbucket_pr_id": pr.id,
-                                    "bitbucket_project_name": project_name,
-                                    "bitbucket_repo_name": repo_name,
-                                }
-                            )
-                        for comment in pr.commentaries:
-                            is_answering_your_own_pr = (
-                                comment.author
-                                and pr.author
-                                and comment.author.account_id == pr.author.account_id
-                            )
-                            data.append(
-                                {
-                                    "source_name": source_name,
-                                    "source_type": source.source_type.value,
-                                    "source_subtype": "comment",
-                                    "activity_id": build_id(
-                                        "bitbucket", "pr-comment", pr.id, comment.comment_id
-                                    ),
-                                    "activity_type": "pr comment",
-                                    "timestamp": comment.created_on,
-                                    "size_class": (4 if is_answering_your_own_pr else 6),
-                                    "user": (
-                                        comment.author.display_name if comment.author else None
-                                    ),
-                                    "user_email": None,
-                                    "bitbucket_is_answering_your_own_pr": is_answering_your_own_pr,
-                                    "bitbucket_pr_title": pr.title,
-                                    "bitbucket_pr_id": pr.id,
-                                    "bitbucket_pr_comment_id": comment.comment_id,
-                                    "bitbucket_pr_comment": comment.message,
-                                    "bitbucket_project_name": project_name,
-                                    "bitbucket_repo_name": repo_name,
-                                }
-                            )
-
-    df: pandas.DataFrame = pandas.DataFrame(
-        data=data,
-        columns=list(schema),
-    ).astype(schema)
-
-    df.sort_values(by="timestamp", ascending=True, na_position="first", inplace=True)
+                        for pr, comment in comments
+                    ],
+                    user=[
+                        (comment.author.display_name if comment.author else None)
+                        for _, comment in comments
+                    ],
+                    user_email=None,
+                    bitbucket_pr_title=[pr.title for pr, _ in comments],
+                    bitbucket_pr_id=[pr.id for pr, _ in comments],
+                    bitbucket_pr_comment_id=[comment.comment_id for _, comment in comments],
+                    bitbucket_pr_comment=[comment.message for _, comment in comments],
+                    bitbucket_project_name=project_name,
+                    bitbucket_repo_name=repo_name,
+                )
+
+    df = builder.build()
+
+    df.sort_values(
+        by="timestamp",
+        ascending=True,
+        na_position="first",
+        inplace=True,
+        key=timestamp_sort_key,
+    )
 
     return df
 
 
 def extract_jira(state: StateModel) -> pandas.DataFrame:
-    schema = dict(
-        BASE_ACTIVITY_SCHEMA,
-        **{
-            "jira_item_key": "string",
-            "jira_description": "string",
-            "jira_summary": "string",
-            "jira_comment_id": "string",
-            "jira_message": "string",
-        }
-    )
+    builder = ColumnsBuilder(JIRA_SCHEMA)
 
-    data = []
     for source_name, source in state.sources.items():
-        if isinstance(source, JiraState):
-            for item in source.items_map.values():
-                data.append(
-                    {
-                        "source_name": source_name,
-                        "source_type": source.source_type.value,
-                        "source_subtype": item.item_type,
-                        "activity_id": build_id("jira", "created", item.id),
-                        "activity_type": "created %s" % item.item_type,
-                        "timestamp": item.created_on,
-                        "size_class": 8,
-                        "user": item.creator.display_name,
-                        "user_email": item.creator.email,
-                        "jira_item_key": item.key,
-                        "jira_description": item.description,
-                        "jira_summary": item.summary,
-                    }
-                )
-                for comment in item.comments or []:
-                    data.append(
-                        {
-                            "source_name": source_name,
-                            "source_type": source.source_type.value,
-                            "source_subtype": "comment",
-                            "activity_id": build_id("jira", "comment", item.id, comment.comment_id),
-                            "activity_type": "jira comment",
-                            "timestamp": comment.created_on,
-                            "size_class": 4,
-                            "user": comment.created_by.display_name,
-                            "user_email": comment.created_by.email,
-                            "jira_item_key": item.key,
-                            "jira_comment_id": comment.comment_id,
-                            "jira_message": comment.message,
-                        }
-                    )
-
-    df: pandas.DataFrame = pandas.DataFrame(
-        data=data,
-        columns=list(schema),
-    ).astype(schema)
-
-    df.sort_values(by="timestamp", ascending=True, na_position="first", inplace=True)
+        if not isinstance(source, JiraState):
+            continue
+
+        items = list(source.items_map.values())
+
+        builder.add_rows(
+            len(items),
+            source_name=source_name,
+            source_type=source.source_type.value,
+            source_subtype=[item.item_type for item in items],
+            activity_id=[build_id("jira", source_name, "created", item.id) for item in items],
+            activity_type=["created %s" % item.item_type for item in items],
+            timestamp=[item.created_on for item in items],
+            size_class=8,
+            user=[item.creator.display_name for item in items],
+            user_email=[item.creator.email for item in items],
+            jira_item_key=[item.key for item in items],
+            jira_description=[item.description for item in items],
+            jira_summary=[item.summary for item in items],
+        )
+
+        comments = [(item, comment) for item in items for comment in item.comments or []]
+
+        builder.add_rows(
+            len(comments),
+            source_name=source_name,
+            source_type=source.source_type.value,
+            source_subtype="comment",
+            activity_id=[
+                build_id("jira", source_name, "comment", item.id, comment.comment_id)
+                for item, comment in comments
+            ],
+            activity_type="jira comment",
+            timestamp=[comment.created_on for _, comment in comments],
+            size_class=4,
+            user=[comment.created_by.display_name for _, comment in comments],
+            user_email=[comment.created_by.email for _, comment in comments],
+            jira_item_key=[item.key for item, _ in comments],
+            jira_comment_id=[comment.comment_id for _, comment in comments],
+            jira_message=[comment.message for _, comment in comments],
+        )
+
+    df = builder.build()
+
+    df.sort_values(
+        by="timestamp",
+        ascending=True,
+        na_position="first",
+        inplace=True,
+        key=timestamp_sort_key,
+    )
 
     return df
 
 
 def extract_jira_users(state: StateModel) -> pandas.DataFrame:
-    schema = dict(
-        {
-            "account_id": "string",
-            "display_name": "string",
-            "email": "string",
-        }
-    )
+    builder = ColumnsBuilder(JIRA_USERS_SCHEMA)
 
-    data = []
     for source_name, source in state.sources.items():
-        if isinstance(source, JiraState):
-            for user in source.users_map.values():
-                data.append(
-                    {
-                        "account_id": user.account_id,
-                        "display_name": user.display_name,
-                        "email": user.email,
-                    }
-                )
+        if not isinstance(source, JiraState):
+            continue
+
+        users = list(source.users_map.values())
 
-    df: pandas.DataFrame = pandas.DataFrame(
-        data=data,
-        columns=list(schema),
-    ).astype(schema)
+        builder.add_rows(
+            len(users),
+            account_id=[user.account_id for user in users],
+            display_name=[user.display_name for user in users],
+            email=[user.email for user in users],
+        )
+
+    df = builder.build()
 
     df.set_index("account_id", inplace=True)
 
     return df
 
 
-def set_column_type(df: pandas.DataFrame, column_name: str, data_type: str) -> None:
-    if column_name in df.columns:
-        df[column_name] = df[column_name].astype(data_type)
+def extract_bitbucket_users(state: StateModel) -> pandas.DataFrame:
+    # Bitbucket does not expose users list, so it is collected from the actors
+    users_map: dict[str, ActorModel] = {}
+
+    for source_name, source in state.sources.items():
+        if not isinstance(source, BitbucketState):
+            continue
+
+        for actor in source.actors:
+            users_map[actor.account_id] = actor
+
+    builder = ColumnsBuilder(BITBUCKET_USERS_SCHEMA)
+    builder.add_rows(
+        len(users_map),
+        account_id=list(users_map),
+        display_name=[user.display_name for user in users_map.values()],
+    )
+
+    df = builder.build()
+
+    df.set_index("account_id", inplace=True)
+
+    return df
 
 
 def extract_reviews(state: StateModel) -> pandas.DataFrame:
-    schema = {
-        "source_name": "string",
-        "source_type": "string",
-        "reviewer_user": "string",
-        "reviewee_user": "string",
-        "is_self_review": "bool",
-        "has_approved": "bool",
-        "timestamp": "object",
-        "bitbucket_project_name": "string",
-        "bitbucket_repo_name": "string",
-        "bitbucket_pr_title": "string",
-        "bitbucket_pr_id": "Int64",
-        "bitbucket_pr_created_date": "object",
-    }
+    builder = ColumnsBuilder(REVIEWS_SCHEMA)
 
-    data = []
     for source_name, source in state.sources.items():
-        if isinstance(source, BitbucketState):
-            for project_name, project in source.projects_map.items():
-                for repo_name, repo in project.repositories_map.items():
-                    for pr_name, pr in repo.pull_requests_map.items():
-                        if not pr.author:
-                            continue
-                        for pr_participant in pr.participants or []:
-                            if not pr_participant.user:
-                                continue
-                            data.append(
-                                {
-                                    "source_name": source_name,
-                                    "source_type": source.source_type.value,
-                                    "reviewer_user": pr_participant.user.display_name,
-                                    "reviewee_user": pr.author.display_name,
-                                    "is_self_review": pr.author.account_id
-                                    == pr_participant.user.account_id,
-                                    "has_approved": pr_participant.has_approved,
-                                    "timestamp": pr_participant.participated_on,
-                                    "bitbucket_project_name": project_name,
-                                    "bitbucket_repo_name": repo_name,
-                                    "bitbucket_pr_title": pr.title,
-                                    "bitbucket_pr_id": pr.id,
-                                    "bitbucket_pr_created_date": pr.created_on,
-                                }
-                            )
-
-    df = pandas.DataFrame(
-        data=data,
-        columns=list(schema),
-    ).astype(schema)
+        if not isinstance(source, BitbucketState):
+            continue
+
+        for project_name, project in source.projects_map.items():
+            for repo_name, repo in project.repositories_map.items():
+                reviews = [
+                    (pr, participant)
+                    for pr in repo.pull_requests_map.values()
+                    if pr.author
+                    for participant in pr.participants or []
+                    if participant.user
+                ]
+
+                builder.add_rows(
+                    len(reviews),
+                    source_name=source_name,
+                    source_type=source.source_type.value,
+                    reviewer_user=[participant.user.display_name for _, participant in reviews],
+                    reviewee_user=[pr.author.display_name for pr, _ in reviews],
+                    is_self_review=[
+                        pr.author.account_id == participant.user.account_id
+                        for pr, participant in reviews
+                    ],
+                    has_approved=[participant.has_approved for _, participant in reviews],
+                    timestamp=[participant.participated_on for _, participant in reviews],
+                    bitbucket_project_name=project_name,
+                    bitbucket_repo_name=repo_name,
+                    bitbucket_pr_title=[pr.title for pr, _ in reviews],
+                    bitbucket_pr_id=[pr.id for pr, _ in reviews],
+                    bitbucket_pr_created_date=[pr.created_on for pr, _ in reviews],
+                )
+
+    df = builder.build()
 
     df.sort_values(
         by=["bitbucket_pr_created_date", "timestamp"],
         ascending=True,
         na_position="first",
         inplace=True,
+        key=timestamp_sort_key,
     )
 
     return df
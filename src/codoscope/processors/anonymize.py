@@ -1,64 +1,140 @@
 import logging
-from collections import defaultdict
+import re
 
 import pandas
 from faker import Faker
 
-from codoscope.datasets import Datasets
-from codoscope.processors.common import ProcessorBase, ProcessorType
+from codoscope.config import read_optional
+from codoscope.datasets import ACTIVITY_DATASETS, Datasets
+from codoscope.processors.common import (
+    ColumnRef,
+    ProcessorBase,
+    ProcessorType,
+    build_literals_pattern,
+)
 
 LOGGER = logging.getLogger(__name__)
 
+DEFAULT_TEXT_COLUMNS = [
+    "commit_message",
+    "bitbucket_pr_title",
+    "bitbucket_pr_description",
+    "bitbucket_pr_comment",
+    "jira_summary",
+    "jira_description",
+    "jira_message",
+]
+
+# pseudonyms are reproducible between runs even when seed is not configured
+DEFAULT_SEED = 0
+
 
 # TODO: this is obviously not complete anonymization
 class AnonymizingProcessor(ProcessorBase):
+    """
+    Replaces users names and emails with generated pseudonyms. Pseudonyms
+    are generated in bulk for the sorted unique values, so given the same
+    seed and the same set of users the outcome does not depend on the order
+    of rows (seed is fixed by default).
+    """
+
     def __init__(self, processor_config: dict) -> None:
         self.config = processor_config
-        self.user_replacement_map = {}
-        self.email_replacement_map = {}
         self.faker = Faker()
-        self.replacement_maps = defaultdict(dict)
+        self.faker.seed_instance(read_optional(processor_config, "seed", DEFAULT_SEED))
+        self.text_columns: list[str] = read_optional(
+            processor_config, "text-columns", DEFAULT_TEXT_COLUMNS
+        )
+        self.text_pattern: re.Pattern | None = None
 
     def get_type(self) -> ProcessorType:
         return ProcessorType.ANONYMIZE
 
-    def remap(self, type_: str, value: str, factory_fn):
-        replacement_map = self.replacement_maps[type_]
-
-        if value not in replacement_map:
-            replacement_map[value] = factory_fn()
-
-        return replacement_map[value]
-
-    def remap_activity(self, activity_df: pandas.DataFrame) -> None:
-        for index, row in activity_df.iterrows():
-            user = row["user"]
-            user_email = row["user_email"]
-
-            if user:
-                activity_df.at[index, "user"] = self.remap("user", user, self.faker.name)
-
-            if user_email:
-                activity_df.at[index, "user_email"] = self.remap(
-                    "email", user, self.faker.company_email
-                )
-
-    def remap_reviews(self, reviews_df: pandas.DataFrame) -> None:
-        for index, row in reviews_df.iterrows():
-            reviewer_user = row["reviewer_user"]
-            reviewee_user = row["reviewee_user"]
-
-            if reviewer_user:
-                reviews_df.at[index, "reviewee_user"] = self.remap(
-                    "user", reviewer_user, self.faker.name
-                )
-
-            if reviewee_user:
-                reviews_df.at[index, "reviewer_user"] = self.remap(
-                    "user", reviewee_user, self.faker.name
-                )
-
-    def execute(self, datasets: Datasets) -> None:
-        for activity_df in datasets.get_activity_data_frames().values():
-            self.remap_activity(activity_df)
-        self.remap_reviews(datasets.reviews_df)
+    def get_reads(self) -> set[ColumnRef]:
+        return self.get_writes()
+
+    def get_writes(self) -> set[ColumnRef]:
+        columns = {
+            (name, column) for name in ACTIVITY_DATASETS for column in ["user", "user_email"]
+        }
+        columns.update(
+            (name, column)
+            for name in [*ACTIVITY_DATASETS, "reviews"]
+            for column in self.text_columns
+        )
+        columns.update(
+            [
+                ("reviews", "reviewer_user"),
+                ("reviews", "reviewee_user"),
+                ("jira_users", "display_name"),
+                ("jira_users", "email"),
+                ("bitbucket_users", "display_name"),
+            ]
+        )
+        return columns
+
+    def build_replacement_map(self, values: set[str], factory_fn) -> dict[str, str]:
+        # empty values are kept as is
+        return {value: factory_fn() if value else value for value in sorted(values)}
+
+    @staticmethod
+    def remap_column(df: pandas.DataFrame, column: str, replacement_map: dict[str, str]) -> None:
+        remapped = df[column].map(replacement_map)
+        if not isinstance(remapped.dtype, pandas.CategoricalDtype):
+            remapped = remapped.astype("string")
+        df[column] = remapped
+
+    def replace_in_text(self, df: pandas.DataFrame, replacement_map: dict[str, str]) -> None:
+        pattern = self.text_pattern
+        if pattern is None:
+            return
+
+        def replacer(match: re.Match) -> str:
+            return replacement_map[match.group(0)]
+
+        for column in self.text_columns:
+            if column in df.columns:
+                df[column] = df[column].str.replace(pattern, replacer, regex=True).astype("string")
+
+    def execute(self, datasets: Datasets) -> int:
+        activity_dfs = list(datasets.get_activity_data_frames().values())
+        reviews_df = datasets.reviews_df
+        jira_users_df = datasets.jira_users_df
+
+        # collect unique values across all the datasets first
+        users: set[str] = set(jira_users_df["display_name"].dropna())
+        users.update(datasets.bitbucket_users_df["display_name"].dropna())
+        emails: set[str] = set(jira_users_df["email"].dropna())
+        for activity_df in activity_dfs:
+            users.update(activity_df["user"].dropna().unique())
+            emails.update(activity_df["user_email"].dropna().unique())
+        for column in ["reviewer_user", "reviewee_user"]:
+            users.update(reviews_df[column].dropna().unique())
+
+        users_map = self.build_replacement_map(users, self.faker.unique.name)
+        emails_map = self.build_replacement_map(emails, self.faker.unique.company_email)
+        LOGGER.info("generated pseudonyms for %d users and %d emails", len(users), len(emails))
+
+        # single compiled pattern for all the values mentioned in free text
+        text_replacement_map = dict(users_map, **emails_map)
+        literals = [value for value in text_replacement_map if value]
+        # only whole words are replaced
+        self.text_pattern = build_literals_pattern(literals, whole_words=True) if literals else None
+
+        for activity_df in activity_dfs:
+            self.remap_column(activity_df, "user", users_map)
+            self.remap_column(activity_df, "user_email", emails_map)
+            self.replace_in_text(activity_df, text_replacement_map)
+
+        for column in ["reviewer_user", "reviewee_user"]:
+            self.remap_column(reviews_df, column, users_map)
+        self.replace_in_text(reviews_df, text_replacement_map)
+
+        self.remap_column(jira_users_df, "display_name", users_map)
+        self.remap_column(jira_users_df, "email", emails_map)
+        self.remap_column(datasets.bitbucket_users_df, "display_name", users_map)
+
+        return sum(
+            len(df)
+            for df in [*activity_dfs, reviews_df, jira_users_df, datasets.bitbucket_users_df]
+        )
@@ -1,5 +1,9 @@
 import abc
+import re
 from enum import StrEnum
+from typing import Iterable
+
+from codoscope.datasets import Datasets
 
 
 class ProcessorType(StrEnum):
@@ -8,7 +12,72 @@ class ProcessorType(StrEnum):
     EXPAND_REFERENCES = "expand-references"
 
 
+# (dataset name, column name) pair, column can be ALL_COLUMNS wildcard
+ColumnRef = tuple[str, str]
+
+ALL_COLUMNS = "*"
+
+
 class ProcessorBase(abc.ABC):
     @abc.abstractmethod
     def get_type(self) -> ProcessorType:
         raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_reads(self) -> set[ColumnRef]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_writes(self) -> set[ColumnRef]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def execute(self, datasets: Datasets) -> int:
+        """
+        Processes the datasets in place and returns amount of rows touched.
+        """
+        raise NotImplementedError
+
+
+def columns_overlap(refs1: Iterable[ColumnRef], refs2: Iterable[ColumnRef]) -> bool:
+    refs2 = list(refs2)
+    for dataset1, column1 in refs1:
+        for dataset2, column2 in refs2:
+            if dataset1 != dataset2:
+                continue
+            if column1 == column2 or ALL_COLUMNS in (column1, column2):
+                return True
+    return False
+
+
+def build_literals_pattern(literals: Iterable[str], whole_words: bool = False) -> re.Pattern:
+    """
+    Compiles regular expression matching any of the given literals (longest
+    one preferred). Literals are arranged into a trie, so that matching cost
+    does not grow linearly with the amount of literals as for plain
+    alternation. Word boundaries are a part of the pattern for whole words,
+    so that shorter literal still matches when the longer one is rejected.
+    """
+    trie: dict = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def to_pattern(node: dict) -> str:
+        is_terminal = "" in node
+        alternatives = [
+            re.escape(char) + to_pattern(child) for char, child in sorted(node.items()) if char
+        ]
+        if not alternatives:
+            return ""
+        if len(alternatives) == 1 and not is_terminal:
+            return alternatives[0]
+        pattern = "(?:%s)" % "|".join(alternatives)
+        return pattern + "?" if is_terminal else pattern
+
+    pattern = to_pattern(trie)
+    if whole_words:
+        pattern = r"(?<!\w)(?:%s)(?!\w)" % pattern
+    return re.compile(pattern)
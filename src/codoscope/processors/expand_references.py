@@ -4,11 +4,56 @@ import re
 import pandas as pd
 
 from codoscope.datasets import Datasets
-from codoscope.processors.common import ProcessorBase, ProcessorType
+from codoscope.processors.common import ColumnRef, ProcessorBase, ProcessorType
 
 LOGGER = logging.getLogger(__name__)
 
 
+class ReferencesExpander:
+    """
+    Replaces references to users (by account ID) inside text columns with
+    users display names. Only cells containing the marker (cheap substring
+    check) are handled with the regular expression.
+    """
+
+    def __init__(self, marker: str, pattern: str, template: str, display_names: dict[str, str]):
+        self.marker: str = marker
+        self.pattern: re.Pattern = re.compile(pattern)
+        self.template: str = template
+        self.display_names: dict[str, str] = display_names
+        self.replacements: int = 0
+        self.rows_touched: int = 0
+
+    def replacer(self, match: re.Match) -> str:
+        display_name = self.display_names.get(match.group(1))
+        if not display_name:
+            return match.group(0)
+        self.replacements += 1
+        return self.template % display_name
+
+    def expand(self, series: pd.Series) -> pd.Series:
+        candidates_mask = series.str.contains(self.marker, regex=False, na=False).to_numpy()
+        if not candidates_mask.any():
+            return series
+
+        # positional update, so that duplicate index labels do not matter
+        values = series.to_numpy(dtype="object", copy=True)
+        candidates = values[candidates_mask]
+        expanded = [self.pattern.sub(self.replacer, value) for value in candidates]
+        self.rows_touched += sum(1 for old, new in zip(candidates, expanded) if old != new)
+        values[candidates_mask] = expanded
+        return pd.Series(values, index=series.index, dtype=series.dtype)
+
+
+def get_display_names(users_df: pd.DataFrame) -> dict[str, str]:
+    display_names = users_df["display_name"].dropna()
+    return display_names[display_names != ""].to_dict()
+
+
+JIRA_TEXT_COLUMNS = ["jira_message", "jira_description"]
+BITBUCKET_TEXT_COLUMNS = ["bitbucket_pr_comment", "bitbucket_pr_description"]
+
+
 class ExpandReferencesProcessor(ProcessorBase):
     def __init__(self, processor_config: dict) -> None:
         self.config = processor_config
@@ -16,31 +61,44 @@ class ExpandReferencesProcessor(ProcessorBase):
     def get_type(self) -> ProcessorType:
         return ProcessorType.EXPAND_REFERENCES
 
-    def __handle_jira(self, datasets: Datasets) -> None:
+    def get_reads(self) -> set[ColumnRef]:
+        return self.get_writes() | {
+            ("jira_users", "display_name"),
+            ("bitbucket_users", "display_name"),
+        }
 
-        replacements = 0
+    def get_writes(self) -> set[ColumnRef]:
+        return {("jira", column) for column in JIRA_TEXT_COLUMNS} | {
+            ("bitbucket", column) for column in BITBUCKET_TEXT_COLUMNS
+        }
 
-        def replacer(match: re.Match) -> str:
-            nonlocal replacements
-            account_id = match.group(1)
-            try:
-                display_name = datasets.jira_users_df.loc[account_id]["display_name"]
-                if not pd.isna(display_name) and display_name:
-                    replacements += 1
-                    return f"({display_name})"
-            except KeyError:
-                pass
-            return match.group(0)
+    def __handle_jira(self, datasets: Datasets) -> int:
+        expander = ReferencesExpander(
+            marker="[~accountid:",
+            pattern=r"\[~accountid:([^]]+)]",
+            template="(%s)",
+            display_names=get_display_names(datasets.jira_users_df),
+        )
+
+        for prop in JIRA_TEXT_COLUMNS:
+            datasets.jira_df[prop] = expander.expand(datasets.jira_df[prop])
+
+        LOGGER.info("replaced %d JIRA references", expander.replacements)
+        return expander.rows_touched
 
-        def handler(value):
-            if pd.isna(value):
-                return value
-            return re.sub(r"\[~accountid:([^]]+)]", replacer, value)
+    def __handle_bitbucket(self, datasets: Datasets) -> int:
+        expander = ReferencesExpander(
+            marker="@{",
+            pattern=r"@\{([^}]+)}",
+            template="@%s",
+            display_names=get_display_names(datasets.bitbucket_users_df),
+        )
 
-        for prop in ["jira_message", "jira_description"]:
-            datasets.jira_df[prop] = datasets.jira_df[prop].apply(handler)
+        for prop in BITBUCKET_TEXT_COLUMNS:
+            datasets.bitbucket_df[prop] = expander.expand(datasets.bitbucket_df[prop])
 
-        LOGGER.info("replaced %d JIRA references", replacements)
+        LOGGER.info("replaced %d Bitbucket mentions", expander.replacements)
+        return expander.rows_touched
 
-    def execute(self, datasets: Datasets) -> None:
-        self.__handle_jira(datasets)
+    def execute(self, datasets: Datasets) -> int:
+        return self.__handle_jira(datasets) + self.__handle_bitbucket(datasets)
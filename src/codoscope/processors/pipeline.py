@@ -0,0 +1,112 @@
+import concurrent.futures
+import logging
+import time
+
+from codoscope.config import read_mandatory
+from codoscope.datasets import Datasets
+from codoscope.exceptions import ConfigError
+from codoscope.processors.common import ColumnRef, ProcessorBase, columns_overlap
+from codoscope.processors.registry import PROCESSORS_BY_TYPE
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ProcessorStep:
+    def __init__(self, name: str, config: dict, processor: ProcessorBase) -> None:
+        self.name: str = name
+        self.config: dict = config
+        self.processor: ProcessorBase = processor
+
+    def conflicts_with(self, other: "ProcessorStep") -> bool:
+        """
+        Data frames are not safe to be modified concurrently, hence conflicts
+        are detected on datasets (rather than columns) level.
+        """
+        reads = {name for name, _ in self.processor.get_reads()}
+        writes = {name for name, _ in self.processor.get_writes()}
+        other_reads = {name for name, _ in other.processor.get_reads()}
+        other_writes = {name for name, _ in other.processor.get_writes()}
+        return bool(writes & (other_reads | other_writes) or other_writes & (reads | writes))
+
+    def execute(self, datasets: Datasets) -> None:
+        LOGGER.info('handling "%s" processor', self.name)
+        start_time = time.perf_counter()
+        rows_touched = self.processor.execute(datasets)
+        datasets.invalidate()
+        LOGGER.info(
+            '"%s" processor completed in %.2fs, %d rows touched',
+            self.name,
+            time.perf_counter() - start_time,
+            rows_touched,
+        )
+
+
+class ProcessorsPipeline:
+    """
+    Runs configured processors in order. Processors which outputs are not
+    consumed (by the reports or by the subsequent processors) are skipped,
+    w/o consumed columns given all of them are kept. Consecutive processors
+    working with different datasets run concurrently.
+    """
+
+    def __init__(self, processor_configs: list[dict], consumed: set[ColumnRef] | None) -> None:
+        enabled_steps: list[ProcessorStep] = []
+        for processor_config in processor_configs:
+            processor_name = read_mandatory(processor_config, "name")
+            processor_type = read_mandatory(processor_config, "type")
+
+            if not processor_config.get("enabled", True):
+                LOGGER.warning('skip disabled "%s" processor', processor_name)
+                continue
+
+            processor_class = PROCESSORS_BY_TYPE.get(processor_type)
+            if processor_class is None:
+                raise ConfigError('unknown processor type: "%s"' % processor_type)
+
+            enabled_steps.append(
+                ProcessorStep(processor_name, processor_config, processor_class(processor_config))
+            )
+
+        self.steps: list[ProcessorStep] = []
+        if consumed is None:
+            self.steps = enabled_steps
+            return
+
+        # walk backwards collecting columns needed by the processors kept so far
+        needed = set(consumed)
+        for step in reversed(enabled_steps):
+            if not columns_overlap(step.processor.get_writes(), needed):
+                LOGGER.warning('skip "%s" processor, its output is not used', step.name)
+                continue
+            self.steps.insert(0, step)
+            needed.update(step.processor.get_reads())
+
+    def get_reads(self) -> set[ColumnRef]:
+        reads: set[ColumnRef] = set()
+        for step in self.steps:
+            reads.update(step.processor.get_reads())
+        return reads
+
+    def get_configs(self) -> list[dict]:
+        return [step.config for step in self.steps]
+
+    def get_batches(self) -> list[list[ProcessorStep]]:
+        batches: list[list[ProcessorStep]] = []
+        for step in self.steps:
+            if batches and not any(step.conflicts_with(other) for other in batches[-1]):
+                batches[-1].append(step)
+            else:
+                batches.append([step])
+        return batches
+
+    def execute(self, datasets: Datasets) -> None:
+        for batch in self.get_batches():
+            if len(batch) == 1:
+                batch[0].execute(datasets)
+                continue
+
+            LOGGER.info("running %s processors concurrently", ", ".join(s.name for s in batch))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(batch)) as executor:
+                futures = [executor.submit(step.execute, datasets) for step in batch]
+                for future in futures:
+                    future.result()
@@ -0,0 +1,10 @@
+from codoscope.processors.anonymize import AnonymizingProcessor
+from codoscope.processors.common import ProcessorBase, ProcessorType
+from codoscope.processors.expand_references import ExpandReferencesProcessor
+from codoscope.processors.remap_users import RemapUsersProcessor
+
+PROCESSORS_BY_TYPE: dict[ProcessorType, type[ProcessorBase]] = {
+    ProcessorType.REMAP_USERS: RemapUsersProcessor,
+    ProcessorType.ANONYMIZE: AnonymizingProcessor,
+    ProcessorType.EXPAND_REFERENCES: ExpandReferencesProcessor,
+}
@@ -2,9 +2,9 @@ import logging
 
 import pandas
 
-from codoscope.datasets import Datasets
+from codoscope.datasets import ACTIVITY_DATASETS, Datasets
 from codoscope.exceptions import ConfigError
-from codoscope.processors.common import ProcessorBase, ProcessorType
+from codoscope.processors.common import ColumnRef, ProcessorBase, ProcessorType
 
 LOGGER = logging.getLogger(__name__)
 
@@ -32,47 +32,51 @@ class RemapUsersProcessor(ProcessorBase):
     def get_type(self) -> ProcessorType:
         return ProcessorType.REMAP_USERS
 
-    def remap_activity(self, dataset_name: str, activity_df: pandas.DataFrame) -> None:
-        remapped_items_count = 0
-        for index, row in activity_df.iterrows():
-            user = row["user"]
-            user_email = row["user_email"]
-
-            if not pandas.isna(user_email) and user_email in self.email_to_canonical_name_map:
-                activity_df.at[index, "user"] = self.email_to_canonical_name_map[user_email]
-                remapped_items_count += 1
-                continue
-
-            if not pandas.isna(user) and user in self.name_to_canonical_name_map:
-                activity_df.at[index, "user"] = self.name_to_canonical_name_map[user]
-                remapped_items_count += 1
-                continue
-
+    def get_reads(self) -> set[ColumnRef]:
+        return self.get_writes() | {(name, "user_email") for name in ACTIVITY_DATASETS}
+
+    def get_writes(self) -> set[ColumnRef]:
+        return {(name, "user") for name in ACTIVITY_DATASETS} | {
+            ("reviews", "reviewer_user"),
+            ("reviews", "reviewee_user"),
+        }
+
+    def remap_activity(self, dataset_name: str, activity_df: pandas.DataFrame) -> int:
+        # email takes priority over the name
+        canonical_names = activity_df["user_email"].map(self.email_to_canonical_name_map)
+        canonical_names = canonical_names.fillna(
+            activity_df["user"].map(self.name_to_canonical_name_map)
+        )
+
+        remapped_mask = canonical_names.notna()
+        if remapped_mask.any():
+            activity_df["user"] = (
+                activity_df["user"]
+                .astype("string")
+                .mask(remapped_mask, canonical_names)
+                .astype("category")
+            )
+
+        remapped_items_count = int(remapped_mask.sum())
         LOGGER.info("%s dataset: remapped %d items", dataset_name, remapped_items_count)
-
-    def remap_reviews(self, reviews_df: pandas.DataFrame) -> None:
-        remapped_items_count = 0
-        for index, row in reviews_df.iterrows():
-            reviewer_user = row["reviewer_user"]
-            reviewee_user = row["reviewee_user"]
-
-            if reviewer_user and reviewer_user in self.name_to_canonical_name_map:
-                reviews_df.at[index, "reviewer_user"] = self.name_to_canonical_name_map[
-                    reviewer_user
-                ]
-                remapped_items_count += 1
-                continue
-
-            if reviewee_user and reviewee_user in self.name_to_canonical_name_map:
-                reviews_df.at[index, "reviewee_user"] = self.name_to_canonical_name_map[
-                    reviewee_user
-                ]
-                remapped_items_count += 1
-                continue
-
+        return remapped_items_count
+
+    def remap_reviews(self, reviews_df: pandas.DataFrame) -> int:
+        remapped_mask = pandas.Series(False, index=reviews_df.index)
+        for column in ["reviewer_user", "reviewee_user"]:
+            canonical_names = reviews_df[column].map(self.name_to_canonical_name_map)
+            column_mask = canonical_names.notna()
+            if column_mask.any():
+                reviews_df[column] = reviews_df[column].mask(column_mask, canonical_names)
+            remapped_mask |= column_mask
+
+        remapped_items_count = int(remapped_mask.sum())
         LOGGER.info("reviews dataset: remapped %d items", remapped_items_count)
+        return remapped_items_count
 
-    def execute(self, datasets: Datasets) -> None:
+    def execute(self, datasets: Datasets) -> int:
+        remapped_items_count = 0
         for dataset_name, activity_df in datasets.get_activity_data_frames().items():
-            self.remap_activity(dataset_name, activity_df)
-        self.remap_reviews(datasets.reviews_df)
+            remapped_items_count += self.remap_activity(dataset_name, activity_df)
+        remapped_items_count += self.remap_reviews(datasets.reviews_df)
+        return remapped_items_count
@@ -7,7 +7,7 @@ import plotly.graph_objects as go
 import tzlocal
 
 from codoscope.common import render_jinja_template
-from codoscope.datasets import Datasets
+from codoscope.datasets import ALL_DATASETS, Datasets
 from codoscope.state import StateModel
 from codoscope.widgets.common import WidgetBase
 
@@ -27,7 +27,7 @@ class ReportType(enum.StrEnum):
 
 class ReportBase(abc.ABC):
     @abc.abstractmethod
-    def generate(self, config: dict, state: StateModel, datasets: Datasets) -> None:
+    def generate(self, config: dict, state: StateModel | None, datasets: Datasets) -> None:
         raise NotImplementedError
 
     # TODO: define class property
@@ -35,6 +35,21 @@ class ReportBase(abc.ABC):
     def get_type(cls) -> ReportType:
         raise NotImplementedError
 
+    @classmethod
+    def requires_state(cls) -> bool:
+        """
+        Reports only using datasets can be rendered w/o loading the state.
+        """
+        return False
+
+    @classmethod
+    def get_consumed_datasets(cls) -> list[str]:
+        """
+        Processors which only change datasets not consumed by any of the
+        enabled reports are skipped.
+        """
+        return ALL_DATASETS
+
 
 # TODO: move to separate plotly related module to better organize things
 def setup_default_layout(fig: go.Figure, title: str | None = None) -> None:
@@ -17,7 +17,7 @@ class DatasetsExportReport(ReportBase):
     def get_type(cls) -> ReportType:
         return ReportType.DATASETS_EXPORT
 
-    def generate(self, config: dict, state: StateModel, datasets: Datasets) -> None:
+    def generate(self, config: dict, state: StateModel | None, datasets: Datasets) -> None:
         out_dir = os.path.abspath(read_mandatory(config, "out-dir"))
         ensure_dir(out_dir)
 
@@ -21,7 +21,17 @@ class InternalStateReport(ReportBase):
     def get_type(cls) -> ReportType:
         return ReportType.INTERNAL_STATE
 
-    def generate(self, config: dict, state: StateModel, datasets: Datasets):
+    @classmethod
+    def get_consumed_datasets(cls) -> list[str]:
+        return []
+
+    @classmethod
+    def requires_state(cls) -> bool:
+        return True
+
+    def generate(self, config: dict, state: StateModel | None, datasets: Datasets):
+        assert state is not None
+
         out_path = os.path.abspath(read_mandatory(config, "out-path"))
         ensure_dir_for_path(out_path)
 
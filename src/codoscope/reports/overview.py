@@ -11,9 +11,10 @@ from codoscope.common import (
     apply_filter,
     convert_timezone,
     ensure_dir_for_path,
+    fill_na,
 )
 from codoscope.config import read_mandatory, read_optional
-from codoscope.datasets import Datasets
+from codoscope.datasets import ACTIVITY_DATASETS, Datasets
 from codoscope.reports.common import (
     ReportBase,
     ReportType,
@@ -23,7 +24,10 @@ from codoscope.reports.common import (
 from codoscope.state import StateModel
 from codoscope.widgets.active_contributors_count import active_contributors_count
 from codoscope.widgets.activity_heatmap import activity_heatmap
-from codoscope.widgets.activity_scatter import activity_scatter
+from codoscope.widgets.activity_scatter import (
+    activity_scatter,
+    get_activity_scatter_columns,
+)
 from codoscope.widgets.common import CompositeWidget, PlotlyFigureWidget
 from codoscope.widgets.simple_activity_histogram import simple_activity_histogram
 
@@ -31,7 +35,7 @@ LOGGER = logging.getLogger(__name__)
 
 
 def people_timeline(df: pandas.DataFrame) -> PlotlyFigureWidget:
-    df["user"] = df["user"].fillna(NA_REPLACEMENT)
+    df["user"] = fill_na(df["user"], NA_REPLACEMENT)
 
     timestamp_range = [
         df["timestamp"].min(),
@@ -112,19 +116,25 @@ class OverviewReport(ReportBase):
     def get_type(cls) -> ReportType:
         return ReportType.OVERVIEW
 
-    def generate(self, config: dict, state: StateModel, datasets: Datasets):
+    @classmethod
+    def get_consumed_datasets(cls) -> list[str]:
+        return ACTIVITY_DATASETS
+
+    def generate(self, config: dict, state: StateModel | None, datasets: Datasets):
         out_path = os.path.abspath(read_mandatory(config, "out-path"))
         ensure_dir_for_path(out_path)
 
+        filter_expr = read_optional(config, "filter")
+
         activity_df = convert_timezone(
-            datasets.get_all_activity(),
+            datasets.get_activity(datasets.get_referenced_detail_columns(filter_expr)),
             timezone_name=config.get("timezone"),
             inplace=False,
         )
 
         # apply filters if applicable
-        filter_expr = read_optional(config, "filter")
         activity_df = apply_filter(activity_df, filter_expr)
+        activity_df = datasets.join_details(activity_df, get_activity_scatter_columns())
 
         LOGGER.info("total data points: %d", len(activity_df))
 
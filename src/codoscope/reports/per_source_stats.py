@@ -8,10 +8,11 @@ from codoscope.common import (
     NA_REPLACEMENT,
     convert_timezone,
     ensure_dir,
+    fill_na,
     sanitize_filename,
 )
 from codoscope.config import read_mandatory
-from codoscope.datasets import Datasets
+from codoscope.datasets import ACTIVITY_DATASETS, Datasets
 from codoscope.reports.common import (
     ReportBase,
     ReportType,
@@ -21,9 +22,15 @@ from codoscope.reports.common import (
 from codoscope.state import SourceType, StateModel
 from codoscope.widgets.activity_heatmap import activity_heatmap
 from codoscope.widgets.aggregated_counts import aggregated_counts
-from codoscope.widgets.code_ownership_v2 import code_ownership_v2
+from codoscope.widgets.code_ownership_v2 import (
+    CODE_OWNERSHIP_COLUMNS,
+    code_ownership_v2,
+)
 from codoscope.widgets.common import PlotlyFigureWidget, WidgetBase
-from codoscope.widgets.line_counts_stats import line_counts_stats
+from codoscope.widgets.line_counts_stats import (
+    LINE_COUNTS_STATS_COLUMNS,
+    line_counts_stats,
+)
 
 LOGGER = logging.getLogger(__name__)
 
@@ -33,10 +40,14 @@ class PerSourceStatsReport(ReportBase):
     def get_type(cls) -> ReportType:
         return ReportType.PER_SOURCE_STATS
 
+    @classmethod
+    def get_consumed_datasets(cls) -> list[str]:
+        return ACTIVITY_DATASETS + ["commit_files"]
+
     def weekly_stats(self, df: pandas.DataFrame) -> PlotlyFigureWidget:
         df = df.set_index("timestamp")
-        df["user"] = df["user"].fillna(NA_REPLACEMENT)
-        df["activity_type"] = df["activity_type"].fillna(NA_REPLACEMENT)
+        df["user"] = fill_na(df["user"], NA_REPLACEMENT)
+        df["activity_type"] = fill_na(df["activity_type"], NA_REPLACEMENT)
 
         sorted_df = df.sort_values(by=["user", "activity_type"], ascending=True)
         grouped_by_user_activity = sorted_df.groupby(["user", "activity_type"])
@@ -64,8 +75,9 @@ class PerSourceStatsReport(ReportBase):
 
     def generate_for_source(
         self,
-        state: StateModel,
+        datasets: Datasets,
         source_name: str,
+        source_type: SourceType,
         report_path: str,
         df: pandas.DataFrame,
     ):
@@ -82,8 +94,9 @@ class PerSourceStatsReport(ReportBase):
             self.weekly_stats(df),
         ]
 
-        source_state = state.sources[source_name]
-        if source_state.source_type == SourceType.GIT:
+        if source_type == SourceType.GIT:
+            df = datasets.join_details(df, [*LINE_COUNTS_STATS_COLUMNS, *CODE_OWNERSHIP_COLUMNS])
+
             line_counts_widget = line_counts_stats(
                 df,
                 agg_period="W",
@@ -91,10 +104,10 @@ class PerSourceStatsReport(ReportBase):
             )
             widgets.append(line_counts_widget)
 
-            # code_ownership_widget = code_ownership(df)
+            # code_ownership_widget = code_ownership(df, datasets.commit_files_df)
             # widgets.append(code_ownership_widget)
 
-            code_ownership_widget_v2 = code_ownership_v2(df)
+            code_ownership_widget_v2 = code_ownership_v2(df, datasets.commit_files_df)
             widgets.append(code_ownership_widget_v2)
 
         render_widgets_report(
@@ -103,16 +116,18 @@ class PerSourceStatsReport(ReportBase):
             title=f"source :: {source_name}",
         )
 
-    def generate(self, config: dict, state: StateModel, datasets: Datasets) -> None:
+    def generate(self, config: dict, state: StateModel | None, datasets: Datasets) -> None:
         parent_dir_path = os.path.abspath(read_mandatory(config, "out-dir"))
         ensure_dir(parent_dir_path)
 
-        activity_df = convert_timezone(datasets.get_all_activity(), timezone_name="utc")
+        activity_df = convert_timezone(datasets.get_activity(), timezone_name="utc")
 
-        grouped_by_source = activity_df.groupby(["source_name"])
+        grouped_by_source = activity_df.groupby(["source_name", "source_type"])
 
-        for (source_name,), source_df in grouped_by_source:
+        for (source_name, source_type), source_df in grouped_by_source:
             file_name = sanitize_filename(source_name)
             file_path = "%s.html" % os.path.join(parent_dir_path, file_name)
             LOGGER.info('rendering report for "%s"', source_name)
-            self.generate_for_source(state, source_name, file_path, source_df)
+            self.generate_for_source(
+                datasets, source_name, SourceType(source_type), file_path, source_df
+            )
@@ -11,16 +11,16 @@ from codoscope.common import (
     convert_timezone,
     ensure_dir,
     sanitize_filename,
+    with_category,
 )
 from codoscope.config import read_mandatory, read_optional
-from codoscope.datasets import Datasets
+from codoscope.datasets import ACTIVITY_DATASETS, Datasets
 from codoscope.reports.common import (
     ReportBase,
     ReportType,
     render_widgets_report,
     setup_default_layout,
 )
-from codoscope.reports.overview import activity_scatter
 from codoscope.reports.word_clouds import render_word_cloud_html
 from codoscope.state import StateModel
 from codoscope.widgets import activity_trends
@@ -30,16 +30,27 @@ from codoscope.widgets.activity_by_weekday import (
     activity_offset_hisogram,
 )
 from codoscope.widgets.activity_heatmap import activity_heatmap
+from codoscope.widgets.activity_scatter import (
+    activity_scatter,
+    get_activity_scatter_columns,
+)
 from codoscope.widgets.aggregated_counts import aggregated_counts
-from codoscope.widgets.code_ownership_v2 import code_ownership_v2
+from codoscope.widgets.code_ownership_v2 import (
+    CODE_OWNERSHIP_COLUMNS,
+    code_ownership_v2,
+)
 from codoscope.widgets.common import CompositeWidget, PlotlyFigureWidget, Widget
-from codoscope.widgets.line_counts_stats import line_counts_stats
+from codoscope.widgets.line_counts_stats import (
+    LINE_COUNTS_STATS_COLUMNS,
+    line_counts_stats,
+)
 
 LOGGER = logging.getLogger(__name__)
 
 
 def separate_merge_commits(activity_df: pandas.DataFrame):
     activity_df = activity_df.copy()
+    activity_df["activity_type"] = with_category(activity_df["activity_type"], "merge commit")
     activity_df.loc[activity_df["commit_is_merge_commit"] == True, "activity_type"] = "merge commit"
     return activity_df
 
@@ -49,6 +60,18 @@ class PerUserStatsReport(ReportBase):
     def get_type(cls) -> ReportType:
         return ReportType.PER_USER_STATS
 
+    # detail columns (besides the activity core ones) used by the widgets
+    DETAIL_COLUMNS = [
+        *get_activity_scatter_columns(extended_mode=True),
+        *LINE_COUNTS_STATS_COLUMNS,
+        *CODE_OWNERSHIP_COLUMNS,
+        "commit_message",
+    ]
+
+    @classmethod
+    def get_consumed_datasets(cls) -> list[str]:
+        return ACTIVITY_DATASETS + ["commit_files"]
+
     def commit_themes_wordcloud(
         self,
         df: pandas.DataFrame,
@@ -137,6 +160,7 @@ class PerUserStatsReport(ReportBase):
         user_name: str,
         report_path: str,
         df: pandas.DataFrame,
+        commit_files_df: pandas.DataFrame,
         timezone_name: str,
     ) -> None:
 
@@ -231,6 +255,7 @@ class PerUserStatsReport(ReportBase):
             widgets.append(
                 code_ownership_v2(
                     per_source_commits_df,
+                    commit_files_df,
                     title=f"Code changes ({source_name})",
                     show_users_breakdown_pane=False,
                 )
@@ -244,16 +269,17 @@ class PerUserStatsReport(ReportBase):
             title=f"user :: {user_name}",
         )
 
-    def generate(self, config: dict, state: StateModel, datasets: Datasets) -> None:
+    def generate(self, config: dict, state: StateModel | None, datasets: Datasets) -> None:
         parent_dir_path = os.path.abspath(read_mandatory(config, "out-dir"))
         ensure_dir(parent_dir_path)
 
         timezone_name = config.get("timezone", "utc")
 
-        activity_df = datasets.get_all_activity()
-
         filter_expr = read_optional(config, "filter")
+
+        activity_df = datasets.get_activity(datasets.get_referenced_detail_columns(filter_expr))
         activity_df = apply_filter(activity_df, filter_expr)
+        activity_df = datasets.join_details(activity_df, self.DETAIL_COLUMNS)
 
         grouped_by_user = activity_df.groupby(["user"])
 
@@ -264,7 +290,9 @@ class PerUserStatsReport(ReportBase):
             file_name: str = sanitize_filename(user_name)
             file_path: str = "%s.html" % os.path.join(parent_dir_path, file_name)
 
-            self.generate_for_user(user_name, file_path, user_df, timezone_name)
+            self.generate_for_user(
+                user_name, file_path, user_df, datasets.commit_files_df, timezone_name
+            )
 
             processed_count += 1
             if processed_count % 20 == 0:
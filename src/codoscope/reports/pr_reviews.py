@@ -16,7 +16,11 @@ class PrReviewsReport(ReportBase):
     def get_type(cls) -> ReportType:
         return ReportType.PR_REVIEWS
 
-    def generate(self, config: dict, state: StateModel, datasets: Datasets):
+    @classmethod
+    def get_consumed_datasets(cls) -> list[str]:
+        return ["reviews"]
+
+    def generate(self, config: dict, state: StateModel | None, datasets: Datasets):
         out_path = os.path.abspath(read_mandatory(config, "out-path"))
         ensure_dir_for_path(out_path)
 
@@ -6,7 +6,7 @@ from pandas import DataFrame
 
 from codoscope.common import ensure_dir_for_path
 from codoscope.config import read_mandatory
-from codoscope.datasets import Datasets
+from codoscope.datasets import ACTIVITY_DATASETS, Datasets
 from codoscope.reports.common import ReportBase, ReportType
 from codoscope.state import StateModel
 
@@ -18,11 +18,15 @@ class UniqueUsersReport(ReportBase):
     def get_type(cls) -> ReportType:
         return ReportType.UNIQUE_USERS
 
-    def generate(self, config: dict, state: StateModel, datasets: Datasets):
+    @classmethod
+    def get_consumed_datasets(cls) -> list[str]:
+        return ACTIVITY_DATASETS
+
+    def generate(self, config: dict, state: StateModel | None, datasets: Datasets):
         out_path = os.path.abspath(read_mandatory(config, "out-path"))
         ensure_dir_for_path(out_path)
 
-        df: DataFrame = datasets.get_all_activity().copy()
+        df: DataFrame = datasets.get_activity()
 
         # fill user email with replacement string otherwise they won't be included into groupping
         df["user_email"] = df["user_email"].fillna("")
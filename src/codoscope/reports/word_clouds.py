@@ -7,7 +7,7 @@ import wordcloud
 
 from codoscope.common import convert_timezone, ensure_dir_for_path
 from codoscope.config import read_mandatory, read_optional
-from codoscope.datasets import Datasets
+from codoscope.datasets import ACTIVITY_DATASETS, Datasets
 from codoscope.reports.common import ReportBase, ReportType, render_html_report
 from codoscope.state import StateModel
 
@@ -35,7 +35,11 @@ class WordCloudsReport(ReportBase):
     def get_type(cls) -> ReportType:
         return ReportType.WORD_CLOUDS
 
-    def generate(self, config: dict, state: StateModel, datasets: Datasets):
+    @classmethod
+    def get_consumed_datasets(cls) -> list[str]:
+        return ACTIVITY_DATASETS
+
+    def generate(self, config: dict, state: StateModel | None, datasets: Datasets):
         out_path = os.path.abspath(read_mandatory(config, "out-path"))
         ensure_dir_for_path(out_path)
 
@@ -52,13 +56,6 @@ class WordCloudsReport(ReportBase):
             grouping_period,
         )
 
-        df = datasets.get_all_activity().copy()
-        df = convert_timezone(df, timezone_name="utc")
-
-        grouped = df.groupby(df["timestamp"].dt.to_period(grouping_period))
-
-        svgs = []
-
         # TODO: make fields and weights customizable as well
         # TODO: solve somehow issue with fields multiplication like "bitbucket_pr_title"
         #  is included into the comments as well...
@@ -74,6 +71,13 @@ class WordCloudsReport(ReportBase):
             # 'bitbucket_pr_comment': 1,
         }
 
+        df = datasets.get_activity(text_fields)
+        df = convert_timezone(df, timezone_name="utc")
+
+        grouped = df.groupby(df["timestamp"].dt.to_period(grouping_period))
+
+        svgs = []
+
         for period, group_df in grouped:
             LOGGER.info("processing period %s" % period)
             texts = []
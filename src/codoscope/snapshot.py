@@ -0,0 +1,168 @@
+import datetime
+import json
+import logging
+import os
+import os.path
+import shutil
+
+import pandas
+import pyarrow
+import pyarrow.feather
+
+from codoscope.common import ensure_dir
+from codoscope.datasets import ALL_DATASETS, Datasets
+
+LOGGER = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE_NAME = "manifest.json"
+
+# columns holding datetime objects which timezones can differ from row to row
+# (e.g. git commits preserve author's local timezone), so they are stored as
+# UTC timestamp and separate offset column (missing for naive values)
+TIMESTAMP_COLUMNS = ["timestamp", "bitbucket_pr_created_date"]
+UTC_OFFSET_SUFFIX = "__utc_offset_minutes"
+
+
+def _get_utc_offset_minutes(value) -> int | None:
+    if pandas.isna(value) or value.utcoffset() is None:
+        return None
+    return int(value.utcoffset().total_seconds() // 60)
+
+
+def _to_table(df: pandas.DataFrame) -> pyarrow.Table:
+    # columns replaced below do not affect the original data frame
+    df = df.copy(deep=False)
+
+    for column in TIMESTAMP_COLUMNS:
+        if column not in df.columns or df[column].dtype != "object":
+            continue
+        df[column + UTC_OFFSET_SUFFIX] = pandas.array(
+            [_get_utc_offset_minutes(x) for x in df[column]], dtype="Int32"
+        )
+        # naive values are stored as if they were UTC
+        df[column] = pandas.to_datetime(df[column], utc=True)
+
+    # index is kept as well (e.g. account ID of users or the order of rows
+    # before sorting), range index is only saved in the metadata
+    return pyarrow.Table.from_pandas(df, preserve_index=None)
+
+
+def _restore_timestamps(utc: pandas.Series, offsets: pandas.Series) -> pandas.Series:
+    result = pandas.Series([None] * len(utc), index=utc.index, dtype="object")
+    for offset in offsets.dropna().unique():
+        mask = offsets == offset
+        timezone = datetime.timezone(datetime.timedelta(minutes=int(offset)))
+        result[mask] = utc[mask].dt.tz_convert(timezone).astype("object")
+    naive_mask = offsets.isna() & utc.notna()
+    if naive_mask.any():
+        result[naive_mask] = utc[naive_mask].dt.tz_localize(None).astype("object")
+    return result
+
+
+def _from_table(table: pyarrow.Table, dtypes: dict[str, str]) -> pandas.DataFrame:
+    df = table.to_pandas(
+        types_mapper={
+            pyarrow.string(): pandas.StringDtype(),
+            pyarrow.large_string(): pandas.StringDtype(),
+        }.get,
+        # every column keeps its own (possibly memory mapped) buffer
+        split_blocks=True,
+    )
+
+    for column in TIMESTAMP_COLUMNS:
+        if column + UTC_OFFSET_SUFFIX not in df.columns:
+            continue
+        df[column] = _restore_timestamps(df[column], df.pop(column + UTC_OFFSET_SUFFIX))
+
+    # only the columns which type was not restored by Arrow are converted
+    for column, dtype in dtypes.items():
+        if df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+
+    return df[list(dtypes)]
+
+
+def save_snapshot(datasets: Datasets, path: str, fingerprint: str | None) -> None:
+    """
+    Saves extracted datasets as a set of Feather (Arrow IPC) files, so that
+    they could be loaded (memory mapped) later without the state.
+    """
+    LOGGER.info('saving datasets snapshot into "%s"', path)
+
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    ensure_dir(tmp_path)
+
+    data_frames = dict(
+        datasets.get_all_data_frames(),
+        jira_users=datasets.jira_users_df,
+        bitbucket_users=datasets.bitbucket_users_df,
+    )
+    dtypes: dict[str, dict[str, str]] = {}
+    for name, df in data_frames.items():
+        dtypes[name] = {column: str(dtype) for column, dtype in df.dtypes.items()}
+        pyarrow.feather.write_feather(
+            _to_table(df),
+            os.path.join(tmp_path, "%s.feather" % name),
+            # uncompressed files can be memory mapped
+            compression="uncompressed",
+        )
+
+    with open(os.path.join(tmp_path, MANIFEST_FILE_NAME), "w") as f:
+        json.dump(
+            {
+                "format_version": SNAPSHOT_FORMAT_VERSION,
+                "fingerprint": fingerprint,
+                "created_at": datetime.datetime.now().isoformat(),
+                # data types are restored exactly as they were extracted
+                "dtypes": dtypes,
+            },
+            f,
+        )
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp_path, path)
+
+
+def load_snapshot(path: str, fingerprint: str | None) -> Datasets | None:
+    """
+    Loads datasets snapshot if it exists and matches the given state
+    fingerprint, otherwise returns None.
+    """
+    manifest_path = os.path.join(path, MANIFEST_FILE_NAME)
+
+    if not os.path.exists(manifest_path):
+        LOGGER.info('datasets snapshot "%s" does not exist', path)
+        return None
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        LOGGER.warning('datasets snapshot "%s" has unsupported format, ignoring', path)
+        return None
+
+    if fingerprint is None or manifest.get("fingerprint") != fingerprint:
+        LOGGER.warning('datasets snapshot "%s" is outdated, ignoring', path)
+        return None
+
+    LOGGER.info('loading datasets snapshot from "%s"', path)
+
+    data_frames = {}
+    for name in ALL_DATASETS:
+        table = pyarrow.feather.read_table(
+            os.path.join(path, "%s.feather" % name),
+            memory_map=True,
+        )
+        data_frames[name] = _from_table(table, manifest["dtypes"][name])
+
+    return Datasets(
+        commits_df=data_frames["commits"],
+        commit_files_df=data_frames["commit_files"],
+        bitbucket_df=data_frames["bitbucket"],
+        jira_df=data_frames["jira"],
+        jira_users_df=data_frames["jira_users"],
+        bitbucket_users_df=data_frames["bitbucket_users"],
+        reviews_df=data_frames["reviews"],
+    )
@@ -1,24 +1,43 @@
+import collections
+import concurrent.futures
+import copy
 import datetime
+import functools
 import logging
 import math
+import threading
+from typing import Callable, Iterable, Iterator
 
 import atlassian.bitbucket as api
 import dateutil.parser
 import pytz
 
-from codoscope.state import SourceState, SourceType, VersionedState
+from codoscope.config import read_optional
+from codoscope.exceptions import ConfigError
+from codoscope.sources.throttling import DEFAULT_MAX_RETRIES, create_session
+from codoscope.state import (
+    ActorsRegistry,
+    CompactModel,
+    SourceState,
+    SourceType,
+    VersionedState,
+    intern_optional,
+)
 
 LOGGER = logging.getLogger(__name__)
 
 
-class ActorModel(VersionedState):
+class ActorModel(CompactModel):
+    __slots__ = ("account_id", "display_name")
+
     def __init__(self, account_id: str, display_name: str):
-        super().__init__()
-        self.account_id: str = account_id
-        self.display_name: str = display_name
+        self.account_id: str = intern_optional(account_id)
+        self.display_name: str = intern_optional(display_name)
 
 
-class CommentModel(VersionedState):
+class CommentModel(CompactModel):
+    __slots__ = ("comment_id", "author", "message", "created_on")
+
     def __init__(
         self,
         comment_id: str,
@@ -26,27 +45,44 @@ class CommentModel(VersionedState):
         message: str | None,
         created_on: datetime.datetime | None,
     ):
-        super().__init__()
         self.comment_id: str = comment_id
         self.author: ActorModel | None = author
         self.message: str | None = message
         self.created_on: datetime.datetime | None = created_on
 
 
-class PullRequestParticipantModel(VersionedState):
+class PullRequestParticipantModel(CompactModel):
+    __slots__ = ("user", "has_approved", "participated_on")
+
     def __init__(
         self,
         user: ActorModel | None,
         has_approved: bool | None,
         participated_on: datetime.datetime | None,
     ):
-        super().__init__()
         self.user: ActorModel | None = user
         self.has_approved: bool | None = has_approved
         self.participated_on: datetime.datetime | None = participated_on
 
 
-class PullRequestModel(VersionedState):
+class PullRequestModel(CompactModel):
+    __slots__ = (
+        "id",
+        "url",
+        "author",
+        "title",
+        "description",
+        "source_branch",
+        "destination_branch",
+        "state",
+        "participants",
+        "commentaries",
+        "created_on",
+        "updated_on",
+        "meta_version",
+        "comments_updated_on",
+    )
+
     def __init__(
         self,
         id: int,
@@ -61,21 +97,25 @@ class PullRequestModel(VersionedState):
         commentaries: list[CommentModel],
         created_on: datetime.datetime,
         updated_on: datetime.datetime,
+        meta_version: int | None = 1,
+        comments_updated_on: datetime.datetime | None = None,
     ):
-        super().__init__()
         self.id: int = id
         self.url: str = url
         self.author: ActorModel | None = author
         self.title: str | None = title
         self.description: str | None = description
-        self.source_branch: str | None = source_branch
-        self.destination_branch: str | None = destination_branch
-        self.commentaries: list[CommentModel] = commentaries
-        self.state: str | None = state
+        self.source_branch: str | None = intern_optional(source_branch)
+        self.destination_branch: str | None = intern_optional(destination_branch)
+        self.state: str | None = intern_optional(state)
         self.participants: list[PullRequestParticipantModel] | None = participants
+        self.commentaries: list[CommentModel] = commentaries
         self.created_on: datetime.datetime = created_on
         self.updated_on: datetime.datetime = updated_on
-        self.meta_version: int | None = 1
+        self.meta_version: int | None = meta_version
+        # high-water mark of the comments updates (None if never fetched in
+        # full), so that only the comments updated later have to be fetched
+        self.comments_updated_on: datetime.datetime | None = comments_updated_on
 
 
 class RepositoryModel(VersionedState):
@@ -111,6 +151,8 @@ class BitbucketState(SourceState):
     def __init__(self):
         super().__init__()
         self.projects_map: dict[str, ProjectModel] = {}
+        self.actors: ActorsRegistry[ActorModel] = ActorsRegistry(ActorModel)
+        self.version = 2
 
     @property
     def source_type(self) -> SourceType:
@@ -128,13 +170,67 @@ class BitbucketState(SourceState):
     def pull_requests_count(self):
         return sum(project.pull_requests_count for project in self.projects_map.values())
 
-
-def safe_get(what, fn, default=None):
-    try:
-        return fn()
-    except Exception as err:
-        LOGGER.warning('unable to get "%s" due to %s', what, err)
-        return default
+    def iter_items(self) -> Iterator[tuple[tuple[str, str, int], tuple, PullRequestModel]]:
+        for project_name, project in self.projects_map.items():
+            for repo_name, repo in project.repositories_map.items():
+                for pr_id, pr in repo.pull_requests_map.items():
+                    # comments edited since the previous ingestion move the
+                    # high-water mark w/o changing the counts
+                    revision = (
+                        pr.updated_on,
+                        pr.comments_updated_on,
+                        len(pr.commentaries),
+                        len(pr.participants or []),
+                    )
+                    yield (project_name, repo_name, pr_id), revision, pr
+
+    def put_item(self, key: tuple[str, str, int], item: PullRequestModel) -> None:
+        project_name, repo_name, pr_id = key
+        project = self.projects_map.setdefault(project_name, ProjectModel())
+        repo = project.repositories_map.setdefault(repo_name, RepositoryModel())
+        repo.pull_requests_map[pr_id] = item
+        self.intern_actors(item)
+
+    def get_actors(self) -> ActorsRegistry[ActorModel]:
+        return self.actors
+
+    def intern_actors(self, pr: PullRequestModel) -> None:
+        """
+        Makes PR reference registered actors (no-op for PRs ingested after the
+        registry was introduced).
+        """
+        actors = self.actors
+        pr.author = actors.intern(pr.author)
+        for participant in pr.participants or []:
+            participant.user = actors.intern(participant.user)
+        for comment in pr.commentaries:
+            comment.author = actors.intern(comment.author)
+
+    def copy_without_items(self) -> "BitbucketState":
+        result = copy.copy(self)
+        result.projects_map = {}
+        for project_name, project in self.projects_map.items():
+            project_copy = copy.copy(project)
+            project_copy.repositories_map = {}
+            for repo_name, repo in project.repositories_map.items():
+                repo_copy = copy.copy(repo)
+                repo_copy.pull_requests_map = {}
+                project_copy.repositories_map[repo_name] = repo_copy
+            result.projects_map[project_name] = project_copy
+        return result
+
+    def __setstate__(self, state):
+        version = state.get("version", 1)
+
+        # actors used to be stored separately for every reference
+        if version == 1:
+            state = dict(state, actors=ActorsRegistry(ActorModel), version=2)
+
+        self.__dict__.update(state)
+
+        if version == 1:
+            for _, _, pr in self.iter_items():
+                self.intern_actors(pr)
 
 
 DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
@@ -156,121 +252,386 @@ def total_pr_comments_count(state: BitbucketState) -> int:
     )
 
 
-def ingest_bitbucket(config: dict, state: BitbucketState | None) -> BitbucketState:
-    state = state or BitbucketState()
-
-    prs_count_before = state.pull_requests_count
-    prs_comments_count_before = total_pr_comments_count(state)
-
-    bitbucket = api.Cloud(
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_MAX_REPOSITORIES_CONCURRENCY = 4
+
+# maximal page sizes supported by the API (used in bulk mode)
+REPOSITORIES_PAGE_SIZE = 100
+PULL_REQUESTS_PAGE_SIZE = 50
+COMMENTS_PAGE_SIZE = 100
+
+# partial responses (used in bulk mode) with only the persisted fields, note
+# that listed PRs include participants only when they are requested explicitly
+REPOSITORY_FIELDS = ["slug", "created_on", "project.key", "links.self.href"]
+PULL_REQUEST_FIELDS = [
+    "id",
+    "title",
+    "description",
+    "state",
+    "author.account_id",
+    "author.display_name",
+    "source.branch.name",
+    "destination.branch.name",
+    "participants.user.account_id",
+    "participants.user.display_name",
+    "participants.approved",
+    "participants.participated_on",
+    "comment_count",
+    "created_on",
+    "updated_on",
+    "links.self.href",
+]
+COMMENT_FIELDS = [
+    "id",
+    "user.account_id",
+    "user.display_name",
+    "content.raw",
+    "created_on",
+    "updated_on",
+]
+
+
+def get_paged_params(fields: list[str], page_size: int) -> dict:
+    # link to the next page is a part of the response only if it is requested
+    return {
+        "pagelen": page_size,
+        "fields": ",".join(["next"] + ["values.%s" % field for field in fields]),
+    }
+
+
+def get_paged(bitbucket: api.Cloud, url: str, params: dict | None = None) -> Iterator[dict]:
+    """
+    Yields values of all the pages of the given (absolute) URL following the
+    links to the next page, which already include the query parameters.
+    """
+    while url is not None:
+        response = bitbucket.get(url, params=params, absolute=True)
+        yield from response.get("values", [])
+        url = response.get("next")
+        params = None
+
+
+def create_client(config: dict, pool_size: int) -> api.Cloud:
+    """
+    Creates client which session is shared by all the API objects: it keeps
+    a connection per concurrent request alive and pauses all the requests
+    whenever any of them is throttled.
+    """
+    session = create_session(
+        config["url"],
+        pool_size,
+        read_optional(config, "max-retries", DEFAULT_MAX_RETRIES),
+    )
+    return api.Cloud(
         url=config["url"],
         username=config["username"],
         password=config["password"],
+        session=session,
     )
 
-    workspace = bitbucket.workspaces.get(config["workspace"])
 
-    ingestion_limit = config.get("ingestion-limit", math.inf)
-    ingestion_counter = 0
+def list_repositories(
+    bitbucket: api.Cloud, workspace_name: str, project_keys: list[str]
+) -> dict[tuple[str, str], dict]:
+    """
+    Returns data of the repositories of the given projects keyed by project
+    key and repository slug, listed by a single (paged) workspace request.
+    """
+    query = " or ".join('project.key="%s"' % key for key in project_keys)
+    params = dict(get_paged_params(REPOSITORY_FIELDS, REPOSITORIES_PAGE_SIZE), q=query)
+    return {
+        (data["project"]["key"], data["slug"]): data
+        for data in get_paged(
+            bitbucket, "%s/repositories/%s" % (bitbucket.url, workspace_name), params
+        )
+    }
+
+
+def get_comments_query(since: datetime.datetime | None) -> str | None:
+    return "updated_on > %s" % format_datetime(since) if since else None
+
+
+def fetch_pull_request(
+    bitbucket: api.Cloud,
+    pull_requests_url: str,
+    comments_marks: dict[int, datetime.datetime],
+    data: dict,
+) -> tuple[dict, list[dict]]:
+    # participants are a part of the PR details, comments are paged separately
+    pr_url = "%s/%d" % (pull_requests_url, data["id"])
+    pr_data = bitbucket.get(pr_url, absolute=True)
+    params = {}
+    query = get_comments_query(comments_marks.get(data["id"]))
+    if query:
+        params["q"] = query
+    comments = get_paged(bitbucket, "%s/comments" % pr_url, params)
+    return pr_data, list(comments)
+
+
+def fetch_pull_request_comments(
+    bitbucket: api.Cloud,
+    pull_requests_url: str,
+    comments_marks: dict[int, datetime.datetime],
+    data: dict,
+) -> tuple[dict, list[dict]]:
+    # listed PR already has everything else (bulk mode)
+    if not data.get("comment_count"):
+        return data, []
+    params = get_paged_params(COMMENT_FIELDS, COMMENTS_PAGE_SIZE)
+    query = get_comments_query(comments_marks.get(data["id"]))
+    if query:
+        params["q"] = query
+    comments = get_paged(bitbucket, "%s/%d/comments" % (pull_requests_url, data["id"]), params)
+    return data, list(comments)
+
+
+def iter_pull_requests(
+    listing: Iterable[dict],
+    fetch: Callable[[dict], tuple[dict, list[dict]]],
+    executor: concurrent.futures.Executor,
+    max_pending: int,
+) -> Iterator[tuple[dict, list[dict]]]:
+    """
+    Yields data of the listed PRs with their comments in the order of the
+    listing (sorted by update date), while the rest of the data of up to
+    "max_pending" following PRs is fetched by the executor.
+    """
+    pending: collections.deque[concurrent.futures.Future] = collections.deque()
+    try:
+        for data in listing:
+            pending.append(executor.submit(fetch, data))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # ingestion limit reached or failed
+        for future in pending:
+            future.cancel()
 
-    def convert_user(user):
-        if user is None:
-            return None
-        return ActorModel(user.account_id, user.display_name)
 
-    for config_project in config["projects"]:
-        if ingestion_counter >= ingestion_limit:
-            break
+def parse_datetime(value: str | None) -> datetime.datetime | None:
+    return datetime.datetime.fromisoformat(value) if value else None
 
-        project_name = config_project["name"]
-        project = workspace.projects.get(project_name)
-        project_state = state.projects_map.setdefault(project_name, ProjectModel())
 
-        for config_repo in config_project["repositories"]:
-            if ingestion_counter >= ingestion_limit:
-                break
+def convert_user(actors: ActorsRegistry[ActorModel], data: dict | None) -> ActorModel | None:
+    if data is None:
+        return None
+    return actors.intern(ActorModel(data.get("account_id"), data.get("display_name")))
+
+
+def merge_comments(
+    comments: list[CommentModel], updated_comments: list[CommentModel]
+) -> list[CommentModel]:
+    """
+    Replaces the comments which were updated and appends the new ones.
+    """
+    updated_comments_map = {comment.comment_id: comment for comment in updated_comments}
+    result = [updated_comments_map.pop(comment.comment_id, comment) for comment in comments]
+    result.extend(updated_comments_map.values())
+    return result
+
+
+def convert_pull_request(
+    actors: ActorsRegistry[ActorModel],
+    data: dict,
+    comments: list[dict],
+    previous: PullRequestModel | None = None,
+) -> PullRequestModel:
+    """
+    Converts PR with its comments, which are only the comments updated since
+    the comments high-water mark of the previously ingested PR if it is given.
+    """
+    participants = [
+        PullRequestParticipantModel(
+            convert_user(actors, participant.get("user")),
+            participant.get("approved"),
+            parse_datetime(participant.get("participated_on")),
+        )
+        for participant in data.get("participants", [])
+    ]
+
+    commentaries = [
+        CommentModel(
+            comment["id"],
+            convert_user(actors, comment.get("user")),
+            comment["content"]["raw"],
+            dateutil.parser.parse(comment["created_on"]),
+        )
+        for comment in comments
+    ]
+
+    # comments are fetched after the PR, so none updated before the PR is missed
+    comments_updated_on = max(
+        [parse_datetime(data["updated_on"])]
+        + [parse_datetime(comment["updated_on"]) for comment in comments]
+    )
 
-            repo_name = config_repo["name"]
-            LOGGER.info(
-                'ingesting repository "%s" (project "%s")',
-                repo_name,
-                project_name,
-            )
+    # comments of the PR which has none left are not fetched (bulk mode), so
+    # the previously ingested ones are dropped rather than merged
+    if previous is not None and data.get("comment_count") != 0:
+        commentaries = merge_comments(previous.commentaries, commentaries)
+        comments_updated_on = max(comments_updated_on, previous.comments_updated_on)
+
+    return PullRequestModel(
+        data["id"],
+        data["links"]["self"]["href"],
+        convert_user(actors, data.get("author")),
+        data.get("title"),
+        data.get("description"),
+        data["source"]["branch"]["name"],
+        data["destination"]["branch"]["name"],
+        data.get("state"),
+        participants,
+        commentaries,
+        parse_datetime(data["created_on"]),
+        parse_datetime(data["updated_on"]),
+        comments_updated_on=comments_updated_on,
+    )
 
-            repo = project.repositories.get(repo_name)
-            repo_state = project_state.repositories_map.setdefault(repo_name, RepositoryModel())
 
-            repo_state.crated_on = repo.created_on
-            repo_state.url = repo.url
+def ingest_bitbucket(config: dict, state: BitbucketState | None) -> BitbucketState:
+    """
+    Ingests PRs of the configured repositories updated since the previous
+    ingestion. By default every PR is fetched in full, in bulk mode PRs are
+    listed with only the persisted fields (including participants), so that
+    only comments of the commented PRs are fetched on top of the listing.
+    Repositories are ingested concurrently, every one up to its own cutoff
+    date, while PRs details and comments are fetched by the shared pool.
+    """
+    state = state or BitbucketState()
+
+    prs_count_before = state.pull_requests_count
+    prs_comments_count_before = total_pr_comments_count(state)
 
-            cutoff_date = repo_state.cutoff_date
+    max_concurrency = read_optional(config, "max-concurrency", DEFAULT_MAX_CONCURRENCY)
+    max_repositories_concurrency = read_optional(
+        config, "max-repositories-concurrency", DEFAULT_MAX_REPOSITORIES_CONCURRENCY
+    )
+    if max_concurrency < 1 or max_repositories_concurrency < 1:
+        raise ConfigError("bitbucket concurrency limits are expected to be positive")
 
-            if config.get("cutoff-date"):
-                # YAML has built-in support for date and datetime types
-                cutoff_date = config["cutoff-date"]
-                if isinstance(cutoff_date, datetime.date):
-                    cutoff_date = datetime.datetime.combine(cutoff_date, datetime.time.min)
-                LOGGER.warning('overriding cutoff date with "%s"', cutoff_date)
+    bulk_mode = read_optional(config, "bulk-mode", False)
 
-            # by default only open PRs are returned
-            query = '(state="MERGED" or state="OPEN" or state="DECLINED" or state="SUPERSEDED")'
-            if cutoff_date:
-                query += " and updated_on > %s" % format_datetime(cutoff_date)
+    # PRs are listed by the repositories workers concurrently with fetching
+    bitbucket = create_client(config, max_concurrency + max_repositories_concurrency)
 
-            for pr in repo.pullrequests.each(
-                q=query,
-                sort="updated_on",
-            ):
-                pr_author = safe_get("author of PR %s" % pr.url, lambda: pr.author)
-                author = convert_user(pr_author)
+    ingestion_limit = config.get("ingestion-limit", math.inf)
+    ingestion_counter = 0
 
-                LOGGER.debug(
-                    '  processing "%s" which is created on %s by %s',
-                    pr.url,
-                    pr.created_on,
-                    (author.display_name if author and author.display_name else "???"),
+    # converting PRs (which interns actors) and updating the state
+    state_lock = threading.Lock()
+
+    if bulk_mode:
+        repositories = list_repositories(
+            bitbucket,
+            config["workspace"],
+            [config_project["name"] for config_project in config["projects"]],
+        )
+    else:
+        workspace = bitbucket.workspaces.get(config["workspace"])
+        projects = {
+            config_project["name"]: workspace.projects.get(config_project["name"])
+            for config_project in config["projects"]
+        }
+
+    def ingest_repository(
+        project_name: str, repo_name: str, executor: concurrent.futures.Executor
+    ) -> None:
+        nonlocal ingestion_counter
+
+        with state_lock:
+            if ingestion_counter >= ingestion_limit:
+                return
+            project_state = state.projects_map.setdefault(project_name, ProjectModel())
+            repo_state = project_state.repositories_map.setdefault(repo_name, RepositoryModel())
+
+        LOGGER.info(
+            'ingesting repository "%s" (project "%s")',
+            repo_name,
+            project_name,
+        )
+
+        if bulk_mode:
+            repo_data = repositories.get((project_name, repo_name))
+            if repo_data is None:
+                raise ConfigError(
+                    'repository "%s" is not found in "%s" project' % (repo_name, project_name)
                 )
+            repo_url = repo_data["links"]["self"]["href"]
+            repo_created_on = parse_datetime(repo_data.get("created_on"))
+        else:
+            repo = projects[project_name].repositories.get(repo_name)
+            repo_url = repo.url
+            repo_created_on = repo.created_on
+
+        repo_state.crated_on = repo_created_on
+        repo_state.url = repo_url
+
+        cutoff_date = repo_state.cutoff_date
+
+        if config.get("cutoff-date"):
+            # YAML has built-in support for date and datetime types
+            cutoff_date = config["cutoff-date"]
+            if isinstance(cutoff_date, datetime.date):
+                cutoff_date = datetime.datetime.combine(cutoff_date, datetime.time.min)
+            LOGGER.warning('overriding cutoff date with "%s"', cutoff_date)
+
+        # by default only open PRs are returned
+        query = '(state="MERGED" or state="OPEN" or state="DECLINED" or state="SUPERSEDED")'
+        if cutoff_date:
+            query += " and updated_on > %s" % format_datetime(cutoff_date)
+
+        pull_requests_url = "%s/pullrequests" % repo_url
+        params = {"q": query, "sort": "updated_on"}
+        # comments of the PRs ingested before are fetched differentially
+        comments_marks = {
+            pr_id: pr.comments_updated_on
+            for pr_id, pr in repo_state.pull_requests_map.items()
+            if pr.comments_updated_on is not None
+        }
+        if bulk_mode:
+            params.update(get_paged_params(PULL_REQUEST_FIELDS, PULL_REQUESTS_PAGE_SIZE))
+            fetch = functools.partial(
+                fetch_pull_request_comments, bitbucket, pull_requests_url, comments_marks
+            )
+        else:
+            fetch = functools.partial(
+                fetch_pull_request, bitbucket, pull_requests_url, comments_marks
+            )
 
-                repo_state.cutoff_date = pr.updated_on
+        # PRs are processed in the order of update, so that the cutoff date
+        # only advances past the PRs which are already in the state
+        for data, comments in iter_pull_requests(
+            get_paged(bitbucket, pull_requests_url, params),
+            fetch,
+            executor,
+            2 * max_concurrency,
+        ):
+            with state_lock:
+                if ingestion_counter >= ingestion_limit:
+                    break
 
-                pr_participants = []
-                for participant in pr.participants():
-                    participant_actor = convert_user(participant.user)
-                    has_approved = participant.has_approved
-                    participated_on = participant.participated_on
-                    pr_participant = PullRequestParticipantModel(
-                        participant_actor, has_approved, participated_on
-                    )
-                    pr_participants.append(pr_participant)
-
-                pr_comments = []
-                for comment in pr.comments():
-                    comment_actor = convert_user(comment.user)
-                    comment_id = comment.data["id"]
-                    pr_comments.append(
-                        CommentModel(
-                            comment_id,
-                            comment_actor,
-                            comment.raw,
-                            dateutil.parser.parse(comment.data["created_on"]),
-                        )
-                    )
+                previous = (
+                    repo_state.pull_requests_map[data["id"]]
+                    if data["id"] in comments_marks
+                    else None
+                )
+                pr_model = convert_pull_request(state.actors, data, comments, previous)
 
-                pr_model = PullRequestModel(
-                    pr.id,
-                    pr.url,
-                    author,
-                    pr.title,
-                    pr.description,
-                    pr.source_branch,
-                    pr.destination_branch,
-                    pr.data.get("state"),
-                    pr_participants,
-                    pr_comments,
-                    pr.created_on,
-                    pr.updated_on,
+                LOGGER.debug(
+                    '  processing "%s" which is created on %s by %s',
+                    pr_model.url,
+                    pr_model.created_on,
+                    (
+                        pr_model.author.display_name
+                        if pr_model.author and pr_model.author.display_name
+                        else "???"
+                    ),
                 )
-                repo_state.pull_requests_map[pr.id] = pr_model
+
+                repo_state.cutoff_date = pr_model.updated_on
+                repo_state.pull_requests_map[pr_model.id] = pr_model
 
                 # check if we reached the ingestion limit
                 ingestion_counter += 1
@@ -280,6 +641,32 @@ def ingest_bitbucket(config: dict, state: BitbucketState | None) -> BitbucketSta
                 if ingestion_counter % 100 == 0:
                     LOGGER.info("  ingested %d PRs", ingestion_counter)
 
+    # repositories workers wait for the fetches, so they need separate pools
+    with (
+        concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="bitbucket"
+        ) as executor,
+        concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_repositories_concurrency, thread_name_prefix="bitbucket-repo"
+        ) as repositories_executor,
+    ):
+        futures = [
+            repositories_executor.submit(
+                ingest_repository, config_project["name"], config_repo["name"], executor
+            )
+            for config_project in config["projects"]
+            for config_repo in config_project["repositories"]
+        ]
+
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+        except BaseException:
+            # repositories being ingested are completed
+            for future in futures:
+                future.cancel()
+            raise
+
     LOGGER.info(
         "ingested %d new PRs and %d new PR comments",
         state.pull_requests_count - prs_count_before,
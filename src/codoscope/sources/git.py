@@ -1,23 +1,37 @@
+import copy
 import datetime
 import fnmatch
 import logging
 import math
+import subprocess
+import time
+from typing import Callable, Container, Iterator
 
 import git
 
 from codoscope.common import date_time_minutes_offset
-from codoscope.state import SourceState, SourceType
+from codoscope.config import read_optional
+from codoscope.state import (
+    CompactModel,
+    SourceState,
+    SourceType,
+    intern_optional,
+)
 
 LOGGER = logging.getLogger(__name__)
 
 
-class ChangedFileStatModel:
+class ChangedFileStatModel(CompactModel):
+    __slots__ = ("insertions", "deletions")
+
     def __init__(self, insertions: int, deletions: int):
         self.insertions: int = insertions
         self.deletions: int = deletions
 
 
-class CommitStats:
+class CommitStats(CompactModel):
+    __slots__ = ("changed_files",)
+
     def __init__(self, changed_files: dict[str, ChangedFileStatModel]):
         self.changed_files: dict[str, ChangedFileStatModel] = changed_files
 
@@ -34,7 +48,18 @@ class CommitStats:
         return self.total_insertions + self.total_deletions
 
 
-class CommitModel:
+class CommitModel(CompactModel):
+    __slots__ = (
+        "hexsha",
+        "author_name",
+        "author_email",
+        "committed_datetime",
+        "authored_datetime",
+        "message",
+        "stats",
+        "parent_hexsha",
+    )
+
     def __init__(
         self,
         hexsha: str,
@@ -47,8 +72,8 @@ class CommitModel:
         parent_hexsha: list[str],
     ):
         self.hexsha: str = hexsha
-        self.author_name: str = author_name
-        self.author_email: str = author_email
+        self.author_name: str = intern_optional(author_name)
+        self.author_email: str = intern_optional(author_email)
         self.committed_datetime: datetime.datetime = committed_datetime
         self.authored_datetime: datetime.datetime = authored_datetime
         self.message: str = message
@@ -68,6 +93,9 @@ class RepoModel(SourceState):
     def __init__(self):
         super().__init__()
         self.commits_map: dict[str, CommitModel] = {}
+        # maps ref path to the tip commit which history was fully ingested
+        self.ref_tips: dict[str, str] = {}
+        self.version = 2
 
     @property
     def source_type(self) -> SourceType:
@@ -77,6 +105,163 @@ class RepoModel(SourceState):
     def commits_count(self):
         return len(self.commits_map)
 
+    def iter_items(self) -> Iterator[tuple[str, None, CommitModel]]:
+        # commits are immutable
+        for hexsha, commit in self.commits_map.items():
+            yield hexsha, None, commit
+
+    def put_item(self, key: str, item: CommitModel) -> None:
+        self.commits_map[key] = item
+
+    def copy_without_items(self) -> "RepoModel":
+        result = copy.copy(self)
+        result.commits_map = {}
+        return result
+
+    def __setstate__(self, state):
+        # initialize the new property
+        if state.get("version", 1) == 1:
+            state = dict(state, ref_tips={}, version=2)
+
+        self.__dict__.update(state)
+
+
+# "git log" output is parsed as a stream of records (one per commit) where
+# the header fields are separated by the unit separator and the message is
+# terminated by the group separator, followed by the "--numstat" lines
+GIT_LOG_RECORD_SEPARATOR = b"\x1e"
+GIT_LOG_FIELD_SEPARATOR = "\x1f"
+GIT_LOG_MESSAGE_TERMINATOR = "\x1d"
+GIT_LOG_FORMAT = "%x1e%H%x1f%P%x1f%an%x1f%ae%x1f%aI%x1f%cI%x1f%B%x1d"
+GIT_LOG_READ_CHUNK_SIZE = 1024 * 1024
+
+# amount of commits passed to a single "git log" process
+GIT_LOG_BATCH_SIZE = 10000
+
+# ingested commits are checkpointed into the state store every N commits or
+# every M seconds, whichever comes first
+DEFAULT_CHECKPOINT_COMMITS = 10000
+DEFAULT_CHECKPOINT_INTERVAL_SECONDS = 300.0
+
+
+def _iter_process_records(process, separator: bytes) -> Iterator[str]:
+    """
+    Yields records of the git process output as they are produced, so that
+    memory usage does not depend on the history size. Process is terminated
+    if the caller stops iteration early.
+    """
+    completed = False
+    try:
+        buffer = b""
+        for chunk in iter(lambda: process.stdout.read(GIT_LOG_READ_CHUNK_SIZE), b""):
+            buffer += chunk
+            *records, buffer = buffer.split(separator)
+            for record in records:
+                if record:
+                    yield record.decode("utf-8", errors="replace")
+        if buffer:
+            yield buffer.decode("utf-8", errors="replace")
+        completed = True
+    finally:
+        if completed:
+            # raises if git exited with an error
+            process.wait()
+        else:
+            process.proc.kill()
+            process.proc.wait()
+
+
+def _iter_git_log_records(repo: git.Repo, hexshas: list[str]) -> Iterator[str]:
+    """
+    Runs single "git log" process for given commits (passed via stdin, as
+    there can be too many for the command line) and yields raw records.
+    """
+    process = repo.git.log(
+        "--stdin",
+        "--no-walk=unsorted",
+        "--numstat",
+        "--no-renames",
+        "--root",
+        # same as GitPython stats: merge commits are compared to the first parent
+        "--diff-merges=first-parent",
+        "--no-show-signature",
+        "--no-color",
+        f"--format={GIT_LOG_FORMAT}",
+        as_process=True,
+        istream=subprocess.PIPE,
+    )
+    # revisions are read before any output is produced, so it can't block
+    process.proc.stdin.write("\n".join(hexshas).encode("ascii"))
+    process.proc.stdin.close()
+    yield from _iter_process_records(process, GIT_LOG_RECORD_SEPARATOR)
+
+
+def _iter_new_commit_records(
+    repo: git.Repo, revisions: list[str], known_hexshas: Container[str]
+) -> Iterator[str]:
+    """
+    Walks the history with "git rev-list" (which is cheap as no diffs are
+    computed) and only runs "git log" for the commits not ingested yet, in
+    batches. This way the ingestion interrupted in the middle resumes from
+    the last checkpoint instead of computing all the diffs again.
+    """
+    batch: list[str] = []
+    process = repo.git.rev_list(*revisions, as_process=True)
+    for hexsha in _iter_process_records(process, b"\n"):
+        if hexsha in known_hexshas:
+            continue
+        batch.append(hexsha)
+        if len(batch) >= GIT_LOG_BATCH_SIZE:
+            yield from _iter_git_log_records(repo, batch)
+            batch = []
+
+    if batch:
+        yield from _iter_git_log_records(repo, batch)
+
+
+def _parse_git_log_record(record: str) -> CommitModel:
+    header, numstat = record.split(GIT_LOG_MESSAGE_TERMINATOR, 1)
+    (
+        hexsha,
+        parents,
+        author_name,
+        author_email,
+        authored_date,
+        committed_date,
+        message,
+    ) = header.split(GIT_LOG_FIELD_SEPARATOR, 6)
+
+    changed_files = {}
+    for line in numstat.splitlines():
+        if not line:
+            continue
+        insertions, deletions, file_name = line.split("\t", 2)
+        # binary files are reported with "-" instead of line counts
+        changed_files[file_name.strip()] = ChangedFileStatModel(
+            int(insertions) if insertions != "-" else 0,
+            int(deletions) if deletions != "-" else 0,
+        )
+
+    return CommitModel(
+        hexsha,
+        author_name,
+        author_email,
+        datetime.datetime.fromisoformat(committed_date),
+        datetime.datetime.fromisoformat(authored_date),
+        message,
+        stats=CommitStats(changed_files),
+        parent_hexsha=parents.split(),
+    )
+
+
+def _is_ancestor(repo: git.Repo, ancestor: str, rev: str) -> bool:
+    try:
+        return repo.is_ancestor(ancestor, rev)
+    except git.GitCommandError as err:
+        # ancestor commit could be garbage collected after the history rewrite
+        LOGGER.debug("unable to check if %s is ancestor of %s: %s", ancestor, rev, err)
+        return False
+
 
 def ingest_git_repo(
     config: dict,
@@ -84,9 +269,20 @@ def ingest_git_repo(
     path: str,
     branches: list[str] | None = None,
     ingestion_limit: int | None = None,
+    checkpoint: Callable[[RepoModel], None] | None = None,
 ) -> RepoModel:
+    """
+    Ingests commits of the matching remote branches. When checkpoint callback
+    is given, it is periodically called with partially ingested state; tips
+    of the branches are only updated once their history is fully ingested.
+    """
     repo_state = repo_state or RepoModel()
 
+    checkpoint_commits = read_optional(config, "checkpoint-commits", DEFAULT_CHECKPOINT_COMMITS)
+    checkpoint_interval = read_optional(
+        config, "checkpoint-interval", DEFAULT_CHECKPOINT_INTERVAL_SECONDS
+    )
+
     repo = git.Repo(path)
     remote_name = config.get("remote", "origin")
     remote = repo.remote(remote_name)
@@ -107,62 +303,92 @@ def ingest_git_repo(
 
     ingestion_limit: float = ingestion_limit or math.inf
 
-    for ref in remote.refs:
-        if commits_counter >= ingestion_limit:
-            break
+    # all matching refs are traversed in a single revision walk, so that the
+    # history shared between the branches is only visited once
+    revisions: list[str] = []
+    new_tips: dict[str, str] = {}
 
+    for ref in remote.refs:
         if not is_matching_filters(ref):
             continue
 
-        LOGGER.info(f'processing "%s"', ref.path)
+        new_tip = ref.commit.hexsha
+        old_tip = repo_state.ref_tips.get(ref.path)
 
-        for commit in repo.iter_commits(ref):
-            if commit.hexsha in repo_state.commits_map:
-                continue
+        if old_tip == new_tip:
+            LOGGER.info('"%s" is up to date', ref.path)
+            continue
+
+        LOGGER.info(
+            'processing "%s" (%s)', ref.path, f"{old_tip}..{new_tip}" if old_tip else new_tip
+        )
+
+        new_tips[ref.path] = new_tip
+        revisions.append(new_tip)
+
+        # only walk the commits added since the last ingested tip unless the
+        # history was rewritten (e.g. force-pushed), then walk it fully
+        if old_tip is not None:
+            if _is_ancestor(repo, old_tip, new_tip):
+                revisions.append(f"^{old_tip}")
+            else:
+                LOGGER.warning(
+                    'history of "%s" was rewritten (%s is not an ancestor of %s), '
+                    "falling back to full walk",
+                    ref.path,
+                    old_tip,
+                    new_tip,
+                )
+
+    is_limit_reached = False
+
+    if new_tips:
+        LOGGER.info("walking history of %d refs", len(new_tips))
 
+        checkpointed_counter = 0
+        checkpointed_at = time.monotonic()
+
+        for record in _iter_new_commit_records(repo, revisions, repo_state.commits_map):
             if commits_counter >= ingestion_limit:
                 LOGGER.warning("  ingestion limit of %d reached", ingestion_limit)
+                is_limit_reached = True
                 break
 
-            if commit.author is None:
-                LOGGER.warning("commit %s has unknown author - skip", commit.hexsha)
-                continue
+            commit_model = _parse_git_log_record(record)
 
-            assert commit.author is not None
+            if not commit_model.author_name and not commit_model.author_email:
+                LOGGER.warning("commit %s has unknown author - skip", commit_model.hexsha)
+                continue
 
             commits_counter += 1
 
-            author = "%s (%s)" % (commit.author.name, commit.author.email)
             LOGGER.debug(
-                f'  processing commit #%d: %s by "%s" at "%s"',
+                f'  processing commit #%d: %s by "%s (%s)" at "%s"',
                 commits_counter,
-                commit.hexsha,
-                author,
-                commit.committed_datetime,
+                commit_model.hexsha,
+                commit_model.author_name,
+                commit_model.author_email,
+                commit_model.committed_datetime,
             )
 
-            changed_files = {
-                file_name: ChangedFileStatModel(file_stat["insertions"], file_stat["deletions"])
-                for file_name, file_stat in commit.stats.files.items()
-            }
-
-            commit_model = CommitModel(
-                commit.hexsha,
-                commit.author.name,
-                commit.author.email,
-                commit.committed_datetime,
-                commit.authored_datetime,
-                commit.message,
-                stats=CommitStats(
-                    changed_files,
-                ),
-                parent_hexsha=[parent.hexsha for parent in (commit.parents or [])],
-            )
-            repo_state.commits_map[commit.hexsha] = commit_model
+            repo_state.commits_map[commit_model.hexsha] = commit_model
 
             if commits_counter % 1000 == 0:
                 LOGGER.info(f"  ingested %d commits", commits_counter)
 
+            if checkpoint is not None and (
+                commits_counter - checkpointed_counter >= checkpoint_commits
+                or time.monotonic() - checkpointed_at >= checkpoint_interval
+            ):
+                LOGGER.info("  checkpointing after %d commits", commits_counter)
+                checkpoint(repo_state)
+                checkpointed_counter = commits_counter
+                checkpointed_at = time.monotonic()
+
+    # partially ingested history has to be walked again next time
+    if not is_limit_reached:
+        repo_state.ref_tips.update(new_tips)
+
     LOGGER.info(f"ingested %d new commits", commits_counter)
 
     return repo_state
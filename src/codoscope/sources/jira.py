@@ -1,31 +1,45 @@
+import concurrent.futures
+import copy
 import datetime
 import logging
 import math
+from typing import Iterator
 
 import atlassian.jira as api
 import dateutil.parser
 import pytz
 
 from codoscope.config import read_optional
-from codoscope.state import SourceState, SourceType, VersionedState
+from codoscope.exceptions import ConfigError
+from codoscope.sources.throttling import DEFAULT_MAX_RETRIES, create_session
+from codoscope.state import (
+    ActorsRegistry,
+    CompactModel,
+    SourceState,
+    SourceType,
+    intern_optional,
+)
 
 LOGGER = logging.getLogger(__name__)
 
 
-class ActorModel(VersionedState):
+class ActorModel(CompactModel):
+    __slots__ = ("account_id", "display_name", "email")
+
     def __init__(
         self,
         account_id: str,
         display_name: str,
         email: str | None,
     ):
-        super().__init__()
-        self.account_id: str = account_id
-        self.display_name: str = display_name
-        self.email: str | None = email
+        self.account_id: str = intern_optional(account_id)
+        self.display_name: str = intern_optional(display_name)
+        self.email: str | None = intern_optional(email)
 
 
-class UserModel(VersionedState):
+class UserModel(CompactModel):
+    __slots__ = ("account_id", "display_name", "email", "is_active", "account_type")
+
     def __init__(
         self,
         account_id: str,
@@ -34,7 +48,6 @@ class UserModel(VersionedState):
         is_active: bool,
         account_type: str | None,
     ):
-        super().__init__()
         self.account_id: str = account_id
         self.display_name: str | None = display_name
         self.email: str | None = email
@@ -42,7 +55,9 @@ class UserModel(VersionedState):
         self.account_type: str | None = account_type
 
 
-class JiraCommentModel(VersionedState):
+class JiraCommentModel(CompactModel):
+    __slots__ = ("comment_id", "message", "created_by", "created_on")
+
     def __init__(
         self,
         comment_id: str,
@@ -50,14 +65,15 @@ class JiraCommentModel(VersionedState):
         created_by: ActorModel,
         created_on: datetime.datetime,
     ):
-        super().__init__()
         self.comment_id: str = comment_id
         self.message: str = message
         self.created_by: ActorModel = created_by
         self.created_on: datetime.datetime = created_on
 
 
-class JiraChangeLogItemModel(VersionedState):
+class JiraChangeLogItemModel(CompactModel):
+    __slots__ = ("actor", "created_on", "field", "from_value", "to_value")
+
     def __init__(
         self,
         actor: ActorModel | None,
@@ -66,15 +82,34 @@ class JiraChangeLogItemModel(VersionedState):
         from_value: str | None,
         to_value: str | None,
     ):
-        super().__init__()
         self.actor: ActorModel = actor
         self.created_on: datetime.datetime = created_on
-        self.field: str = field
+        self.field: str = intern_optional(field)
         self.from_value: str | None = from_value
         self.to_value: str | None = to_value
 
 
-class JiraItemModel(VersionedState):
+class JiraItemModel(CompactModel):
+    __slots__ = (
+        "id",
+        "key",
+        "item_type",
+        "summary",
+        "description",
+        "status_name",
+        "status_category_name",
+        "creator",
+        "assignee",
+        "reporter",
+        "components",
+        "labels",
+        "comments",
+        "change_log",
+        "created_on",
+        "updated_on",
+        "change_log_updated_on",
+    )
+
     def __init__(
         self,
         id: str,
@@ -93,15 +128,15 @@ class JiraItemModel(VersionedState):
         change_log: list[JiraChangeLogItemModel] | None,
         created_on: datetime.datetime,
         updated_on: datetime.datetime | None,
+        change_log_updated_on: datetime.datetime | None = None,
     ):
-        super().__init__()
         self.id: str = id
         self.key: str = key
-        self.item_type: str = item_type
+        self.item_type: str = intern_optional(item_type)
         self.summary: str = summary
         self.description: str | None = description
-        self.status_name: str = status_name
-        self.status_category_name: str = status_category_name
+        self.status_name: str = intern_optional(status_name)
+        self.status_category_name: str = intern_optional(status_category_name)
         self.creator: ActorModel = creator
         self.assignee: ActorModel | None = assignee
         self.reporter: ActorModel | None = reporter
@@ -111,6 +146,10 @@ class JiraItemModel(VersionedState):
         self.change_log: list[JiraChangeLogItemModel] | None = change_log
         self.created_on: datetime.datetime | None = created_on
         self.updated_on: datetime.datetime | None = updated_on
+        # update date of the issue when its complete change log was ingested
+        # (None if it could be truncated), so that it is not fetched again
+        # until the issue is updated
+        self.change_log_updated_on: datetime.datetime | None = change_log_updated_on
 
 
 class JiraState(SourceState):
@@ -121,7 +160,8 @@ class JiraState(SourceState):
         # maintains map from account ID to user for discovered users
         self.users_map: dict[str, UserModel] = {}
         self.users_refresh_date: datetime.datetime | None = None
-        self.version = 2
+        self.actors: ActorsRegistry[ActorModel] = ActorsRegistry(ActorModel)
+        self.version = 3
 
     @property
     def source_type(self) -> SourceType:
@@ -135,13 +175,58 @@ class JiraState(SourceState):
     def total_comments_count(self):
         return sum(len(x.comments or []) for x in self.items_map.values())
 
+    def iter_items(self) -> Iterator[tuple[str, tuple, JiraItemModel]]:
+        for item_id, item in self.items_map.items():
+            revision = (
+                item.updated_on,
+                len(item.comments or []),
+                len(item.change_log or []),
+            )
+            yield item_id, revision, item
+
+    def put_item(self, key: str, item: JiraItemModel) -> None:
+        self.items_map[key] = item
+        self.intern_actors(item)
+
+    def get_actors(self) -> ActorsRegistry[ActorModel]:
+        return self.actors
+
+    def intern_actors(self, item: JiraItemModel) -> None:
+        """
+        Makes item reference registered actors (no-op for items ingested after
+        the registry was introduced).
+        """
+        actors = self.actors
+        item.creator = actors.intern(item.creator)
+        item.assignee = actors.intern(item.assignee)
+        item.reporter = actors.intern(item.reporter)
+        for comment in item.comments or []:
+            comment.created_by = actors.intern(comment.created_by)
+        for change_log_item in item.change_log or []:
+            change_log_item.actor = actors.intern(change_log_item.actor)
+
+    def copy_without_items(self) -> "JiraState":
+        result = copy.copy(self)
+        result.items_map = {}
+        return result
+
     def __setstate__(self, state):
-        # initialize the new property
-        if getattr(state, "version", 1) == 1:
-            self.users_refresh_date = None
+        version = state.get("version", 1)
+
+        # initialize the new properties
+        if version == 1:
+            state = dict(state, users_refresh_date=None, version=2)
+
+        # actors used to be stored separately for every reference
+        if version <= 2:
+            state = dict(state, actors=ActorsRegistry(ActorModel), version=3)
 
         self.__dict__.update(state)
 
+        if version <= 2:
+            for item in self.items_map.values():
+                self.intern_actors(item)
+
 
 # constant used by the BitBucket API when returning comments inline with the
 # issue data; when there are more comments, we need to fetch them separately
@@ -150,8 +235,13 @@ DEFAULT_COMMENTS_LIMIT = 100
 # values more than 100 do not seem to work
 COMMENTS_PAGE_SIZE = 100
 
+# change log inlined with the issue data is truncated as well
+CHANGE_LOG_PAGE_SIZE = 100
+
 DEFAULT_USER_REFRESH_INTERVAL_DAYS = 7.0
 
+DEFAULT_MAX_CONCURRENCY = 8
+
 
 # after recent API changes JIRA only returns 100 comments by default and current
 # python API does not expose a way to get all comments for an issue
@@ -181,6 +271,32 @@ def _get_all_comments(jira: api.Jira, issue_id: str) -> list[dict]:
     return result
 
 
+def _get_all_histories(jira: api.Jira, issue_id: str) -> list[dict]:
+    offset = 0
+    result = []
+    while True:
+        url = "{base_url}/{issue_id}/changelog".format(
+            base_url=jira.resource_url("issue"),
+            issue_id=issue_id,
+        )
+        response = jira.get(
+            url,
+            params={
+                "startAt": offset,
+                "maxResults": CHANGE_LOG_PAGE_SIZE,
+            },
+        )
+        histories_page = response["values"]
+        result.extend(histories_page)
+        offset += len(histories_page)
+
+        # stop if we do not have full page (use effective page size)
+        if len(histories_page) < response["maxResults"]:
+            break
+
+    return result
+
+
 def __populate_users_map(state: JiraState, jira_api: api.Jira, page_size: int = 1000):
     offset = 0
     while True:
@@ -211,11 +327,21 @@ def ingest_jira(config: dict, state: JiraState | None) -> JiraState:
 
     is_cloud = config.get("cloud", True)
 
+    max_concurrency = read_optional(config, "max-concurrency", DEFAULT_MAX_CONCURRENCY)
+    if max_concurrency < 1:
+        raise ConfigError("jira max concurrency is expected to be positive")
+
     jira = api.Jira(
         url=config["url"],
         username=config["username"],
         password=config["password"],
         cloud=is_cloud,
+        # pages of items are fetched concurrently with the comments
+        session=create_session(
+            config["url"],
+            max_concurrency + 1,
+            read_optional(config, "max-retries", DEFAULT_MAX_RETRIES),
+        ),
     )
 
     ingestion_counter = 0
@@ -244,10 +370,12 @@ def ingest_jira(config: dict, state: JiraState | None) -> JiraState:
     def convert_actor(data) -> ActorModel | None:
         if not data:
             return None
-        return ActorModel(
-            account_id=data["accountId"],
-            display_name=data["displayName"],
-            email=data.get("emailAddress"),
+        return state.actors.intern(
+            ActorModel(
+                account_id=data["accountId"],
+                display_name=data["displayName"],
+                email=data.get("emailAddress"),
+            )
         )
 
     def convert_components(data):
@@ -306,103 +434,168 @@ def ingest_jira(config: dict, state: JiraState | None) -> JiraState:
     start = 0
     next_page_token = None
 
-    while True:
+    def get_page() -> dict:
         if is_cloud:
-            response = jira.enhanced_jql(
+            return jira.enhanced_jql(
                 query,
                 limit=limit,
                 expand="changelog,comments",
                 nextPageToken=next_page_token,
             )
-        else:
-            response = jira.jql(
-                query,
-                start=start,
-                limit=limit,
-                expand="changelog,comments",
+        return jira.jql(
+            query,
+            start=start,
+            limit=limit,
+            expand="changelog,comments",
+        )
+
+    def has_truncated_comments(issue: dict) -> bool:
+        comments_data = issue["fields"].get("comment", {})
+        if len(comments_data.get("comments")) < comments_data["total"]:
+            LOGGER.debug(
+                "issue %s seems to have more comments (%d) than inlined (%d), "
+                "fetching separately",
+                issue["id"],
+                comments_data["total"],
+                len(comments_data.get("comments")),
             )
+            return True
+        return False
+
+    def has_truncated_change_log(issue: dict) -> bool:
+        change_log_data = issue.get("changelog")
+        if not change_log_data:
+            return False
+        return len(change_log_data["histories"]) < change_log_data["total"]
+
+    def get_cached_change_log(issue: dict) -> list[JiraChangeLogItemModel] | None:
+        previous = state.items_map.get(issue["id"])
+        if previous is None or previous.change_log_updated_on is None:
+            return None
+        if previous.change_log_updated_on != dateutil.parser.parse(issue["fields"]["updated"]):
+            return None
+        return previous.change_log
+
+    response = get_page()
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_concurrency, thread_name_prefix="jira"
+    ) as executor:
+        while response["issues"]:
+            issues = response["issues"]
+            ingestion_counter += len(issues)
+
+            # comments and change logs of the page are fetched while the next
+            # page is fetched, change logs of the issues not updated since the
+            # previous ingestion are not fetched again
+            comments_futures = {
+                issue["id"]: executor.submit(_get_all_comments, jira, issue["id"])
+                for issue in issues
+                if has_truncated_comments(issue)
+            }
+            cached_change_logs = {}
+            histories_futures = {}
+            for issue in issues:
+                if not has_truncated_change_log(issue):
+                    continue
+                cached_change_log = get_cached_change_log(issue)
+                if cached_change_log is not None:
+                    cached_change_logs[issue["id"]] = cached_change_log
+                else:
+                    histories_futures[issue["id"]] = executor.submit(
+                        _get_all_histories, jira, issue["id"]
+                    )
 
-        if not response["issues"]:
-            break
+            # items are ordered by update date
+            page_cutoff_date = dateutil.parser.parse(issues[-1]["fields"]["updated"])
+
+            # contrary to https://docs.atlassian.com/software/jira/docs/api/REST/9.17.0/#api/2/search-search
+            # the response does NOT contain "total" field, but it has "isLast" marker
+            if "isLast" in response:
+                is_last_page = response["isLast"]
+            else:
+                is_last_page = response["total"] <= start + len(issues)
+
+            next_response = None
+
+            # graceful handling for the last page w/o false-positive warnings
+            if is_last_page:
+                LOGGER.info("last page of items reached")
+            elif ingestion_counter >= ingestion_limit:
+                LOGGER.warning("ingestion limit of %d reached", ingestion_limit)
+            else:
+                # determine next step
+                # we prefer to use cutoff based approach for the cases where it is changed
+                # after ingesting the page of results to avoid inherent issues with paging
+                # over mutable data;
+                # if after ingesting the page we still have same cutoff datetime, then
+                # use paging approach to get the next page (think of the case where there
+                # are tons of items updated during a very short period of time)
+                if query != get_query(page_cutoff_date):
+                    # prefer cutoff approach (no paging)
+                    query = get_query(page_cutoff_date)
+                    start = 0
+                    next_page_token = None
+                    LOGGER.info("advancing JQL filter by cutoff date to %s", page_cutoff_date)
+                else:  # use paging approach if we can not advance the query itself
+                    start += len(issues)
+                    next_page_token = response["nextPageToken"]
+                    LOGGER.warning(
+                        "using paging because unable to advance JQL filter by cutoff "
+                        "date (most likely due to a lot of items changed in a short "
+                        "period of time around %s)",
+                        page_cutoff_date,
+                    )
+                next_response = get_page()
+
+            for issue in issues:
+                fields = issue["fields"]
+                issue_id = issue["id"]
+
+                if issue_id in comments_futures:
+                    comments = comments_futures[issue_id].result()
+                else:
+                    comments = fields.get("comment", {}).get("comments")
+
+                updated_on = dateutil.parser.parse(fields["updated"])
+
+                if issue_id in histories_futures:
+                    change_log_data = {"histories": histories_futures[issue_id].result()}
+                    change_log = convert_change_log(change_log_data, included_fields=["status"])
+                elif issue_id in cached_change_logs:
+                    change_log = cached_change_logs[issue_id]
+                else:
+                    change_log = convert_change_log(
+                        issue.get("changelog"), included_fields=["status"]
+                    )
 
-        for issue in response["issues"]:
-            ingestion_counter += 1
-            fields = issue["fields"]
-            issue_id = issue["id"]
-            comments_data = fields.get("comment", {})
-            comments = comments_data.get("comments")
-
-            if len(comments) < comments_data["total"]:
-                LOGGER.debug(
-                    "issue %s seems to have more comments (%d) than inlined (%d), "
-                    "fetching separately",
+                issue_model = JiraItemModel(
                     issue_id,
-                    comments_data["total"],
-                    len(comments),
+                    issue["key"],
+                    fields["issuetype"]["name"],
+                    fields.get("summary"),
+                    fields.get("description"),
+                    fields["status"]["name"],
+                    fields["status"]["statusCategory"]["name"],
+                    convert_actor(fields["creator"]),
+                    convert_actor(fields.get("assignee")),
+                    convert_actor(fields.get("reporter")),
+                    convert_components(fields.get("components")),
+                    fields.get("labels"),
+                    convert_comments(comments),
+                    change_log,
+                    dateutil.parser.parse(fields["created"]),
+                    updated_on,
+                    # change log is complete (fetched, cached or not truncated)
+                    updated_on,
                 )
-                comments = _get_all_comments(jira, issue_id)
-
-            issue_model = JiraItemModel(
-                issue_id,
-                issue["key"],
-                fields["issuetype"]["name"],
-                fields.get("summary"),
-                fields.get("description"),
-                fields["status"]["name"],
-                fields["status"]["statusCategory"]["name"],
-                convert_actor(fields["creator"]),
-                convert_actor(fields.get("assignee")),
-                convert_actor(fields.get("reporter")),
-                convert_components(fields.get("components")),
-                fields.get("labels"),
-                convert_comments(comments),
-                # TODO: load change log using paging as well, as the list is
-                #  truncated in this API
-                convert_change_log(issue.get("changelog"), included_fields=["status"]),
-                dateutil.parser.parse(fields["created"]),
-                dateutil.parser.parse(fields["updated"]),
-            )
-            state.items_map[issue["id"]] = issue_model
-            cutoff_date = dateutil.parser.parse(issue["fields"]["updated"])
-
-        # contrary to https://docs.atlassian.com/software/jira/docs/api/REST/9.17.0/#api/2/search-search
-        # the response does NOT contain "total" field, but it has "isLast" marker
-        if "isLast" in response:
-            is_last_page = response["isLast"]
-        else:
-            is_last_page = response["total"] <= start + len(response["issues"])
+                state.items_map[issue["id"]] = issue_model
 
-        # graceful handling for the last page w/o false-positive warnings
-        if is_last_page:
-            LOGGER.info("last page of items reached")
-            break
+            cutoff_date = page_cutoff_date
 
-        # determine next step
-        # we prefer to use cutoff based approach for the cases where it is changed
-        # after ingesting the page of results to avoid inherent issues with paging
-        # over mutable data;
-        # if after ingesting the page we still have same cutoff datetime, then
-        # use paging approach to get the next page (think of the case where there are
-        # tons of items updated during a very short period of time)
-        if query != get_query(cutoff_date):
-            # prefer cutoff approach (no paging)
-            query = get_query(cutoff_date)
-            start = 0
-            next_page_token = None
-            LOGGER.info("advancing JQL filter by cutoff date to %s", cutoff_date)
-        else:  # use paging approach if we can not advance the query itself
-            start += len(response["issues"])
-            next_page_token = response["nextPageToken"]
-            LOGGER.warning(
-                "using paging because unable to advance JQL filter by cutoff "
-                "date (most likely due to a lot of items changed in a short "
-                "period of time around %s)",
-                cutoff_date,
-            )
-
-        if ingestion_counter >= ingestion_limit:
-            LOGGER.warning("ingestion limit of %d reached", ingestion_limit)
-            break
+            if next_response is None:
+                break
+            response = next_response
 
     state.cutoff_date = cutoff_date
 
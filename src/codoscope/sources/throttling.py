@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+
+import requests
+import requests.adapters
+
+LOGGER = logging.getLogger(__name__)
+
+# throttled (or temporarily unavailable) requests are retried
+RETRY_STATUS_CODES = [429, 503]
+
+DEFAULT_MAX_RETRIES = 10
+
+# backoff (in seconds) when the response has no "Retry-After" header
+BACKOFF_FACTOR = 1.0
+MAX_BACKOFF = 300.0
+
+
+class RateLimiter:
+    """
+    Pauses all the requests sharing the limiter once any of them is
+    throttled, so that concurrent workers do not keep hitting the API while
+    the rate limit is exceeded.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resume_at: float = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+
+class ThrottledAdapter(requests.adapters.HTTPAdapter):
+    """
+    Retries throttled requests after the delay from "Retry-After" header
+    (exponential backoff w/o the header) during which the shared rate
+    limiter holds back the other requests as well.
+    """
+
+    def __init__(self, rate_limiter: RateLimiter, max_throttled_retries: int, **kwargs):
+        super().__init__(**kwargs)
+        self.rate_limiter: RateLimiter = rate_limiter
+        self.max_throttled_retries: int = max_throttled_retries
+
+    def send(self, request, *args, **kwargs) -> requests.Response:
+        retries = 0
+        while True:
+            self.rate_limiter.wait()
+            response = super().send(request, *args, **kwargs)
+            if (
+                response.status_code not in RETRY_STATUS_CODES
+                or retries >= self.max_throttled_retries
+            ):
+                return response
+
+            retries += 1
+            delay = get_retry_delay(response, retries)
+            LOGGER.warning(
+                "request throttled (status %d), retry %d in %.1f seconds",
+                response.status_code,
+                retries,
+                delay,
+            )
+            self.rate_limiter.pause(delay)
+            # connection is reused once the response is read
+            response.raw.drain_conn()
+
+
+def get_retry_delay(response: requests.Response, retries: int) -> float:
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is not None and retry_after.isdigit():
+        return float(retry_after)
+    return min(MAX_BACKOFF, BACKOFF_FACTOR * 2 ** (retries - 1))
+
+
+def create_session(
+    url: str,
+    pool_size: int,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    rate_limiter: RateLimiter | None = None,
+) -> requests.Session:
+    """
+    Creates session keeping alive a connection per concurrent request to the
+    given URL, which retries throttled requests up to "max_retries" times.
+    """
+    session = requests.Session()
+    session.mount(
+        url,
+        ThrottledAdapter(
+            rate_limiter or RateLimiter(),
+            max_retries,
+            pool_maxsize=pool_size,
+        ),
+    )
+    return session
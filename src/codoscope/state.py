@@ -1,12 +1,25 @@
 import abc
+import contextlib
 import datetime
 import enum
+import gc
 import gzip
 import logging
+import operator
 import os
 import os.path
 import pickle
-from typing import Optional
+import sys
+from typing import (
+    Any,
+    ClassVar,
+    Generic,
+    Hashable,
+    Iterable,
+    Iterator,
+    Optional,
+    TypeVar,
+)
 
 LOGGER = logging.getLogger(__name__)
 
@@ -22,6 +35,97 @@ class VersionedState:
         self.version = 1
 
 
+@contextlib.contextmanager
+def paused_gc():
+    """
+    Disables cyclic garbage collector, which otherwise repeatedly traverses
+    all the objects created so far when millions of models are unpickled.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def intern_optional(value: str | None) -> str | None:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class CompactModel:
+    """
+    Base for the bulk models (commits, pull requests, issues and everything
+    nested in them) which can be counted in millions: attributes are kept in
+    slots rather than per instance dictionary and the version is shared by
+    the class. Slots must follow the order of the constructor arguments, so
+    that models are pickled as a plain constructor call; attributes added
+    later should go last with a default value to keep old pickles loadable.
+    """
+
+    __slots__ = ()
+
+    version: ClassVar[int] = 1
+
+    # getter of the slot values (constructor arguments) set for every subclass
+    _get_values: ClassVar[operator.attrgetter]
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._get_values = operator.attrgetter(*cls.__slots__)
+
+    def __reduce__(self):
+        values = self._get_values(self)
+        return type(self), values if len(self.__slots__) > 1 else (values,)
+
+    def __setstate__(self, state: dict) -> None:
+        # only called for the models pickled before they got slots
+        self.__init__(**{name: state[name] for name in self.__slots__ if name in state})
+
+
+# actor model of the source (it is expected to have "account_id" slot)
+ActorT = TypeVar("ActorT", bound=CompactModel)
+
+
+class ActorsRegistry(Generic[ActorT]):
+    """
+    Actors of a single source keyed by account ID, so that every person is
+    kept (and pickled) once however many items reference them.
+    """
+
+    def __init__(self, actor_class: type[ActorT]):
+        self.actor_class: type[ActorT] = actor_class
+        self.actors_map: dict[str, ActorT] = {}
+
+    def __len__(self) -> int:
+        return len(self.actors_map)
+
+    def __iter__(self) -> Iterator[ActorT]:
+        return iter(self.actors_map.values())
+
+    def intern(self, actor: ActorT | None) -> ActorT | None:
+        """
+        Returns registered instance for the actor's account, the details
+        (e.g. display name) are updated to the ones of the given actor.
+        """
+        if actor is None:
+            return None
+
+        registered = self.actors_map.get(actor.account_id)
+        if registered is None:
+            self.actors_map[actor.account_id] = actor
+            return actor
+
+        if registered is not actor:
+            values = actor._get_values(actor)
+            if registered._get_values(registered) != values:
+                for name, value in zip(actor.__slots__, values):
+                    setattr(registered, name, value)
+
+        return registered
+
+
 class SourceState(abc.ABC, VersionedState):
     def __init__(self):
         super().__init__()
@@ -32,12 +136,55 @@ class SourceState(abc.ABC, VersionedState):
     def source_type(self) -> SourceType:
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def iter_items(self) -> Iterator[tuple[Hashable, Any, Any]]:
+        """
+        Yields (key, revision, item) tuples for the bulk items of the source
+        (commits, pull requests, issues) which are persisted separately from
+        the rest of the source state. Revision is used to detect the items
+        changed since the last save.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def put_item(self, key: Hashable, item: Any) -> None:
+        raise NotImplementedError
+
+    def get_actors(self) -> ActorsRegistry | None:
+        """
+        Returns registry of the actors referenced by the items if the source
+        has one, so that items could be persisted with references to it.
+        """
+        return None
+
+    @abc.abstractmethod
+    def copy_without_items(self) -> "SourceState":
+        """
+        Returns shallow copy of the source state without the bulk items.
+        """
+        raise NotImplementedError
+
 
 class StateModel(VersionedState):
     def __init__(self):
         self.sources: dict[str, SourceState] = {}
         self.created_at: datetime.datetime = datetime.datetime.now()
 
+    def copy_with_sources(self, source_types: Iterable[SourceType]) -> "StateModel":
+        """
+        Returns shallow copy of the state only with the sources of the given
+        types.
+        """
+        source_types = set(source_types)
+        state = StateModel()
+        state.created_at = self.created_at
+        state.sources = {
+            name: source
+            for name, source in self.sources.items()
+            if source.source_type in source_types
+        }
+        return state
+
     def save(self, path: str) -> None:
         LOGGER.info('saving state into "%s"', path)
         with gzip.open(path + ".tmp", "wb") as f:
@@ -52,6 +199,6 @@ class StateModel(VersionedState):
             LOGGER.warning('state file "%s" does not exist', path)
             return None
 
-        with gzip.open(path, "rb") as f:
+        with gzip.open(path, "rb") as f, paused_gc():
             state = pickle.load(f)
             return state
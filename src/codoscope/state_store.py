@@ -0,0 +1,339 @@
+import abc
+import contextlib
+import datetime
+import hashlib
+import io
+import json
+import logging
+import os.path
+import pickle
+import sqlite3
+import threading
+import zlib
+from typing import Any, Hashable, Iterable, Optional
+
+from codoscope.config import read_mandatory, read_optional
+from codoscope.exceptions import ConfigError, InvalidOperationError
+from codoscope.state import (
+    ActorsRegistry,
+    SourceState,
+    SourceType,
+    StateModel,
+    paused_gc,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+
+class StateStoreBase(abc.ABC):
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+
+    @abc.abstractmethod
+    def load(self, source_types: Iterable[SourceType] | None = None) -> Optional[StateModel]:
+        """
+        Loads the state (optionally restricted to the sources of the given
+        types) or returns None if there is no state saved yet.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def save(self, state: StateModel, source_names: Iterable[str] | None = None) -> None:
+        raise NotImplementedError
+
+    def checkpoint(self, state: StateModel, source_name: str) -> None:
+        """
+        Persists the progress of a single source in between the full saves if
+        that is cheap for the backend, no-op otherwise.
+        """
+
+    def get_fingerprint(self) -> str | None:
+        """
+        Returns value which changes whenever the saved state changes or None
+        when there is no saved state.
+        """
+        if not os.path.exists(self.path):
+            return None
+        stat = os.stat(self.path)
+        return "%d-%d" % (stat.st_size, stat.st_mtime_ns)
+
+
+class PickleStateStore(StateStoreBase):
+    """
+    Legacy store which keeps the whole state in a single gzipped pickle file.
+    """
+
+    def load(self, source_types: Iterable[SourceType] | None = None) -> Optional[StateModel]:
+        state = StateModel.load(self.path)
+        if state is not None and source_types is not None:
+            state = state.copy_with_sources(source_types)
+        return state
+
+    def save(self, state: StateModel, source_names: Iterable[str] | None = None) -> None:
+        # the whole state is always rewritten
+        state.save(self.path)
+
+
+class _ItemsPickler(pickle.Pickler):
+    """
+    Pickles registered actors as references to the source registry which is
+    saved as a part of the header, so that they are not repeated in chunks.
+    """
+
+    def __init__(self, file, actors: ActorsRegistry | None):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        # called for every pickled object, so checks are inlined
+        self.actor_class: type | None = actors.actor_class if actors is not None else None
+        self.actors_map: dict[str, Any] = actors.actors_map if actors is not None else {}
+
+    def persistent_id(self, obj: Any) -> str | None:
+        if type(obj) is self.actor_class and self.actors_map.get(obj.account_id) is obj:
+            return obj.account_id
+        return None
+
+
+class _ItemsUnpickler(pickle.Unpickler):
+    def __init__(self, file, actors: ActorsRegistry | None):
+        super().__init__(file)
+        self.actors: ActorsRegistry | None = actors
+
+    def persistent_load(self, pid: Any) -> Any:
+        if self.actors is None or pid not in self.actors.actors_map:
+            raise pickle.UnpicklingError('unknown actor "%s"' % pid)
+        return self.actors.actors_map[pid]
+
+
+class SqliteStateStore(StateStoreBase):
+    """
+    Stores every source as a separate segment inside SQLite database: small
+    header (source state without the bulk items) and append-only chunks of
+    items added or changed since the previous save. Every source is saved in
+    its own transaction, so that a crash only loses the changes not saved yet.
+    """
+
+    FORMAT_VERSION = 1
+
+    # amount of items pickled together into a single chunk
+    CHUNK_SIZE = 5000
+
+    # segments with more chunks than that (or than twice the amount needed to
+    # store all the items of the source) are rewritten from scratch
+    MAX_CHUNKS_PER_SOURCE = 64
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        # source name -> item key -> revision of the saved item
+        self._saved_revisions: dict[str, dict[Hashable, Any]] = {}
+        self._saved_headers: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path)
+        try:
+            with connection:
+                connection.executescript("""
+                    CREATE TABLE IF NOT EXISTS meta (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL
+                    );
+                    CREATE TABLE IF NOT EXISTS sources (
+                        name TEXT PRIMARY KEY,
+                        source_type TEXT NOT NULL,
+                        header BLOB NOT NULL,
+                        updated_at TEXT NOT NULL
+                    );
+                    CREATE TABLE IF NOT EXISTS chunks (
+                        source_name TEXT NOT NULL,
+                        seq INTEGER NOT NULL,
+                        items_count INTEGER NOT NULL,
+                        payload BLOB NOT NULL,
+                        PRIMARY KEY (source_name, seq)
+                    );
+                    """)
+            yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _dump(obj: Any, actors: ActorsRegistry | None = None) -> bytes:
+        buffer = io.BytesIO()
+        _ItemsPickler(buffer, actors).dump(obj)
+        return zlib.compress(buffer.getvalue())
+
+    @staticmethod
+    def _load(data: bytes, actors: ActorsRegistry | None = None) -> Any:
+        return _ItemsUnpickler(io.BytesIO(zlib.decompress(data)), actors).load()
+
+    def load(self, source_types: Iterable[SourceType] | None = None) -> Optional[StateModel]:
+        LOGGER.info('loading state from "%s"', self.path)
+
+        if not os.path.exists(self.path):
+            LOGGER.warning('state file "%s" does not exist', self.path)
+            return None
+
+        with self._lock, self._connect() as connection, paused_gc():
+            meta = dict(connection.execute("SELECT key, value FROM meta"))
+
+            format_version = int(meta.get("format_version", self.FORMAT_VERSION))
+            if format_version > self.FORMAT_VERSION:
+                raise InvalidOperationError(
+                    'state "%s" has unsupported format version %d' % (self.path, format_version)
+                )
+
+            state = StateModel()
+            if "created_at" in meta:
+                state.created_at = datetime.datetime.fromisoformat(meta["created_at"])
+
+            source_types = set(source_types) if source_types is not None else None
+            for name, source_type, header in connection.execute(
+                "SELECT name, source_type, header FROM sources"
+            ):
+                # segments of other sources are not even unpickled
+                if source_types is not None and SourceType(source_type) not in source_types:
+                    LOGGER.debug('skip "%s" source, it is not needed', name)
+                    continue
+
+                source: SourceState = self._load(header)
+                chunks_count = 0
+                for (payload,) in connection.execute(
+                    "SELECT payload FROM chunks WHERE source_name = ? ORDER BY seq",
+                    (name,),
+                ):
+                    for key, item in self._load(payload, source.get_actors()):
+                        source.put_item(key, item)
+                    chunks_count += 1
+
+                LOGGER.debug('loaded "%s" source from %d chunks', name, chunks_count)
+
+                state.sources[name] = source
+                self._saved_headers[name] = header
+                self._saved_revisions[name] = {
+                    key: revision for key, revision, _ in source.iter_items()
+                }
+
+        return state
+
+    def save(self, state: StateModel, source_names: Iterable[str] | None = None) -> None:
+        LOGGER.info('saving state into "%s"', self.path)
+
+        if source_names is None:
+            source_names = list(state.sources)
+
+        with self._lock, self._connect() as connection:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?), (?, ?)",
+                    (
+                        "format_version",
+                        str(self.FORMAT_VERSION),
+                        "created_at",
+                        state.created_at.isoformat(),
+                    ),
+                )
+
+            for source_name in source_names:
+                self._save_source(connection, source_name, state.sources[source_name])
+
+    def checkpoint(self, state: StateModel, source_name: str) -> None:
+        self.save(state, [source_name])
+
+    def get_fingerprint(self) -> str | None:
+        """
+        Unlike the file stat, fingerprint composed of the segments stays the
+        same when the sources were saved w/o any changes.
+        """
+        if not os.path.exists(self.path):
+            return None
+
+        with self._lock, self._connect() as connection:
+            segments = connection.execute("""
+                SELECT s.name, s.updated_at, COUNT(c.seq), COALESCE(MAX(c.seq), 0)
+                FROM sources s LEFT JOIN chunks c ON c.source_name = s.name
+                GROUP BY s.name
+                ORDER BY s.name
+                """).fetchall()
+
+        data = json.dumps([self.FORMAT_VERSION, segments])
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _save_source(
+        self,
+        connection: sqlite3.Connection,
+        source_name: str,
+        source: SourceState,
+    ) -> None:
+        header = self._dump(source.copy_without_items())
+        actors = source.get_actors()
+        saved_revisions = self._saved_revisions.get(source_name, {})
+
+        revisions: dict[Hashable, Any] = {}
+        changed_items: list[tuple[Hashable, Any]] = []
+        for key, revision, item in source.iter_items():
+            revisions[key] = revision
+            if key not in saved_revisions or saved_revisions[key] != revision:
+                changed_items.append((key, item))
+
+        if not changed_items and header == self._saved_headers.get(source_name):
+            LOGGER.debug('source "%s" has no changes to save', source_name)
+            return
+
+        with connection:
+            chunks_count, last_seq = connection.execute(
+                "SELECT COUNT(*), COALESCE(MAX(seq), 0) FROM chunks WHERE source_name = ?",
+                (source_name,),
+            ).fetchone()
+
+            new_chunks_count = -(-len(changed_items) // self.CHUNK_SIZE)
+            min_chunks_count = -(-len(revisions) // self.CHUNK_SIZE)
+            max_chunks_count = max(self.MAX_CHUNKS_PER_SOURCE, 2 * min_chunks_count)
+            if chunks_count + new_chunks_count > max_chunks_count:
+                LOGGER.info('compacting "%s" source segment', source_name)
+                connection.execute("DELETE FROM chunks WHERE source_name = ?", (source_name,))
+                changed_items = [(key, item) for key, _, item in source.iter_items()]
+                last_seq = 0
+
+            connection.execute(
+                "INSERT OR REPLACE INTO sources (name, source_type, header, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    source_name,
+                    source.source_type.value,
+                    header,
+                    datetime.datetime.now().isoformat(),
+                ),
+            )
+
+            for offset in range(0, len(changed_items), self.CHUNK_SIZE):
+                chunk = changed_items[offset : offset + self.CHUNK_SIZE]
+                last_seq += 1
+                connection.execute(
+                    "INSERT INTO chunks (source_name, seq, items_count, payload) "
+                    "VALUES (?, ?, ?, ?)",
+                    (source_name, last_seq, len(chunk), self._dump(chunk, actors)),
+                )
+
+        LOGGER.debug('saved %d changed items of "%s" source', len(changed_items), source_name)
+
+        self._saved_headers[source_name] = header
+        self._saved_revisions[source_name] = revisions
+
+
+STATE_STORES_BY_BACKEND: dict[str, type[PickleStateStore] | type[SqliteStateStore]] = {
+    "pickle": PickleStateStore,
+    "sqlite": SqliteStateStore,
+}
+
+
+def open_state_store(config: dict) -> StateStoreBase:
+    state_path = read_mandatory(config, "state-path")
+    backend = read_optional(config, "state-backend", "pickle")
+
+    store_class = STATE_STORES_BY_BACKEND.get(backend)
+    if store_class is None:
+        raise ConfigError(
+            'Unknown state backend "%s", supported: %s'
+            % (backend, ", ".join(STATE_STORES_BY_BACKEND))
+        )
+
+    return store_class(state_path)
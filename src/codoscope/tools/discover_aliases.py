@@ -6,11 +6,10 @@ import yaml
 
 from codoscope import core
 from codoscope.config import read_mandatory
-from codoscope.datasets import Datasets
 from codoscope.exceptions import InvalidOperationError
 from codoscope.processors.common import ProcessorType
 from codoscope.processors.remap_users import RemapUsersProcessor
-from codoscope.state import StateModel
+from codoscope.state_store import open_state_store
 
 LOGGER = logging.getLogger(__name__)
 
@@ -20,15 +19,13 @@ def discover_aliases(config: dict):
     Discovers aliases and returns map from canonical name to collection of
     AliasDescriptor instances.
     """
-    state_path = read_mandatory(config, "state-path")
-    state = StateModel.load(state_path)
+    store = open_state_store(config)
 
-    if state is None:
-        raise InvalidOperationError("state not found at %s", state_path)
+    if store.get_fingerprint() is None:
+        raise InvalidOperationError("state not found at %s", config["state-path"])
 
-    # extract data sets from the state
-    datasets = Datasets.extract(state)
-    LOGGER.info("datasets extraction completed")
+    # extract data sets from the state (or reuse the snapshot)
+    datasets = core.extract_datasets(config, store, None)
 
     class Node:
         def __init__(self, node_type: str, value: str):
@@ -86,11 +83,12 @@ def discover_aliases(config: dict):
     # remapping
     capture_associations_from_existing_remap_users_processors()
 
-    # run existing processors to account for existing user remap config
-    core.run_processors(config, datasets)
+    # run existing processors to account for existing user remap config (all
+    # of them, as the enabled reports are irrelevant here)
+    core.run_processors(config, datasets, skip_unused=False)
 
     # process capture association after possible remapping happened
-    process_associations(datasets.get_all_activity(), maintain_use_counter=True)
+    process_associations(datasets.get_activity(), maintain_use_counter=True)
 
     traversed: set[Node] = set()
     components: list[set[Node]] = []
@@ -8,6 +8,7 @@ import plotly.graph_objects as go
 from codoscope.common import (
     NA_REPLACEMENT,
     date_time_minutes_offset,
+    fill_na,
     format_minutes_offset,
 )
 from codoscope.reports.common import setup_default_layout, time_axis_minutes_based
@@ -64,6 +65,43 @@ def get_hover_text(
     return "<br>".join(items)
 
 
+def ident(x):
+    return x
+
+
+def convert_int(x):
+    return "%d" % x
+
+
+# column name to label map
+HOVER_DATA_COLUMNS_MAP = {
+    "commit_sha": HoverDataColumnDescriptor(None, ident),
+    "bitbucket_pr_title": HoverDataColumnDescriptor(None, ident),
+    "jira_item_key": HoverDataColumnDescriptor(None, ident),
+}
+
+EXTENDED_HOVER_DATA_COLUMNS_MAP = {
+    "commit_added_lines": HoverDataColumnDescriptor("added lines", convert_int),
+    "commit_removed_lines": HoverDataColumnDescriptor("removed lines", convert_int),
+    "commit_message": HoverDataColumnDescriptor("commit message", ident),
+    "jira_summary": HoverDataColumnDescriptor("summary", ident),
+    "jira_message": HoverDataColumnDescriptor("message", ident),
+    "bitbucket_pr_comment": HoverDataColumnDescriptor("comment", ident),
+    "bitbucket_pr_id": HoverDataColumnDescriptor("PR ID", ident),
+    "bitbucket_repo_name": HoverDataColumnDescriptor("repository", ident),
+}
+
+
+def get_activity_scatter_columns(extended_mode: bool = False) -> list[str]:
+    """
+    Returns detail columns (besides the activity core ones) used by the widget.
+    """
+    columns = list(HOVER_DATA_COLUMNS_MAP)
+    if extended_mode:
+        columns.extend(EXTENDED_HOVER_DATA_COLUMNS_MAP)
+    return columns
+
+
 # TODO: consider switching approach to use customdata; this should decrease
 #  the size of the plot by removing duplication;
 #  see https://plotly.com/python/hover-text-and-formatting/
@@ -102,7 +140,7 @@ def activity_scatter(
     )
 
     # initialize for missing authors
-    activity_df["user"] = activity_df["user"].fillna(NA_REPLACEMENT)
+    activity_df["user"] = fill_na(activity_df["user"], NA_REPLACEMENT)
 
     # sort for predictable labels order for traces
     activity_df = activity_df.sort_values(by=["user", "source_type", "source_subtype", "timestamp"])
@@ -119,32 +157,9 @@ def activity_scatter(
 
     LOGGER.debug("groups count: %s", grouped_df.ngroups)
 
-    def ident(x):
-        return x
-
-    def convert_int(x):
-        return "%d" % x
-
-    # column name to label map
-    hover_data_columns_map = {
-        "commit_sha": HoverDataColumnDescriptor(None, ident),
-        "bitbucket_pr_title": HoverDataColumnDescriptor(None, ident),
-        "jira_item_key": HoverDataColumnDescriptor(None, ident),
-    }
-
+    hover_data_columns_map = dict(HOVER_DATA_COLUMNS_MAP)
     if extended_mode:
-        hover_data_columns_map.update(
-            {
-                "commit_added_lines": HoverDataColumnDescriptor("added lines", convert_int),
-                "commit_removed_lines": HoverDataColumnDescriptor("removed lines", convert_int),
-                "commit_message": HoverDataColumnDescriptor("commit message", ident),
-                "jira_summary": HoverDataColumnDescriptor("summary", ident),
-                "jira_message": HoverDataColumnDescriptor("message", ident),
-                "bitbucket_pr_comment": HoverDataColumnDescriptor("comment", ident),
-                "bitbucket_pr_id": HoverDataColumnDescriptor("PR ID", ident),
-                "bitbucket_repo_name": HoverDataColumnDescriptor("repository", ident),
-            }
-        )
+        hover_data_columns_map.update(EXTENDED_HOVER_DATA_COLUMNS_MAP)
 
     for (user, activity_type), df in grouped_df:
         name = "%s %s" % (user, activity_type)
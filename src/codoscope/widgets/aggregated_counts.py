@@ -1,7 +1,7 @@
 import pandas
 import plotly.graph_objects as go
 
-from codoscope.common import NA_REPLACEMENT
+from codoscope.common import NA_REPLACEMENT, fill_na
 from codoscope.reports.common import setup_default_layout
 from codoscope.widgets.common import PlotlyFigureWidget
 
@@ -15,7 +15,7 @@ def aggregated_counts(
     df = activity_df.set_index("timestamp")
 
     for column in group_by:
-        df[column] = df[column].fillna(NA_REPLACEMENT)
+        df[column] = fill_na(df[column], NA_REPLACEMENT)
 
     grouped = df.groupby(group_by)
 
@@ -3,37 +3,30 @@ from collections import defaultdict
 import pandas
 import plotly.graph_objects as go
 
-from codoscope.common import Colors, convert_timezone
+from codoscope.common import Colors
 from codoscope.reports.common import setup_default_layout
+from codoscope.widgets.code_ownership_v2 import get_changed_files
 from codoscope.widgets.common import PlotlyFigureWidget
 
 
 # TODO: add a way to only show current code base (how to detect the file movements?)
 def code_ownership(
     activity_df: pandas.DataFrame,
+    commit_files_df: pandas.DataFrame,
     title: str = "Code changes map",
     maxdepth: int = 4,
 ) -> PlotlyFigureWidget | None:
-    # make sure we only have commits
-    commits_df = activity_df[activity_df["activity_type"] == "commit"].copy()
+    changed_files_df = get_changed_files(activity_df, commit_files_df)
 
-    # remove merge commits as useless
-    commits_df = commits_df[commits_df["commit_is_merge_commit"] == False]
-
-    if len(commits_df) == 0:
+    if len(changed_files_df) == 0:
         return None
 
-    # needed just to specify proper types for timestamp and avoid warnings
-    commits_df = convert_timezone(commits_df, timezone_name="utc")
-    commits_df = commits_df.set_index("timestamp")
+    totals = changed_files_df.groupby("path", observed=True)[["added", "deleted"]].sum().sum(axis=1)
 
     # leaf path -> counts
     path_counts = defaultdict(lambda: {"changed_lines_count": 0})
-
-    for _, row in commits_df.iterrows():
-        for path, stat in row["commit_changed_files_map"].items():
-            path_counts[path]["changed_lines_count"] += stat["added"]
-            path_counts[path]["changed_lines_count"] += stat["deleted"]
+    for path, changed_lines_count in totals.items():
+        path_counts[path]["changed_lines_count"] = int(changed_lines_count)
 
     def get_parent_path(path):
         if not path:
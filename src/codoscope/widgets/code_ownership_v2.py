@@ -2,46 +2,59 @@ from collections import defaultdict
 
 import pandas
 
-from codoscope.common import convert_timezone, render_jinja_template
+from codoscope.common import render_jinja_template
 from codoscope.widgets.common import Widget, generate_html_element_id
 
+# detail columns (besides the activity core ones) used by the widget
+CODE_OWNERSHIP_COLUMNS = ["commit_is_merge_commit"]
+
+
+def get_changed_files(
+    activity_df: pandas.DataFrame,
+    commit_files_df: pandas.DataFrame,
+) -> pandas.DataFrame:
+    """
+    Returns rows of the long format commit files table which belong to the
+    (non merge) commits of the given activity, along with commit's user.
+    """
+    # make sure we only have commits
+    commits_df = activity_df[activity_df["activity_type"] == "commit"]
+
+    # remove merge commits as useless
+    commits_df = commits_df[commits_df["commit_is_merge_commit"] == False]
+
+    # the same commit can be ingested by multiple sources (e.g. forks)
+    return commit_files_df.merge(
+        commits_df[["source_name", "activity_id", "user"]], on=["source_name", "activity_id"]
+    )
+
 
 def code_ownership_v2(
     activity_df: pandas.DataFrame,
+    commit_files_df: pandas.DataFrame,
     title: str = "Code changes map",
     max_depth: int = 4,
     height: int | None = None,
     show_users_breakdown_pane: bool = True,
 ) -> Widget | None:
+    changed_files_df = get_changed_files(activity_df, commit_files_df)
 
-    # make sure we only have commits
-    commits_df = activity_df[activity_df["activity_type"] == "commit"].copy()
-
-    # remove merge commits as useless
-    commits_df = commits_df[commits_df["commit_is_merge_commit"] == False]
-
-    if len(commits_df) == 0:
+    if len(changed_files_df) == 0:
         return None
 
-    # needed just to specify proper types for timestamp and avoid warnings
-    commits_df = convert_timezone(commits_df, timezone_name="utc")
-    commits_df = commits_df.set_index("timestamp")
+    totals_df = changed_files_df.groupby(["path", "user"], observed=True, dropna=False)[
+        ["added", "deleted"]
+    ].sum()
 
     # leaf path -> user -> counts
-    path_counts = defaultdict(
-        lambda: defaultdict(
-            lambda: {
-                "added_lines": 0,
-                "deleted_lines": 0,
-            }
-        )
-    )
-
-    for _, row in commits_df.iterrows():
-        user = row["user"]
-        for path, stat in row["commit_changed_files_map"].items():
-            path_counts[path][user]["added_lines"] += stat["added"]
-            path_counts[path][user]["deleted_lines"] += stat["deleted"]
+    path_counts: dict[str, dict[str, dict[str, int]]] = defaultdict(dict)
+    for (path, user), added, deleted in zip(
+        totals_df.index, totals_df["added"].tolist(), totals_df["deleted"].tolist()
+    ):
+        path_counts[path][user] = {
+            "added_lines": added,
+            "deleted_lines": deleted,
+        }
 
     html = render_jinja_template(
         "code_tree_map.jinja2",
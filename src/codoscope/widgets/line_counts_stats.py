@@ -5,6 +5,9 @@ from plotly.subplots import make_subplots
 from codoscope.reports.common import setup_default_layout
 from codoscope.widgets.common import PlotlyFigureWidget
 
+# detail columns (besides the activity core ones) used by the widget
+LINE_COUNTS_STATS_COLUMNS = ["commit_is_merge_commit", "commit_added_lines", "commit_removed_lines"]
+
 
 def line_counts_stats(
     activity_df: pandas.DataFrame,
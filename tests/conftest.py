@@ -0,0 +1,172 @@
+import datetime
+
+import pytest
+
+from codoscope.sources import bitbucket, git, jira
+from codoscope.state import StateModel
+
+UTC = datetime.timezone.utc
+CET = datetime.timezone(datetime.timedelta(hours=1))
+
+
+def make_commit(
+    hexsha: str,
+    author_name: str,
+    committed_datetime: datetime.datetime,
+    changed_files: dict[str, tuple[int, int]],
+    parent_hexsha: list[str] | None = None,
+) -> git.CommitModel:
+    return git.CommitModel(
+        hexsha=hexsha,
+        author_name=author_name,
+        author_email="%s@example.com" % author_name.split()[0].lower(),
+        committed_datetime=committed_datetime,
+        authored_datetime=committed_datetime,
+        message="change by %s" % author_name,
+        stats=git.CommitStats(
+            {
+                path: git.ChangedFileStatModel(insertions, deletions)
+                for path, (insertions, deletions) in changed_files.items()
+            }
+        ),
+        parent_hexsha=parent_hexsha or [],
+    )
+
+
+def make_repo(*commits: git.CommitModel) -> git.RepoModel:
+    repo = git.RepoModel()
+    repo.commits_map = {commit.hexsha: commit for commit in commits}
+    return repo
+
+
+def make_pull_request(
+    state: bitbucket.BitbucketState,
+    pr_id: int,
+    title: str,
+    author: bitbucket.ActorModel,
+    reviewer: bitbucket.ActorModel,
+    created_on: datetime.datetime,
+) -> bitbucket.PullRequestModel:
+    author = state.actors.intern(author)
+    reviewer = state.actors.intern(reviewer)
+    return bitbucket.PullRequestModel(
+        id=pr_id,
+        url="https://bitbucket.org/pr/%d" % pr_id,
+        author=author,
+        title=title,
+        description="description of %s, cc @{%s} @{acc-unknown}" % (title, reviewer.account_id),
+        source_branch="feature",
+        destination_branch="master",
+        state="MERGED",
+        participants=[
+            bitbucket.PullRequestParticipantModel(
+                reviewer, True, created_on + datetime.timedelta(hours=2)
+            ),
+            # participants who did not act yet have no date
+            bitbucket.PullRequestParticipantModel(author, False, None),
+        ],
+        commentaries=[
+            bitbucket.CommentModel(
+                "%d-1" % pr_id,
+                reviewer,
+                "comment on %s" % title,
+                created_on + datetime.timedelta(hours=1),
+            ),
+        ],
+        created_on=created_on,
+        updated_on=created_on + datetime.timedelta(days=1),
+    )
+
+
+def make_bitbucket(
+    repositories: dict[tuple[str, str], list[tuple[int, str]]],
+) -> bitbucket.BitbucketState:
+    state = bitbucket.BitbucketState()
+    alice = bitbucket.ActorModel("acc-alice", "Alice Smith")
+    bob = bitbucket.ActorModel("acc-bob", "Bob Jones")
+    for (project_name, repo_name), pull_requests in repositories.items():
+        project = state.projects_map.setdefault(project_name, bitbucket.ProjectModel())
+        repo = project.repositories_map.setdefault(repo_name, bitbucket.RepositoryModel())
+        for pr_id, title in pull_requests:
+            repo.pull_requests_map[pr_id] = make_pull_request(
+                state, pr_id, title, alice, bob, datetime.datetime(2024, 1, pr_id, 9, tzinfo=UTC)
+            )
+    return state
+
+
+def make_jira() -> jira.JiraState:
+    state = jira.JiraState()
+    alice = state.actors.intern(jira.ActorModel("acc-alice", "Alice Smith", "alice@example.com"))
+    bob = state.actors.intern(jira.ActorModel("acc-bob", "Bob Jones", None))
+    state.users_map = {
+        "acc-alice": jira.UserModel("acc-alice", "Alice Smith", "alice@example.com", True, None),
+        "acc-bob": jira.UserModel("acc-bob", "Bob Jones", None, True, None),
+    }
+    state.items_map["10001"] = jira.JiraItemModel(
+        id="10001",
+        key="PRJ-1",
+        item_type="Bug",
+        summary="first bug",
+        description="reported by [~accountid:acc-bob]",
+        status_name="Done",
+        status_category_name="Done",
+        creator=alice,
+        assignee=bob,
+        reporter=alice,
+        components=[],
+        labels=[],
+        comments=[
+            # Jira Server may return timestamps w/o timezone
+            jira.JiraCommentModel("1", "fixed", bob, datetime.datetime(2024, 1, 3, 12)),
+        ],
+        change_log=[],
+        created_on=datetime.datetime(2024, 1, 2, 10, tzinfo=CET),
+        updated_on=datetime.datetime(2024, 1, 3, 12, tzinfo=CET),
+    )
+    return state
+
+
+@pytest.fixture
+def state() -> StateModel:
+    state = StateModel()
+    state.sources["repo"] = make_repo(
+        make_commit(
+            "a" * 40,
+            "Alice Smith",
+            datetime.datetime(2024, 1, 1, 10, tzinfo=CET),
+            {"src/main.py": (10, 0), "readme.md": (2, 0)},
+        ),
+        make_commit(
+            "b" * 40,
+            "Bob Jones",
+            datetime.datetime(2024, 1, 2, 10, tzinfo=UTC),
+            {"src/main.py": (3, 1)},
+            parent_hexsha=["a" * 40],
+        ),
+    )
+    state.sources["bitbucket"] = make_bitbucket(
+        {("project", "repo"): [(1, "first PR"), (2, "second PR")]}
+    )
+    state.sources["jira"] = make_jira()
+    return state
+
+
+@pytest.fixture
+def overlapping_state(state):
+    # fork of the repository sharing its first commit
+    state.sources["fork"] = make_repo(
+        make_commit(
+            "a" * 40,
+            "Alice Smith",
+            datetime.datetime(2024, 1, 1, 10, tzinfo=CET),
+            {"src/main.py": (10, 0), "readme.md": (2, 0)},
+        )
+    )
+    # PR IDs are only unique within the repository
+    state.sources["bitbucket"] = make_bitbucket(
+        {
+            ("project", "repo"): [(1, "first PR")],
+            ("project", "other-repo"): [(1, "other first PR")],
+        }
+    )
+    return state
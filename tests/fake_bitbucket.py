@@ -0,0 +1,426 @@
+"""
+Fake Bitbucket Cloud API serving the subset of endpoints used by the
+ingestion. It applies "fields" projections like the real API does, keeps
+track of the requests and can slow down, throttle or fail them.
+
+Responses of a bulk mode ingestion replayed by the tests are recorded by
+"python tests/fake_bitbucket.py tests/fixtures/bitbucket-bulk-mode.json".
+"""
+
+import datetime
+import json
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+import requests.adapters
+
+WORKSPACE = "workspace"
+
+BASE_DATE = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+USERS = [
+    {"type": "user", "account_id": "acc-%d" % i, "display_name": "User %d" % i} for i in range(4)
+]
+
+
+def format_date(value: datetime.datetime) -> str:
+    return value.isoformat(timespec="microseconds")
+
+
+def make_pull_request(pr_id: int, repo_name: str, comments_count: int) -> dict:
+    # PRs with higher IDs are updated earlier, so the listing order (by update
+    # date) differs from the order of IDs
+    created_on = BASE_DATE + datetime.timedelta(hours=pr_id)
+    updated_on = BASE_DATE + datetime.timedelta(days=30, hours=-pr_id)
+    comments = [
+        {
+            "type": "pullrequest_comment",
+            "id": pr_id * 100 + k,
+            "content": {
+                "raw": "comment %d on %s #%d" % (k, repo_name, pr_id),
+                "markup": "markdown",
+            },
+            "user": USERS[(pr_id + k) % len(USERS)],
+            "created_on": format_date(created_on + datetime.timedelta(minutes=k)),
+            "updated_on": format_date(created_on + datetime.timedelta(minutes=k)),
+            "deleted": False,
+        }
+        for k in range(comments_count)
+    ]
+    return {
+        "type": "pullrequest",
+        "id": pr_id,
+        "title": "PR %d of %s" % (pr_id, repo_name),
+        "description": "description of %s #%d" % (repo_name, pr_id),
+        "state": "MERGED",
+        "author": USERS[pr_id % len(USERS)],
+        "source": {"branch": {"name": "feature/%d" % pr_id}, "commit": {"hash": "ab" * 6}},
+        "destination": {"branch": {"name": "master"}, "commit": {"hash": "cd" * 6}},
+        "created_on": format_date(created_on),
+        "updated_on": format_date(updated_on),
+        "participants": [
+            {
+                "type": "participant",
+                "user": USERS[(pr_id + 1) % len(USERS)],
+                "role": "REVIEWER",
+                "approved": True,
+                "participated_on": format_date(created_on + datetime.timedelta(hours=2)),
+            },
+            {
+                "type": "participant",
+                "user": USERS[(pr_id + 2) % len(USERS)],
+                "role": "PARTICIPANT",
+                "approved": False,
+                "participated_on": None,
+            },
+        ],
+        "comment_count": len(comments),
+        "summary": {"raw": "summary", "markup": "markdown"},
+        "_comments": comments,
+    }
+
+
+class FakeBitbucket:
+    def __init__(self, repositories: dict[str, list[str]], prs_count: int = 12) -> None:
+        # project key -> repository slug -> PR ID -> PR data
+        self.pull_requests: dict[str, dict[str, dict[int, dict]]] = {
+            project_key: {
+                repo_name: {
+                    pr_id: make_pull_request(pr_id, repo_name, comments_count=pr_id % 3)
+                    for pr_id in range(1, prs_count + 1)
+                }
+                for repo_name in repo_names
+            }
+            for project_key, repo_names in repositories.items()
+        }
+
+        # delay (in seconds) of the response to the given path
+        self.latency: Callable[[str], float] = lambda path: 0.0
+        # paths (w/o query) which fail with internal server error
+        self.failing_paths: set[str] = set()
+        # every n-th request is throttled (0 disables throttling)
+        self.throttle_every: int = 0
+
+        self.lock = threading.Lock()
+        self.requests: list[str] = []
+        self.throttled_count: int = 0
+        self.concurrent_count: int = 0
+        self.max_concurrent_count: int = 0
+
+        self.url: str = ""
+        self._server: ThreadingHTTPServer | None = None
+
+    def start(self) -> str:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                fake.handle(self)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = "http://127.0.0.1:%d" % self._server.server_address[1]
+        return self.url
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def handle(self, handler: BaseHTTPRequestHandler) -> None:
+        with self.lock:
+            self.requests.append(handler.path)
+            request_number = len(self.requests)
+            self.concurrent_count += 1
+            self.max_concurrent_count = max(self.max_concurrent_count, self.concurrent_count)
+        try:
+            parsed = urllib.parse.urlparse(handler.path)
+            path = parsed.path.rstrip("/")
+            time.sleep(self.latency(path))
+
+            headers = {}
+            if self.throttle_every and request_number % self.throttle_every == 0:
+                with self.lock:
+                    self.throttled_count += 1
+                status, data = 429, {"type": "error", "error": {"message": "Rate limit"}}
+                headers["Retry-After"] = "0"
+            elif path in self.failing_paths:
+                status, data = 500, {"type": "error", "error": {"message": "Failure"}}
+            else:
+                query = {k: v[0] for k, v in urllib.parse.parse_qs(parsed.query).items()}
+                status, data = self.route(path, query)
+                if status == 200 and "fields" in query:
+                    data = project_fields(data, query["fields"])
+
+            body = json.dumps(data).encode()
+            handler.send_response(status)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(body)))
+            for name, value in headers.items():
+                handler.send_header(name, value)
+            handler.end_headers()
+            handler.wfile.write(body)
+        finally:
+            with self.lock:
+                self.concurrent_count -= 1
+
+    def route(self, path: str, query: dict[str, str]) -> tuple[int, dict]:
+        api_url = self.url + "/2.0"
+
+        if m := re.fullmatch(r"/2.0/workspaces/([\w-]+)", path):
+            return 200, {
+                "type": "workspace",
+                "slug": m[1],
+                "name": m[1],
+                "links": {
+                    "self": {"href": "%s/workspaces/%s" % (api_url, m[1])},
+                    "projects": {"href": "%s/workspaces/%s/projects" % (api_url, m[1])},
+                    "repositories": {"href": "%s/repositories/%s" % (api_url, m[1])},
+                },
+            }
+
+        if m := re.fullmatch(r"/2.0/workspaces/([\w-]+)/projects/([\w-]+)", path):
+            if m[2] not in self.pull_requests:
+                return 404, {"type": "error"}
+            return 200, {
+                "type": "project",
+                "key": m[2],
+                "name": m[2],
+                "links": {
+                    "self": {"href": "%s/workspaces/%s/projects/%s" % (api_url, m[1], m[2])},
+                    "repositories": {
+                        "href": '%s/repositories/%s?q=project.key="%s"' % (api_url, m[1], m[2])
+                    },
+                },
+            }
+
+        if m := re.fullmatch(r"/2.0/repositories/([\w-]+)", path):
+            project_keys = re.findall(r'project.key="([\w-]+)"', query.get("q", ""))
+            repositories = [
+                self.get_repository(m[1], project_key, repo_name)
+                for project_key, project in self.pull_requests.items()
+                if not project_keys or project_key in project_keys
+                for repo_name in project
+            ]
+            return 200, self.get_page(path, query, repositories)
+
+        if m := re.fullmatch(r"/2.0/repositories/([\w-]+)/([\w-]+)", path):
+            for project_key, project in self.pull_requests.items():
+                if m[2] in project:
+                    return 200, self.get_repository(m[1], project_key, m[2])
+            return 404, {"type": "error"}
+
+        if m := re.fullmatch(r"/2.0/repositories/([\w-]+)/([\w-]+)/pullrequests", path):
+            pull_requests = sorted(
+                self.find_pull_requests(m[2]).values(), key=lambda x: x["updated_on"]
+            )
+            if since := re.search(r"updated_on > (\S+)", query.get("q", "")):
+                since_date = datetime.datetime.fromisoformat(since[1])
+                pull_requests = [
+                    x
+                    for x in pull_requests
+                    if datetime.datetime.fromisoformat(x["updated_on"]) > since_date
+                ]
+            # listed PRs have participants only when they are requested
+            with_participants = "participants" in query.get("fields", "")
+            return 200, self.get_page(
+                path,
+                query,
+                [self.get_pull_request(m[1], m[2], x, with_participants) for x in pull_requests],
+            )
+
+        if m := re.fullmatch(r"/2.0/repositories/([\w-]+)/([\w-]+)/pullrequests/(\d+)", path):
+            pull_request = self.find_pull_requests(m[2])[int(m[3])]
+            return 200, self.get_pull_request(m[1], m[2], pull_request, True)
+
+        if m := re.fullmatch(
+            r"/2.0/repositories/([\w-]+)/([\w-]+)/pullrequests/(\d+)/comments", path
+        ):
+            comments = self.find_pull_requests(m[2])[int(m[3])]["_comments"]
+            if since := re.search(r"updated_on > (\S+)", query.get("q", "")):
+                since_date = datetime.datetime.fromisoformat(since[1])
+                comments = [
+                    x
+                    for x in comments
+                    if datetime.datetime.fromisoformat(x["updated_on"]) > since_date
+                ]
+            return 200, self.get_page(path, query, comments)
+
+        return 404, {"type": "error", "error": {"message": "not found: %s" % path}}
+
+    def find_pull_requests(self, repo_name: str) -> dict[int, dict]:
+        for project in self.pull_requests.values():
+            if repo_name in project:
+                return project[repo_name]
+        raise KeyError(repo_name)
+
+    def get_repository(self, workspace: str, project_key: str, repo_name: str) -> dict:
+        url = "%s/2.0/repositories/%s/%s" % (self.url, workspace, repo_name)
+        return {
+            "type": "repository",
+            "slug": repo_name,
+            "name": repo_name,
+            "full_name": "%s/%s" % (workspace, repo_name),
+            "project": {"type": "project", "key": project_key},
+            "created_on": format_date(BASE_DATE),
+            "links": {
+                "self": {"href": url},
+                "pullrequests": {"href": url + "/pullrequests"},
+            },
+        }
+
+    def get_pull_request(
+        self, workspace: str, repo_name: str, pull_request: dict, with_participants: bool
+    ) -> dict:
+        url = "%s/2.0/repositories/%s/%s/pullrequests/%d" % (
+            self.url,
+            workspace,
+            repo_name,
+            pull_request["id"],
+        )
+        data = {k: v for k, v in pull_request.items() if not k.startswith("_")}
+        if not with_participants:
+            del data["participants"]
+        data["links"] = {
+            "self": {"href": url},
+            "comments": {"href": url + "/comments"},
+        }
+        return data
+
+    def get_page(self, path: str, query: dict[str, str], values: list) -> dict:
+        page_size = int(query.get("pagelen", 10))
+        page = int(query.get("page", 1))
+        result = {
+            "values": values[(page - 1) * page_size : page * page_size],
+            "pagelen": page_size,
+            "page": page,
+            "size": len(values),
+        }
+        if page * page_size < len(values):
+            result["next"] = "%s%s?%s" % (
+                self.url,
+                path,
+                urllib.parse.urlencode(dict(query, page=page + 1)),
+            )
+        return result
+
+    def update_pull_request(self, repo_name: str, pr_id: int, new_comments_count: int) -> None:
+        pull_request = self.find_pull_requests(repo_name)[pr_id]
+        updated_on = datetime.datetime.fromisoformat(pull_request["updated_on"])
+        updated_on += datetime.timedelta(days=100)
+        for _ in range(new_comments_count):
+            comment_id = pr_id * 100 + len(pull_request["_comments"])
+            pull_request["_comments"].append(
+                {
+                    "type": "pullrequest_comment",
+                    "id": comment_id,
+                    "content": {"raw": "late comment %d" % comment_id, "markup": "markdown"},
+                    "user": USERS[0],
+                    "created_on": format_date(updated_on),
+                    "updated_on": format_date(updated_on),
+                    "deleted": False,
+                }
+            )
+        pull_request["comment_count"] = len(pull_request["_comments"])
+        pull_request["updated_on"] = format_date(updated_on)
+
+    def edit_comment(self, repo_name: str, pr_id: int, comment_id: int, message: str) -> None:
+        # editing the comment does not update the PR itself
+        pull_request = self.find_pull_requests(repo_name)[pr_id]
+        comment = next(x for x in pull_request["_comments"] if x["id"] == comment_id)
+        updated_on = datetime.datetime.fromisoformat(pull_request["updated_on"])
+        comment["content"] = dict(comment["content"], raw=message)
+        comment["updated_on"] = format_date(updated_on + datetime.timedelta(days=1))
+
+    def delete_comments(self, repo_name: str, pr_id: int) -> None:
+        pull_request = self.find_pull_requests(repo_name)[pr_id]
+        pull_request["_comments"] = []
+        self.update_pull_request(repo_name, pr_id, new_comments_count=0)
+
+
+def project_fields(data, fields: str):
+    """
+    Keeps only the given (dot separated) fields of the response.
+    """
+    tree: dict = {}
+    for field in fields.split(","):
+        node = tree
+        for part in field.split("."):
+            node = node.setdefault(part, {})
+
+    def apply(value, node: dict):
+        if isinstance(value, list):
+            return [apply(x, node) for x in value]
+        if not node or not isinstance(value, dict):
+            return value
+        return {k: apply(value[k], node[k]) for k in node if k in value}
+
+    return apply(data, tree)
+
+
+# URL of the API in the recorded responses
+RECORDED_URL = "https://api.bitbucket.test"
+
+RECORDED_REPOSITORIES = {"PRJ": ["repo1"]}
+RECORDED_PRS_COUNT = 3
+
+
+def record_bulk_mode_responses(path: str) -> None:
+    # imported here so that the fake is usable w/o the package
+    from codoscope.sources.bitbucket import ingest_bitbucket
+
+    fake = FakeBitbucket(RECORDED_REPOSITORIES, RECORDED_PRS_COUNT)
+    url = fake.start()
+    exchanges = []
+    send = requests.adapters.HTTPAdapter.send
+
+    def record(adapter, request, *args, **kwargs):
+        response = send(adapter, request, *args, **kwargs)
+        exchanges.append(
+            {
+                "url": request.url.replace(url, RECORDED_URL),
+                "status": response.status_code,
+                "body": json.loads(response.text.replace(url, RECORDED_URL)),
+            }
+        )
+        return response
+
+    requests.adapters.HTTPAdapter.send = record
+    try:
+        ingest_bitbucket(
+            {
+                "url": url,
+                "username": "user",
+                "password": "pass",
+                "workspace": WORKSPACE,
+                "bulk-mode": True,
+                "max-concurrency": 1,
+                "projects": [
+                    {"name": key, "repositories": [{"name": name} for name in names]}
+                    for key, names in RECORDED_REPOSITORIES.items()
+                ],
+            },
+            None,
+        )
+    finally:
+        requests.adapters.HTTPAdapter.send = send
+        fake.stop()
+
+    with open(path, "w") as f:
+        json.dump(exchanges, f, indent=2)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    record_bulk_mode_responses(sys.argv[1])
@@ -0,0 +1,266 @@
+"""
+Fake Jira Cloud API serving the subset of endpoints used by the ingestion.
+Like the real API it inlines only the first comments and change log entries
+of the issue into the search results and limits the size of the pages of
+the separately fetched ones; it keeps track of the requests and can slow
+down or fail them.
+"""
+
+import datetime
+import json
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+BASE_DATE = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+USERS = [
+    {
+        "accountId": "acc-%d" % i,
+        "displayName": "User %d" % i,
+        "emailAddress": "user%d@example.com" % i,
+        "active": True,
+        "accountType": "atlassian",
+    }
+    for i in range(4)
+]
+
+STATUSES = ["To Do", "In Progress", "In Review", "Done"]
+
+
+def format_date(value: datetime.datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%S.000%z")
+
+
+def make_comment(issue_id: int, k: int, created_on: datetime.datetime) -> dict:
+    return {
+        "id": str(issue_id * 1000 + k),
+        "author": USERS[(issue_id + k) % len(USERS)],
+        "body": "comment %d on issue %d" % (k, issue_id),
+        "created": format_date(created_on),
+        "updated": format_date(created_on),
+    }
+
+
+def make_history(issue_id: int, k: int, created_on: datetime.datetime) -> dict:
+    # every other history does not change the status and is not ingested
+    if k % 2 == 0:
+        item = {
+            "field": "status",
+            "fromString": STATUSES[(k // 2) % len(STATUSES)],
+            "toString": STATUSES[(k // 2 + 1) % len(STATUSES)],
+        }
+    else:
+        item = {"field": "labels", "fromString": "", "toString": "label-%d" % k}
+    return {
+        "id": str(issue_id * 1000 + k),
+        "author": USERS[(issue_id + k) % len(USERS)],
+        "created": format_date(created_on),
+        "items": [item],
+    }
+
+
+def make_issue(issue_id: int, comments_count: int, histories_count: int) -> dict:
+    created_on = BASE_DATE + datetime.timedelta(days=issue_id)
+    # issues are updated in the order of IDs, hours apart, so that the JQL
+    # filter advances by the update date of the page
+    updated_on = BASE_DATE + datetime.timedelta(days=100, hours=issue_id)
+    return {
+        "id": str(10000 + issue_id),
+        "key": "PRJ-%d" % issue_id,
+        "fields": {
+            "issuetype": {"name": "Bug" if issue_id % 2 else "Task"},
+            "summary": "issue %d" % issue_id,
+            "description": "description of issue %d" % issue_id,
+            "status": {"name": "Done", "statusCategory": {"name": "Done"}},
+            "creator": USERS[issue_id % len(USERS)],
+            "assignee": USERS[(issue_id + 1) % len(USERS)],
+            "reporter": USERS[issue_id % len(USERS)],
+            "components": [{"name": "backend"}],
+            "labels": ["label"],
+            "created": format_date(created_on),
+            "updated": format_date(updated_on),
+        },
+        "_comments": [
+            make_comment(issue_id, k, created_on + datetime.timedelta(minutes=k))
+            for k in range(comments_count)
+        ],
+        "_histories": [
+            make_history(issue_id, k, created_on + datetime.timedelta(minutes=k))
+            for k in range(histories_count)
+        ],
+    }
+
+
+class FakeJira:
+    def __init__(self, issues: list[dict]) -> None:
+        # issue ID -> issue data
+        self.issues: dict[str, dict] = {issue["id"]: issue for issue in issues}
+
+        # amount of comments and change log histories inlined into the issue
+        self.inlined_limit: int = 3
+        # maximal size of the pages of comments and change log histories
+        self.max_page_size: int = 4
+
+        # delay (in seconds) of the response to the given path
+        self.latency: Callable[[str], float] = lambda path: 0.0
+        # paths (w/o query) which fail with internal server error
+        self.failing_paths: set[str] = set()
+
+        self.lock = threading.Lock()
+        self.requests: list[str] = []
+        self.concurrent_count: int = 0
+        self.max_concurrent_count: int = 0
+
+        self.url: str = ""
+        self._server: ThreadingHTTPServer | None = None
+
+    def start(self) -> str:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                fake.handle(self)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = "http://127.0.0.1:%d" % self._server.server_address[1]
+        return self.url
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def handle(self, handler: BaseHTTPRequestHandler) -> None:
+        with self.lock:
+            self.requests.append(handler.path)
+            self.concurrent_count += 1
+            self.max_concurrent_count = max(self.max_concurrent_count, self.concurrent_count)
+        try:
+            parsed = urllib.parse.urlparse(handler.path)
+            path = parsed.path.rstrip("/")
+            time.sleep(self.latency(path))
+
+            if path in self.failing_paths:
+                status, data = 500, {"errorMessages": ["Failure"], "errors": {}}
+            else:
+                query = {k: v[0] for k, v in urllib.parse.parse_qs(parsed.query).items()}
+                status, data = self.route(path, query)
+
+            body = json.dumps(data).encode()
+            handler.send_response(status)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+        finally:
+            with self.lock:
+                self.concurrent_count -= 1
+
+    def route(self, path: str, query: dict[str, str]) -> tuple[int, dict | list]:
+        if path == "/rest/api/2/myself":
+            return 200, dict(USERS[0], timeZone="UTC")
+
+        if path == "/rest/api/2/users/search":
+            start = int(query.get("startAt", 0))
+            return 200, USERS[start : start + int(query.get("maxResults", 50))]
+
+        if path == "/rest/api/2/search/jql":
+            return 200, self.search(query)
+
+        if m := re.fullmatch(r"/rest/api/2/issue/(\d+)/comment", path):
+            comments = self.issues[m[1]]["_comments"]
+            return 200, dict(self.get_page(query, comments), comments=self.slice(query, comments))
+
+        if m := re.fullmatch(r"/rest/api/2/issue/(\d+)/changelog", path):
+            histories = self.issues[m[1]]["_histories"]
+            return 200, dict(self.get_page(query, histories), values=self.slice(query, histories))
+
+        return 404, {"errorMessages": ["not found: %s" % path], "errors": {}}
+
+    def search(self, query: dict[str, str]) -> dict:
+        issues = sorted(self.issues.values(), key=lambda x: x["fields"]["updated"])
+        # JQL dates are interpreted in the timezone of the user (UTC)
+        if since := re.search(r'Updated >= "([\d-]+ [\d:]+)"', query.get("jql", "")):
+            since_date = datetime.datetime.strptime(since[1], "%Y-%m-%d %H:%M").replace(
+                tzinfo=datetime.timezone.utc
+            )
+            issues = [
+                x
+                for x in issues
+                if datetime.datetime.fromisoformat(x["fields"]["updated"]) >= since_date
+            ]
+
+        start = int(query.get("nextPageToken", 0))
+        end = start + int(query.get("maxResults", 50))
+        result = {
+            "issues": [self.get_issue(x) for x in issues[start:end]],
+            "isLast": end >= len(issues),
+        }
+        if end < len(issues):
+            result["nextPageToken"] = str(end)
+        return result
+
+    def get_issue(self, issue: dict) -> dict:
+        comments = issue["_comments"]
+        histories = issue["_histories"]
+        data = {k: v for k, v in issue.items() if not k.startswith("_")}
+        data["fields"] = dict(
+            issue["fields"],
+            comment={
+                "comments": comments[: self.inlined_limit],
+                "maxResults": self.inlined_limit,
+                "total": len(comments),
+                "startAt": 0,
+            },
+        )
+        data["changelog"] = {
+            "startAt": 0,
+            "maxResults": self.inlined_limit,
+            "total": len(histories),
+            "histories": histories[: self.inlined_limit],
+        }
+        return data
+
+    def get_page_size(self, query: dict[str, str]) -> int:
+        return min(int(query.get("maxResults", 50)), self.max_page_size)
+
+    def slice(self, query: dict[str, str], values: list) -> list:
+        start = int(query.get("startAt", 0))
+        return values[start : start + self.get_page_size(query)]
+
+    def get_page(self, query: dict[str, str], values: list) -> dict:
+        start = int(query.get("startAt", 0))
+        page_size = self.get_page_size(query)
+        return {
+            "startAt": start,
+            "maxResults": page_size,
+            "total": len(values),
+            "isLast": start + page_size >= len(values),
+        }
+
+    def update_issue(
+        self, issue_id: str, new_comments_count: int = 0, new_histories_count: int = 0
+    ) -> None:
+        issue = self.issues[issue_id]
+        number = int(issue["key"].split("-")[1])
+        updated_on = datetime.datetime.fromisoformat(issue["fields"]["updated"])
+        updated_on += datetime.timedelta(days=100)
+        for _ in range(new_comments_count):
+            issue["_comments"].append(make_comment(number, len(issue["_comments"]), updated_on))
+        for _ in range(new_histories_count):
+            issue["_histories"].append(make_history(number, len(issue["_histories"]), updated_on))
+        issue["fields"]["updated"] = format_date(updated_on)
+
+    def count_requests(self, pattern: str) -> int:
+        return sum(1 for x in self.requests if re.search(pattern, x.split("?")[0]))
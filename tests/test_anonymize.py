@@ -0,0 +1,66 @@
+import datetime
+
+import pandas.testing
+from conftest import UTC, make_commit
+
+from codoscope.datasets import Datasets
+from codoscope.processors.anonymize import AnonymizingProcessor
+from codoscope.processors.common import build_literals_pattern
+
+
+def anonymize(state, processor_config: dict) -> Datasets:
+    datasets = Datasets.extract(state)
+    AnonymizingProcessor(processor_config).execute(datasets)
+    return datasets
+
+
+def test_anonymize_is_deterministic_without_seed(state):
+    config = {"name": "anonymize", "type": "anonymize"}
+
+    first = anonymize(state, config)
+    second = anonymize(state, config)
+
+    assert "Alice Smith" not in set(first.get_activity()["user"])
+    for name, df in first.get_all_data_frames().items():
+        pandas.testing.assert_frame_equal(second.get_all_data_frames()[name], df, obj=name)
+
+
+def test_anonymize_seed_changes_pseudonyms(state):
+    first = anonymize(state, {"name": "anonymize", "type": "anonymize"})
+    second = anonymize(state, {"name": "anonymize", "type": "anonymize", "seed": 42})
+
+    assert set(first.get_activity()["user"]) != set(second.get_activity()["user"])
+
+
+def test_anonymize_falls_back_to_shorter_name_prefix(state):
+    # one user name is a prefix of another one
+    commit = make_commit(
+        "c" * 40,
+        "Alice",
+        datetime.datetime(2024, 1, 3, 10, tzinfo=UTC),
+        {"src/main.py": (1, 0)},
+    )
+    commit.message = "Alice Smithers and Alice Smith, thanks Alice"
+    state.sources["repo"].commits_map[commit.hexsha] = commit
+
+    datasets = anonymize(state, {"name": "anonymize", "type": "anonymize"})
+
+    commits_df = datasets.commits_df.set_index("commit_sha")
+    alice = commits_df.loc["c" * 40, "user"]
+    alice_smith = commits_df.loc["a" * 40, "user"]
+    assert alice not in ("Alice", alice_smith)
+    assert commits_df.loc["c" * 40, "commit_message"] == "%s Smithers and %s, thanks %s" % (
+        alice,
+        alice_smith,
+        alice,
+    )
+
+
+def test_literals_pattern_matches_whole_words():
+    pattern = build_literals_pattern(["Alice", "Alice Smith", "Bob"], whole_words=True)
+
+    assert pattern.findall("Alice Smithers, Alice Smith, Bobby, Bob_1 and Bob.") == [
+        "Alice",
+        "Alice Smith",
+        "Bob",
+    ]
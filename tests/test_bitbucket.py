@@ -0,0 +1,371 @@
+import datetime
+import json
+import pathlib
+import re
+
+import pytest
+import requests
+import requests.adapters
+from fake_bitbucket import RECORDED_URL, WORKSPACE, FakeBitbucket
+
+from codoscope.sources.bitbucket import BitbucketState, ingest_bitbucket
+from codoscope.state import StateModel
+from codoscope.state_store import SqliteStateStore
+
+
+@pytest.fixture
+def fake_bitbucket():
+    fake = FakeBitbucket({"PRJ": ["repo1", "repo2"]})
+    fake.start()
+    yield fake
+    fake.stop()
+
+
+def make_config(fake: FakeBitbucket, repo_names: list[str] | None = None, **options) -> dict:
+    return {
+        "url": fake.url,
+        "username": "user",
+        "password": "pass",
+        "workspace": WORKSPACE,
+        "projects": [
+            {
+                "name": "PRJ",
+                "repositories": [
+                    {"name": repo_name} for repo_name in repo_names or ["repo1", "repo2"]
+                ],
+            }
+        ],
+        **options,
+    }
+
+
+def parse_datetime(value: str | None) -> datetime.datetime | None:
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+def describe_state(state: BitbucketState) -> dict:
+    return {
+        (project_name, repo_name, pr.id): (
+            pr.url,
+            pr.author.display_name,
+            pr.title,
+            pr.description,
+            pr.source_branch,
+            pr.destination_branch,
+            pr.state,
+            [
+                (x.user.account_id, x.user.display_name, x.has_approved, x.participated_on)
+                for x in pr.participants
+            ],
+            [
+                (x.comment_id, x.author.display_name, x.message, x.created_on)
+                for x in pr.commentaries
+            ],
+            pr.created_on,
+            pr.updated_on,
+        )
+        for project_name, project in state.projects_map.items()
+        for repo_name, repo in project.repositories_map.items()
+        for pr in repo.pull_requests_map.values()
+    }
+
+
+def describe_fake(fake: FakeBitbucket) -> dict:
+    return {
+        (project_name, repo_name, pr_id): (
+            "%s/2.0/repositories/%s/%s/pullrequests/%d" % (fake.url, WORKSPACE, repo_name, pr_id),
+            data["author"]["display_name"],
+            data["title"],
+            data["description"],
+            data["source"]["branch"]["name"],
+            data["destination"]["branch"]["name"],
+            data["state"],
+            [
+                (
+                    x["user"]["account_id"],
+                    x["user"]["display_name"],
+                    x["approved"],
+                    parse_datetime(x["participated_on"]),
+                )
+                for x in data["participants"]
+            ],
+            [
+                (
+                    x["id"],
+                    x["user"]["display_name"],
+                    x["content"]["raw"],
+                    parse_datetime(x["created_on"]),
+                )
+                for x in data["_comments"]
+            ],
+            parse_datetime(data["created_on"]),
+            parse_datetime(data["updated_on"]),
+        )
+        for project_name, project in fake.pull_requests.items()
+        for repo_name, pull_requests in project.items()
+        for pr_id, data in pull_requests.items()
+    }
+
+
+def get_listing_order(fake: FakeBitbucket, repo_name: str) -> list[dict]:
+    return sorted(fake.find_pull_requests(repo_name).values(), key=lambda x: x["updated_on"])
+
+
+def delay_first_listed(path: str) -> float:
+    # PRs with higher IDs are listed first, fetching their details and
+    # comments takes longest, so that the fetches complete out of order
+    m = re.search(r"/pullrequests/(\d+)", path)
+    return 0.003 * int(m[1]) if m else 0.0
+
+
+@pytest.mark.parametrize("bulk_mode", [False, True])
+def test_concurrent_ingestion_matches_sequential(fake_bitbucket, bulk_mode):
+    sequential_state = ingest_bitbucket(
+        make_config(fake_bitbucket, **{"bulk-mode": bulk_mode, "max-concurrency": 1}), None
+    )
+    fake_bitbucket.max_concurrent_count = 0
+    fake_bitbucket.latency = delay_first_listed
+
+    state = ingest_bitbucket(make_config(fake_bitbucket, **{"bulk-mode": bulk_mode}), None)
+
+    assert fake_bitbucket.max_concurrent_count > 1
+    assert describe_state(state) == describe_state(sequential_state)
+    assert describe_state(state) == describe_fake(fake_bitbucket)
+    for project_name, repo_name in [("PRJ", "repo1"), ("PRJ", "repo2")]:
+        repo_state = state.projects_map[project_name].repositories_map[repo_name]
+        assert repo_state.cutoff_date == parse_datetime(
+            get_listing_order(fake_bitbucket, repo_name)[-1]["updated_on"]
+        )
+
+
+@pytest.mark.parametrize("bulk_mode", [False, True])
+def test_ingestion_limit_keeps_listing_order(fake_bitbucket, bulk_mode):
+    fake_bitbucket.latency = delay_first_listed
+    config = make_config(
+        fake_bitbucket, ["repo1"], **{"bulk-mode": bulk_mode, "ingestion-limit": 5}
+    )
+
+    state = ingest_bitbucket(config, None)
+
+    listed = get_listing_order(fake_bitbucket, "repo1")
+    repo_state = state.projects_map["PRJ"].repositories_map["repo1"]
+    assert set(repo_state.pull_requests_map) == {x["id"] for x in listed[:5]}
+    assert repo_state.cutoff_date == parse_datetime(listed[4]["updated_on"])
+
+
+def test_failed_fetch_keeps_cutoff_date_behind_ingested_pull_requests(fake_bitbucket):
+    fake_bitbucket.latency = delay_first_listed
+    listed = get_listing_order(fake_bitbucket, "repo1")
+    failing_path = "/2.0/repositories/%s/repo1/pullrequests/%d" % (WORKSPACE, listed[5]["id"])
+    fake_bitbucket.failing_paths.add(failing_path)
+    config = make_config(fake_bitbucket, ["repo1"])
+    state = BitbucketState()
+
+    with pytest.raises(requests.HTTPError):
+        ingest_bitbucket(config, state)
+
+    repo_state = state.projects_map["PRJ"].repositories_map["repo1"]
+    assert set(repo_state.pull_requests_map) == {x["id"] for x in listed[:5]}
+    assert repo_state.cutoff_date == parse_datetime(listed[4]["updated_on"])
+
+    # next ingestion continues from the cutoff date
+    fake_bitbucket.failing_paths.clear()
+    fake_bitbucket.requests.clear()
+    ingest_bitbucket(config, state)
+
+    assert describe_state(state) == {
+        key: value for key, value in describe_fake(fake_bitbucket).items() if key[1] == "repo1"
+    }
+    fetched_paths = {x.split("?")[0] for x in fake_bitbucket.requests}
+    for data in listed[:5]:
+        assert "/2.0/repositories/%s/repo1/pullrequests/%d" % (WORKSPACE, data["id"]) not in (
+            fetched_paths
+        )
+
+
+@pytest.mark.parametrize("bulk_mode", [False, True])
+def test_updated_pull_requests_are_merged(fake_bitbucket, bulk_mode):
+    config = make_config(fake_bitbucket, **{"bulk-mode": bulk_mode})
+    state = ingest_bitbucket(config, None)
+    # PR #5 has two comments already
+    fake_bitbucket.update_pull_request("repo1", 5, new_comments_count=2)
+    fake_bitbucket.update_pull_request("repo2", 3, new_comments_count=0)
+    fake_bitbucket.requests.clear()
+
+    ingest_bitbucket(config, state)
+
+    assert describe_state(state) == describe_fake(fake_bitbucket)
+    commentaries = (
+        state.projects_map["PRJ"].repositories_map["repo1"].pull_requests_map[5].commentaries
+    )
+    assert [x.comment_id for x in commentaries] == [500, 501, 502, 503]
+    # only the comments updated since the previous ingestion are fetched
+    comments_requests = [x for x in fake_bitbucket.requests if "/comments" in x]
+    assert any("/repo1/pullrequests/5/comments" in x for x in comments_requests)
+    assert all("updated_on+%3E" in x for x in comments_requests)
+
+
+def save_and_load(store: SqliteStateStore, state: BitbucketState) -> BitbucketState:
+    state_model = StateModel()
+    state_model.sources["bitbucket"] = state
+    store.save(state_model)
+    loaded = SqliteStateStore(store.path).load()
+    assert loaded is not None
+    return loaded.sources["bitbucket"]
+
+
+def test_edited_comments_are_saved(fake_bitbucket, tmp_path):
+    config = make_config(fake_bitbucket)
+    state = ingest_bitbucket(config, None)
+    store = SqliteStateStore(str(tmp_path / "state.sqlite"))
+    save_and_load(store, state)
+    fake_bitbucket.edit_comment("repo1", 5, 501, "edited comment")
+
+    # PR itself is not updated, so it is listed again only by the override
+    ingest_bitbucket(dict(config, **{"cutoff-date": datetime.date(2000, 1, 1)}), state)
+    loaded = save_and_load(store, state)
+
+    assert describe_state(state) == describe_fake(fake_bitbucket)
+    assert describe_state(loaded) == describe_fake(fake_bitbucket)
+    pr = loaded.projects_map["PRJ"].repositories_map["repo1"].pull_requests_map[5]
+    assert [x.message for x in pr.commentaries] == ["comment 0 on repo1 #5", "edited comment"]
+
+
+@pytest.mark.parametrize("bulk_mode", [False, True])
+def test_deleted_comments_are_dropped(fake_bitbucket, tmp_path, bulk_mode):
+    config = make_config(fake_bitbucket, **{"bulk-mode": bulk_mode})
+    state = ingest_bitbucket(config, None)
+    store = SqliteStateStore(str(tmp_path / "state.sqlite"))
+    save_and_load(store, state)
+    fake_bitbucket.delete_comments("repo1", 5)
+
+    ingest_bitbucket(config, state)
+    loaded = save_and_load(store, state)
+
+    assert describe_state(state) == describe_fake(fake_bitbucket)
+    assert describe_state(loaded) == describe_fake(fake_bitbucket)
+    assert (
+        loaded.projects_map["PRJ"].repositories_map["repo1"].pull_requests_map[5].commentaries == []
+    )
+
+
+def test_throttled_requests_are_retried(fake_bitbucket):
+    fake_bitbucket.throttle_every = 4
+
+    state = ingest_bitbucket(make_config(fake_bitbucket), None)
+
+    assert fake_bitbucket.throttled_count > 0
+    assert describe_state(state) == describe_fake(fake_bitbucket)
+
+
+BULK_MODE_RESPONSES_PATH = pathlib.Path(__file__).parent / "fixtures" / "bitbucket-bulk-mode.json"
+
+
+def test_recorded_bulk_mode_responses_are_converted(monkeypatch):
+    with open(BULK_MODE_RESPONSES_PATH) as f:
+        responses = {x["url"]: x for x in json.load(f)}
+
+    def replay(adapter, request, *args, **kwargs):
+        recorded = responses.get(request.url)
+        assert recorded is not None, "unexpected request: %s" % request.url
+        response = requests.Response()
+        response.status_code = recorded["status"]
+        response.headers["Content-Type"] = "application/json"
+        response._content = json.dumps(recorded["body"]).encode()
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, "send", replay)
+    config = {
+        "url": RECORDED_URL,
+        "username": "user",
+        "password": "pass",
+        "workspace": WORKSPACE,
+        "bulk-mode": True,
+        "projects": [{"name": "PRJ", "repositories": [{"name": "repo1"}]}],
+    }
+
+    state = ingest_bitbucket(config, None)
+
+    # reduced responses still have every attribute read by the converters
+    assert all("fields=" in url for url in responses)
+    utc = datetime.timezone.utc
+    assert describe_state(state) == {
+        ("PRJ", "repo1", 1): (
+            "%s/2.0/repositories/workspace/repo1/pullrequests/1" % RECORDED_URL,
+            "User 1",
+            "PR 1 of repo1",
+            "description of repo1 #1",
+            "feature/1",
+            "master",
+            "MERGED",
+            [
+                ("acc-2", "User 2", True, datetime.datetime(2024, 1, 1, 3, tzinfo=utc)),
+                ("acc-3", "User 3", False, None),
+            ],
+            [
+                (
+                    100,
+                    "User 1",
+                    "comment 0 on repo1 #1",
+                    datetime.datetime(2024, 1, 1, 1, tzinfo=utc),
+                )
+            ],
+            datetime.datetime(2024, 1, 1, 1, tzinfo=utc),
+            datetime.datetime(2024, 1, 30, 23, tzinfo=utc),
+        ),
+        ("PRJ", "repo1", 2): (
+            "%s/2.0/repositories/workspace/repo1/pullrequests/2" % RECORDED_URL,
+            "User 2",
+            "PR 2 of repo1",
+            "description of repo1 #2",
+            "feature/2",
+            "master",
+            "MERGED",
+            [
+                ("acc-3", "User 3", True, datetime.datetime(2024, 1, 1, 4, tzinfo=utc)),
+                ("acc-0", "User 0", False, None),
+            ],
+            [
+                (
+                    200,
+                    "User 2",
+                    "comment 0 on repo1 #2",
+                    datetime.datetime(2024, 1, 1, 2, tzinfo=utc),
+                ),
+                (
+                    201,
+                    "User 3",
+                    "comment 1 on repo1 #2",
+                    datetime.datetime(2024, 1, 1, 2, 1, tzinfo=utc),
+                ),
+            ],
+            datetime.datetime(2024, 1, 1, 2, tzinfo=utc),
+            datetime.datetime(2024, 1, 30, 22, tzinfo=utc),
+        ),
+        ("PRJ", "repo1", 3): (
+            "%s/2.0/repositories/workspace/repo1/pullrequests/3" % RECORDED_URL,
+            "User 3",
+            "PR 3 of repo1",
+            "description of repo1 #3",
+            "feature/3",
+            "master",
+            "MERGED",
+            [
+                ("acc-0", "User 0", True, datetime.datetime(2024, 1, 1, 5, tzinfo=utc)),
+                ("acc-1", "User 1", False, None),
+            ],
+            [],
+            datetime.datetime(2024, 1, 1, 3, tzinfo=utc),
+            datetime.datetime(2024, 1, 30, 21, tzinfo=utc),
+        ),
+    }
+    pull_requests_map = state.projects_map["PRJ"].repositories_map["repo1"].pull_requests_map
+    assert pull_requests_map[2].comments_updated_on == datetime.datetime(
+        2024, 1, 30, 22, tzinfo=utc
+    )
+    assert state.projects_map["PRJ"].repositories_map["repo1"].cutoff_date == datetime.datetime(
+        2024, 1, 30, 23, tzinfo=utc
+    )
@@ -0,0 +1,32 @@
+from codoscope.datasets import Datasets
+from codoscope.widgets.code_ownership_v2 import (
+    CODE_OWNERSHIP_COLUMNS,
+    get_changed_files,
+)
+
+
+def test_changed_files_of_commit_from_multiple_sources(overlapping_state):
+    datasets = Datasets.extract(overlapping_state)
+    activity_df = datasets.get_activity(CODE_OWNERSHIP_COLUMNS)
+
+    changed_files_df = get_changed_files(activity_df, datasets.commit_files_df)
+
+    # every source contributes the files of its own commits once
+    assert sorted(zip(changed_files_df["source_name"], changed_files_df["path"])) == [
+        ("fork", "readme.md"),
+        ("fork", "src/main.py"),
+        ("repo", "readme.md"),
+        ("repo", "src/main.py"),
+        ("repo", "src/main.py"),
+    ]
+
+
+def test_changed_files_of_single_source(overlapping_state):
+    datasets = Datasets.extract(overlapping_state)
+    activity_df = datasets.get_activity(CODE_OWNERSHIP_COLUMNS)
+    activity_df = activity_df[activity_df["source_name"] == "fork"]
+
+    changed_files_df = get_changed_files(activity_df, datasets.commit_files_df)
+
+    totals = changed_files_df.groupby("path", observed=True)["added"].sum().to_dict()
+    assert totals == {"readme.md": 2, "src/main.py": 10}
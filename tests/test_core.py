@@ -0,0 +1,214 @@
+import collections
+import datetime
+import logging
+import threading
+import time
+
+import pytest
+from conftest import CET, make_commit
+
+import codoscope.core
+from codoscope.core import ingest, prepare_datasets
+from codoscope.processors.pipeline import ProcessorsPipeline
+from codoscope.state import StateModel
+from codoscope.state_store import open_state_store
+
+
+class RecordingIngestion:
+    """
+    Stub of the source ingestion which records the concurrency of the calls;
+    the ingested state is the tuple of the IDs of the ingested configs.
+    """
+
+    def __init__(self, failing_names: set[str] | None = None, duration: float = 0.05) -> None:
+        self.failing_names: set[str] = failing_names or set()
+        self.duration: float = duration
+
+        self.lock = threading.Lock()
+        self.running: list[dict] = []
+        self.max_running_count: int = 0
+        self.max_running_per_type: collections.Counter[str] = collections.Counter()
+        self.max_running_per_name: collections.Counter[str] = collections.Counter()
+
+    def __call__(self, source_config: dict, current_state, checkpoint) -> tuple:
+        with self.lock:
+            self.running.append(source_config)
+            self.max_running_count = max(self.max_running_count, len(self.running))
+            for key, max_running in [
+                ("type", self.max_running_per_type),
+                ("name", self.max_running_per_name),
+            ]:
+                count = sum(1 for x in self.running if x[key] == source_config[key])
+                max_running[source_config[key]] = max(max_running[source_config[key]], count)
+        try:
+            time.sleep(self.duration)
+            if source_config["name"] in self.failing_names:
+                raise RuntimeError("failed to ingest %s" % source_config["name"])
+            return (current_state or ()) + (source_config["id"],)
+        finally:
+            with self.lock:
+                self.running.remove(source_config)
+
+
+class RecordingStore:
+    def __init__(self) -> None:
+        self.checkpoints: list[str] = []
+
+    def checkpoint(self, state: StateModel, source_name: str) -> None:
+        self.checkpoints.append(source_name)
+
+
+def make_sources(*names_and_types: tuple[str, str]) -> list[dict]:
+    return [
+        {"id": "%s-%d" % (name, i), "name": name, "type": source_type}
+        for i, (name, source_type) in enumerate(names_and_types, start=1)
+    ]
+
+
+@pytest.fixture
+def ingestion(monkeypatch) -> RecordingIngestion:
+    ingestion = RecordingIngestion()
+    monkeypatch.setattr(codoscope.core, "ingest_source", ingestion)
+    return ingestion
+
+
+def test_ingestion_is_bounded_by_max_workers(ingestion):
+    sources = make_sources(*[("repo%d" % i, "git") for i in range(7)])
+    state = StateModel()
+    store = RecordingStore()
+
+    ingest({"sources": sources, "max-workers": 3}, state, store)
+
+    assert ingestion.max_running_count == 3
+    assert state.sources == {x["name"]: (x["id"],) for x in sources}
+    assert sorted(store.checkpoints) == sorted(x["name"] for x in sources)
+
+
+def test_ingestion_is_sequential_by_default(ingestion):
+    sources = make_sources(("repo", "git"), ("jira", "jira"), ("bitbucket", "bitbucket"))
+    state = StateModel()
+
+    ingest({"sources": sources}, state)
+
+    assert ingestion.max_running_count == 1
+    assert set(state.sources) == {"repo", "jira", "bitbucket"}
+
+
+def test_ingestion_is_bounded_by_max_workers_per_type(ingestion):
+    sources = make_sources(
+        *[("repo%d" % i, "git") for i in range(3)],
+        *[("jira%d" % i, "jira") for i in range(3)],
+    )
+    state = StateModel()
+
+    ingest({"sources": sources, "max-workers": 4, "max-workers-per-type": {"git": 1}}, state)
+
+    assert ingestion.max_running_per_type["git"] == 1
+    # types w/o own limit are bounded by the overall one
+    assert ingestion.max_running_per_type["jira"] == 3
+    assert state.sources == {x["name"]: (x["id"],) for x in sources}
+
+
+def test_sources_with_same_name_are_serialized(ingestion):
+    sources = make_sources(("repo", "git"), ("repo", "git"), ("jira", "jira"), ("repo", "git"))
+    state = StateModel()
+
+    ingest({"sources": sources, "max-workers": 4}, state)
+
+    assert ingestion.max_running_per_name["repo"] == 1
+    assert ingestion.max_running_count == 2
+    # every ingestion continues from the state of the previous one
+    assert state.sources == {"repo": ("repo-1", "repo-2", "repo-4"), "jira": ("jira-3",)}
+
+
+def test_failed_source_does_not_stop_others(ingestion, caplog):
+    ingestion.failing_names = {"jira"}
+    sources = make_sources(("repo", "git"), ("jira", "jira"), ("bitbucket", "bitbucket"))
+    state = StateModel()
+    state.sources["jira"] = ("jira-0",)
+    store = RecordingStore()
+
+    with caplog.at_level(logging.ERROR, logger=codoscope.core.__name__):
+        ingest({"sources": sources, "max-workers": 2}, state, store)
+
+    # state of the failed source is kept as it was
+    assert state.sources == {
+        "repo": ("repo-1",),
+        "jira": ("jira-0",),
+        "bitbucket": ("bitbucket-3",),
+    }
+    assert sorted(store.checkpoints) == ["bitbucket", "repo"]
+    messages = [x.getMessage() for x in caplog.records]
+    assert any('"jira" source failed' in x and "failed to ingest jira" in x for x in messages)
+    assert "ingestion failed for 1 source(s): jira" in messages
+
+
+@pytest.fixture
+def pipeline_runs(monkeypatch) -> list[list[dict]]:
+    """
+    Records configs of the processors every time the pipeline is executed.
+    """
+    runs: list[list[dict]] = []
+    execute = ProcessorsPipeline.execute
+
+    def spy(pipeline: ProcessorsPipeline, datasets) -> None:
+        runs.append(pipeline.get_configs())
+        execute(pipeline, datasets)
+
+    monkeypatch.setattr(ProcessorsPipeline, "execute", spy)
+    return runs
+
+
+def make_remap_users_config(canonical_names: dict[str, list[dict]]) -> dict:
+    return {"name": "remap-users", "type": "remap-users", "canonical-names": canonical_names}
+
+
+def test_processed_datasets_snapshot_is_reused_until_changed(state, tmp_path, pipeline_runs):
+    config = {
+        "state-path": str(tmp_path / "state.sqlite"),
+        "state-backend": "sqlite",
+        "datasets-snapshot-path": str(tmp_path / "snapshot"),
+        "processors": [
+            make_remap_users_config({"Alice Canonical": [{"email": "alice@example.com"}]})
+        ],
+        "reports": [{"name": "users", "type": "unique-users"}],
+    }
+    open_state_store(config).save(state)
+
+    def prepare() -> set[str]:
+        datasets = prepare_datasets(config, open_state_store(config), None)
+        return set(datasets.commits_df["user"].dropna())
+
+    assert prepare() == {"Alice Canonical", "Bob Jones"}
+    assert len(pipeline_runs) == 1
+
+    # nothing changed, so the snapshot is loaded
+    assert prepare() == {"Alice Canonical", "Bob Jones"}
+    assert len(pipeline_runs) == 1
+
+    config["processors"] = [
+        make_remap_users_config(
+            {
+                "Alice Canonical": [{"email": "alice@example.com"}],
+                "Bob Canonical": [{"name": "Bob Jones"}],
+            }
+        )
+    ]
+    assert prepare() == {"Alice Canonical", "Bob Canonical"}
+    assert len(pipeline_runs) == 2
+    assert pipeline_runs[-1] == config["processors"]
+
+    assert prepare() == {"Alice Canonical", "Bob Canonical"}
+    assert len(pipeline_runs) == 2
+
+    commit = make_commit(
+        "c" * 40,
+        "Carol White",
+        datetime.datetime(2024, 2, 1, 10, tzinfo=CET),
+        {"src/other.py": (1, 0)},
+    )
+    state.sources["repo"].commits_map[commit.hexsha] = commit
+    open_state_store(config).save(state)
+
+    assert prepare() == {"Alice Canonical", "Bob Canonical", "Carol White"}
+    assert len(pipeline_runs) == 3
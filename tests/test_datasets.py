@@ -0,0 +1,163 @@
+import pandas
+import pandas.testing
+import pytest
+
+import codoscope.datasets
+from codoscope.datasets import (
+    BITBUCKET_SCHEMA,
+    COMMIT_FILES_SCHEMA,
+    COMMITS_SCHEMA,
+    JIRA_SCHEMA,
+    REVIEWS_SCHEMA,
+    Datasets,
+)
+from codoscope.exceptions import InvalidOperationError
+
+
+@pytest.mark.parametrize(
+    "name, schema",
+    [
+        ("commits", COMMITS_SCHEMA),
+        ("commit_files", COMMIT_FILES_SCHEMA),
+        ("bitbucket", BITBUCKET_SCHEMA),
+        ("jira", JIRA_SCHEMA),
+        ("reviews", REVIEWS_SCHEMA),
+    ],
+)
+def test_extracted_columns_types(state, name, schema):
+    df = Datasets.extract(state).get_all_data_frames()[name]
+
+    assert list(df.columns) == list(schema)
+    for column, dtype in schema.items():
+        if dtype == "category":
+            assert isinstance(df[column].dtype, pandas.CategoricalDtype), column
+        else:
+            assert df[column].dtype == pandas.api.types.pandas_dtype(dtype), column
+
+
+def test_activity_ids_are_unique(overlapping_state):
+    datasets = Datasets.extract(overlapping_state)
+
+    activity_df = datasets.get_activity()
+
+    assert activity_df["activity_id"].is_unique
+    assert len(activity_df) == sum(len(df) for df in datasets.get_activity_data_frames().values())
+
+
+def test_join_details_of_overlapping_sources(overlapping_state):
+    datasets = Datasets.extract(overlapping_state)
+    activity_df = datasets.get_activity()
+
+    df = datasets.join_details(
+        activity_df, ["bitbucket_pr_title", "bitbucket_repo_name", "commit_sha"]
+    )
+
+    assert len(df) == len(activity_df)
+    bitbucket_df = df[df["source_type"] == "bitbucket"]
+    assert dict(zip(bitbucket_df["bitbucket_pr_title"], bitbucket_df["bitbucket_repo_name"])) == {
+        "first PR": "repo",
+        "other first PR": "other-repo",
+    }
+    commits_df = df[df["activity_type"] == "commit"]
+    assert sorted(zip(commits_df["source_name"], commits_df["commit_sha"])) == [
+        ("fork", "a" * 40),
+        ("repo", "a" * 40),
+        ("repo", "b" * 40),
+    ]
+
+
+def test_join_details_rejects_duplicated_ids(state):
+    datasets = Datasets.extract(state)
+    datasets.bitbucket_df["activity_id"] = datasets.bitbucket_df["activity_id"].iloc[0]
+
+    with pytest.raises(InvalidOperationError):
+        datasets.get_activity(["bitbucket_pr_title"])
+
+
+@pytest.fixture
+def combine_calls(monkeypatch) -> list[int]:
+    """
+    Records the amount of the data frames every time the activity is combined.
+    """
+    calls: list[int] = []
+    unify_categories = codoscope.datasets.unify_categories
+
+    def spy(data_frames):
+        calls.append(len(data_frames))
+        return unify_categories(data_frames)
+
+    monkeypatch.setattr(codoscope.datasets, "unify_categories", spy)
+    return calls
+
+
+def test_combined_activity_is_memoized(state, combine_calls):
+    datasets = Datasets.extract(state)
+
+    first = datasets.get_activity()
+    second = datasets.get_activity(["commit_sha"])
+    datasets.get_all_activity()
+    datasets.get_all_activity()
+
+    # core columns and all the columns are combined once each
+    assert combine_calls == [3, 3]
+    pandas.testing.assert_frame_equal(second[first.columns], first)
+
+
+def test_combined_activity_is_rebuilt_after_reassignment(state, combine_calls):
+    datasets = Datasets.extract(state)
+    activity_df = datasets.get_activity()
+
+    datasets.jira_df = datasets.jira_df.iloc[0:0]
+    rebuilt_df = datasets.get_activity()
+
+    assert combine_calls == [3, 3]
+    assert "jira" in set(activity_df["source_type"])
+    assert "jira" not in set(rebuilt_df["source_type"])
+    assert len(rebuilt_df) == len(activity_df) - len(Datasets.extract(state).jira_df)
+
+
+def test_combined_activity_is_rebuilt_after_invalidate(state, combine_calls):
+    datasets = Datasets.extract(state)
+    datasets.get_activity()
+
+    # in place modification is not detected on its own
+    datasets.commits_df["user"] = pandas.Series(
+        "Someone Else", index=datasets.commits_df.index, dtype="category"
+    )
+    assert "Someone Else" not in set(datasets.get_activity()["user"])
+
+    datasets.invalidate()
+
+    assert "Someone Else" in set(datasets.get_activity()["user"])
+    assert combine_calls == [3, 3]
+
+
+def test_modified_activity_does_not_affect_memoized_one(state, combine_calls):
+    datasets = Datasets.extract(state)
+    expected_df = datasets.get_activity().copy(deep=True)
+
+    activity_df = datasets.get_activity()
+    activity_df["user"] = "Someone Else"
+    activity_df.iloc[0, activity_df.columns.get_loc("size_class")] = 100
+    activity_df.drop(columns=["user_email"], inplace=True)
+    all_activity_df = datasets.get_all_activity()
+    all_activity_df.loc[:, "timestamp"] = None
+
+    pandas.testing.assert_frame_equal(datasets.get_activity(), expected_df)
+    assert all_activity_df["timestamp"].isna().all()
+    assert datasets.get_all_activity()["timestamp"].notna().all()
+    assert combine_calls == [3, 3]
+
+
+def test_activity_keeps_values_of_non_categorical_columns(state):
+    datasets = Datasets.extract(state)
+    datasets.commits_df["user"] = "Someone Else"
+
+    activity_df = datasets.get_activity()
+
+    assert isinstance(activity_df["user"].dtype, pandas.CategoricalDtype)
+    commits_df = activity_df[activity_df["source_type"] == "git"]
+    assert set(commits_df["user"]) == {"Someone Else"}
+    assert activity_df["user"].notna().sum() == sum(
+        df["user"].notna().sum() for df in datasets.get_activity_data_frames().values()
+    )
@@ -0,0 +1,360 @@
+import datetime
+import os
+import subprocess
+
+import git
+import pytest
+
+from codoscope import core
+from codoscope.sources import git as git_source
+from codoscope.sources.git import RepoModel, ingest_git_repo
+from codoscope.state import StateModel
+from codoscope.state_store import SqliteStateStore
+
+BRANCHES = ["master", "feature"]
+
+
+class UpstreamRepo:
+    """
+    Repository the ingested clone is fetching from, commits are made with
+    the given dates (and timezones) by the given authors.
+    """
+
+    def __init__(self, path: str):
+        self.path: str = path
+        self.commands_count: int = 0
+        os.makedirs(path)
+        self.git("init", "--initial-branch=master")
+
+    def git(self, *args: str, author: str = "Alice Smith") -> str:
+        # every command is a day later, every other one in another timezone
+        self.commands_count += 1
+        timezone = datetime.timezone(datetime.timedelta(hours=1 if self.commands_count % 2 else -5))
+        date = datetime.datetime(2024, 1, 1, 10, tzinfo=timezone) + datetime.timedelta(
+            days=self.commands_count
+        )
+        env = dict(
+            os.environ,
+            GIT_AUTHOR_NAME=author,
+            GIT_AUTHOR_EMAIL="%s@example.com" % author.split()[0].lower(),
+            GIT_AUTHOR_DATE=date.isoformat(),
+            GIT_COMMITTER_NAME="Committer",
+            GIT_COMMITTER_EMAIL="committer@example.com",
+            GIT_COMMITTER_DATE=date.isoformat(),
+            GIT_CONFIG_NOSYSTEM="1",
+            GIT_CONFIG_GLOBAL=os.devnull,
+        )
+        return subprocess.run(
+            ["git", "-c", "commit.gpgsign=false", *args],
+            cwd=self.path,
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+
+    def commit(
+        self,
+        message: str,
+        files: dict[str, str | bytes | None],
+        author: str = "Alice Smith",
+    ) -> str:
+        for name, content in files.items():
+            file_path = os.path.join(self.path, name)
+            if content is None:
+                os.remove(file_path)
+                continue
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "wb" if isinstance(content, bytes) else "w") as f:
+                f.write(content)
+        self.git("add", "--all")
+        self.git("commit", "--allow-empty", "-m", message, author=author)
+        return self.git("rev-parse", "HEAD")
+
+
+def lines(prefix: str, count: int) -> str:
+    return "".join("%s %d\n" % (prefix, i) for i in range(count))
+
+
+@pytest.fixture
+def upstream(tmp_path) -> UpstreamRepo:
+    repo = UpstreamRepo(str(tmp_path / "upstream"))
+    repo.commit("initial commit", {"readme.md": lines("readme", 3), "src/main.py": lines("x", 5)})
+    repo.commit("add logo", {"logo.png": b"\x89PNG\x00\x01\x02"}, author="Bob Jones")
+    repo.git("branch", "feature")
+    repo.commit(
+        "update logo\n\nand main module,\tseparated by tab\n",
+        {"logo.png": b"\x89PNG\x00\x03", "src/main.py": lines("y", 4)},
+    )
+    repo.git("checkout", "feature")
+    repo.commit("add feature", {"src/feature.py": lines("f", 7)}, author="Bob Jones")
+    repo.commit("remove readme", {"readme.md": None, "src/feature.py": lines("g", 2)})
+    repo.commit("empty commit with ünicode", {}, author="Zoë Ünicode")
+    repo.git("checkout", "master")
+    repo.commit("change main", {"src/main.py": lines("z", 6)})
+    repo.git("merge", "--no-ff", "-m", "merge feature", "feature")
+    return repo
+
+
+@pytest.fixture
+def clone_path(upstream, tmp_path) -> str:
+    path = str(tmp_path / "clone")
+    git.Repo.clone_from(upstream.path, path)
+    return path
+
+
+@pytest.fixture
+def diffed_hexshas(monkeypatch) -> list[str]:
+    """
+    Records commits which diffs are computed by "git log".
+    """
+    result: list[str] = []
+    iter_git_log_records = git_source._iter_git_log_records
+
+    def record(repo, hexshas):
+        result.extend(hexshas)
+        return iter_git_log_records(repo, hexshas)
+
+    monkeypatch.setattr(git_source, "_iter_git_log_records", record)
+    return result
+
+
+@pytest.fixture
+def walked_revisions(monkeypatch) -> list[list[str]]:
+    """
+    Records revisions of every history walk.
+    """
+    result: list[list[str]] = []
+    iter_new_commit_records = git_source._iter_new_commit_records
+
+    def record(repo, revisions, known_hexshas):
+        result.append(list(revisions))
+        return iter_new_commit_records(repo, revisions, known_hexshas)
+
+    monkeypatch.setattr(git_source, "_iter_new_commit_records", record)
+    return result
+
+
+def ingest(clone_path: str, repo_state: RepoModel | None = None, **config) -> RepoModel:
+    return ingest_git_repo(config, repo_state, clone_path, BRANCHES)
+
+
+def get_remote_hexshas(clone_path: str) -> set[str]:
+    repo = git.Repo(clone_path)
+    return {
+        commit.hexsha
+        for branch in BRANCHES
+        for commit in repo.iter_commits("refs/remotes/origin/%s" % branch)
+    }
+
+
+def assert_matches_gitpython(clone_path: str, repo_state: RepoModel) -> None:
+    repo = git.Repo(clone_path)
+    assert set(repo_state.commits_map) == get_remote_hexshas(clone_path)
+    for hexsha, commit in repo_state.commits_map.items():
+        expected = repo.commit(hexsha)
+        assert commit.hexsha == expected.hexsha
+        assert commit.author_name == expected.author.name
+        assert commit.author_email == expected.author.email
+        assert commit.message == expected.message
+        assert commit.parent_hexsha == [x.hexsha for x in expected.parents]
+        for actual_date, expected_date in [
+            (commit.committed_datetime, expected.committed_datetime),
+            (commit.authored_datetime, expected.authored_datetime),
+        ]:
+            assert actual_date == expected_date
+            assert actual_date.utcoffset() == expected_date.utcoffset()
+        assert {
+            path: (stat.insertions, stat.deletions)
+            for path, stat in commit.stats.changed_files.items()
+        } == {
+            path: (stat["insertions"], stat["deletions"])
+            for path, stat in expected.stats.files.items()
+        }, hexsha
+
+
+def test_ingested_commits_match_gitpython(upstream, clone_path, diffed_hexshas, walked_revisions):
+    repo_state = ingest(clone_path)
+
+    assert_matches_gitpython(clone_path, repo_state)
+    repo = git.Repo(clone_path)
+    assert repo_state.ref_tips == {
+        "refs/remotes/origin/%s" % branch: repo.commit("origin/%s" % branch).hexsha
+        for branch in BRANCHES
+    }
+    # history shared by the branches is walked and diffed once
+    assert walked_revisions == [[repo_state.ref_tips[x] for x in sorted(repo_state.ref_tips)]]
+    assert sorted(diffed_hexshas) == sorted(repo_state.commits_map)
+
+    merge = repo_state.commits_map[repo.commit("origin/master").hexsha]
+    assert len(merge.parent_hexsha) == 2
+    # merges are compared to the first parent
+    assert {path: stat.deletions for path, stat in merge.stats.changed_files.items()} == {
+        "readme.md": 3,
+        "src/feature.py": 0,
+    }
+    logo_commit = repo_state.commits_map[repo.commit("origin/master~2").hexsha]
+    assert logo_commit.message == "update logo\n\nand main module,\tseparated by tab\n"
+    # binary files have no line counts
+    logo_stat = logo_commit.stats.changed_files["logo.png"]
+    assert (logo_stat.insertions, logo_stat.deletions) == (0, 0)
+
+
+def test_incremental_ingestion_walks_only_new_commits(
+    upstream, clone_path, diffed_hexshas, walked_revisions
+):
+    repo_state = ingest(clone_path)
+    ingested_hexshas = set(repo_state.commits_map)
+    old_hexsha = repo_state.ref_tips["refs/remotes/origin/master"]
+    upstream.commit("change main again", {"src/main.py": lines("w", 2)})
+    new_hexsha = upstream.commit("add docs", {"docs/index.md": lines("doc", 2)})
+    diffed_hexshas.clear()
+    walked_revisions.clear()
+
+    ingest(clone_path, repo_state)
+
+    # walk is bounded by the previous tip, up to date feature is not walked
+    assert walked_revisions == [[new_hexsha, "^" + old_hexsha]]
+    assert len(diffed_hexshas) == 2
+    assert set(diffed_hexshas) == set(repo_state.commits_map) - ingested_hexshas
+    assert repo_state.ref_tips["refs/remotes/origin/master"] == new_hexsha
+    assert_matches_gitpython(clone_path, repo_state)
+
+    # nothing is walked when the branches are up to date
+    diffed_hexshas.clear()
+    walked_revisions.clear()
+    ingest(clone_path, repo_state)
+    assert walked_revisions == []
+    assert diffed_hexshas == []
+
+
+def test_rewritten_history_is_walked_fully(upstream, clone_path, diffed_hexshas, walked_revisions):
+    repo_state = ingest(clone_path)
+    old_feature_tip = repo_state.ref_tips["refs/remotes/origin/feature"]
+
+    # feature branch is force-pushed with another history
+    upstream.git("checkout", "feature")
+    upstream.git("reset", "--hard", "feature~2")
+    new_feature_tip = upstream.commit("rewrite feature", {"src/feature.py": lines("h", 3)})
+    upstream.git("checkout", "master")
+    diffed_hexshas.clear()
+    walked_revisions.clear()
+
+    ingest(clone_path, repo_state)
+
+    assert walked_revisions == [[new_feature_tip]]
+    assert repo_state.ref_tips["refs/remotes/origin/feature"] == new_feature_tip
+    assert old_feature_tip in repo_state.commits_map
+    # commits ingested before the rewrite are not diffed again
+    assert diffed_hexshas == [new_feature_tip]
+    assert set(repo_state.commits_map) >= get_remote_hexshas(clone_path)
+
+
+def test_unknown_ref_tip_is_walked_fully(upstream, clone_path, diffed_hexshas, walked_revisions):
+    repo_state = ingest(clone_path)
+    new_hexsha = upstream.commit("change main again", {"src/main.py": lines("w", 2)})
+    # tip commit could be garbage collected after the history rewrite
+    repo_state.ref_tips["refs/remotes/origin/master"] = "0" * 40
+    del repo_state.commits_map[git.Repo(clone_path).commit("origin/master").hexsha]
+    diffed_hexshas.clear()
+    walked_revisions.clear()
+
+    ingest(clone_path, repo_state)
+
+    assert walked_revisions == [[new_hexsha]]
+
+    assert len(diffed_hexshas) == 2
+    assert new_hexsha in diffed_hexshas
+    assert repo_state.ref_tips["refs/remotes/origin/master"] == new_hexsha
+    assert_matches_gitpython(clone_path, repo_state)
+
+
+def test_checkpoint_every_n_commits(upstream, clone_path):
+    checkpoints = []
+
+    def checkpoint(repo_state: RepoModel) -> None:
+        checkpoints.append((len(repo_state.commits_map), dict(repo_state.ref_tips)))
+
+    repo_state = ingest_git_repo(
+        {"checkpoint-commits": 3}, None, clone_path, BRANCHES, checkpoint=checkpoint
+    )
+
+    # tips are only updated once the whole history is ingested
+    assert checkpoints == [(3, {}), (6, {})]
+    assert len(repo_state.commits_map) == 8
+    assert len(repo_state.ref_tips) == 2
+
+
+def test_checkpoint_every_interval(upstream, clone_path):
+    checkpoints = []
+
+    def checkpoint(repo_state: RepoModel) -> None:
+        checkpoints.append(len(repo_state.commits_map))
+
+    ingest_git_repo({"checkpoint-interval": 0}, None, clone_path, BRANCHES, checkpoint=checkpoint)
+
+    assert checkpoints == list(range(1, 9))
+
+
+class IngestionInterrupted(Exception):
+    pass
+
+
+class InterruptingStateStore(SqliteStateStore):
+    def __init__(self, path: str, interrupt_after: int) -> None:
+        super().__init__(path)
+        self.interrupt_after: int = interrupt_after
+        self.checkpoints_count: int = 0
+
+    def checkpoint(self, state: StateModel, source_name: str) -> None:
+        super().checkpoint(state, source_name)
+        self.checkpoints_count += 1
+        if self.checkpoints_count >= self.interrupt_after:
+            raise IngestionInterrupted()
+
+
+def test_interrupted_ingestion_resumes_from_checkpoint(
+    upstream, clone_path, tmp_path, diffed_hexshas, monkeypatch
+):
+    parsed_hexshas = []
+    parse_git_log_record = git_source._parse_git_log_record
+
+    def record_parsed(record: str):
+        commit = parse_git_log_record(record)
+        parsed_hexshas.append(commit.hexsha)
+        return commit
+
+    monkeypatch.setattr(git_source, "_parse_git_log_record", record_parsed)
+    path = str(tmp_path / "state.sqlite")
+    config = {
+        "sources": [
+            {
+                "name": "repo",
+                "type": "git",
+                "path": clone_path,
+                "branches": BRANCHES,
+                "checkpoint-commits": 1,
+            }
+        ]
+    }
+
+    # ingestion failure is logged
+    core.ingest(config, StateModel(), InterruptingStateStore(path, interrupt_after=3))
+
+    state = SqliteStateStore(path).load()
+    assert state is not None
+    assert list(state.sources["repo"].commits_map) == parsed_hexshas
+    assert len(parsed_hexshas) == 3
+    assert state.sources["repo"].ref_tips == {}
+
+    diffed_hexshas.clear()
+    core.ingest(config, state, SqliteStateStore(path))
+
+    # checkpointed commits are not diffed again
+    assert set(diffed_hexshas).isdisjoint(parsed_hexshas[:3])
+    assert len(parsed_hexshas) == 8
+    assert len(set(parsed_hexshas)) == 8
+    resumed_state = SqliteStateStore(path).load()
+    assert resumed_state is not None
+    assert len(resumed_state.sources["repo"].ref_tips) == 2
+    assert_matches_gitpython(clone_path, resumed_state.sources["repo"])
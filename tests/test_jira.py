@@ -0,0 +1,194 @@
+import datetime
+import re
+
+import pytest
+import requests
+from fake_jira import FakeJira, make_issue
+
+from codoscope.sources.jira import JiraState, ingest_jira
+
+# comments and histories counts of the issues (3 of them are inlined, pages
+# of 4 are fetched separately), the last issue is the last updated one
+ISSUES = [
+    (0, 0),
+    (2, 2),
+    (10, 1),
+    (8, 11),
+    (3, 3),
+    (4, 4),
+    (1, 8),
+    (5, 0),
+    (0, 6),
+    (7, 2),
+    (2, 5),
+    (12, 1),
+    (0, 0),
+    (6, 11),
+]
+
+
+@pytest.fixture
+def fake_jira():
+    fake = FakeJira(
+        [
+            make_issue(issue_id, comments_count, histories_count)
+            for issue_id, (comments_count, histories_count) in enumerate(ISSUES, start=1)
+        ]
+    )
+    fake.start()
+    yield fake
+    fake.stop()
+
+
+def make_config(fake: FakeJira, **options) -> dict:
+    return {
+        "url": fake.url,
+        "username": "user",
+        "password": "pass",
+        "cloud": True,
+        "jql-query-limit": 10,
+        **options,
+    }
+
+
+def parse_datetime(value: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(value)
+
+
+def describe_state(state: JiraState) -> dict:
+    return {
+        item_id: (
+            item.key,
+            item.summary,
+            item.creator.account_id,
+            [
+                (x.comment_id, x.created_by.account_id, x.message, x.created_on)
+                for x in item.comments
+            ],
+            [
+                (x.actor.account_id, x.created_on, x.field, x.from_value, x.to_value)
+                for x in item.change_log
+            ],
+            item.updated_on,
+        )
+        for item_id, item in state.items_map.items()
+    }
+
+
+def describe_fake(fake: FakeJira) -> dict:
+    return {
+        issue_id: (
+            data["key"],
+            data["fields"]["summary"],
+            data["fields"]["creator"]["accountId"],
+            [
+                (x["id"], x["author"]["accountId"], x["body"], parse_datetime(x["created"]))
+                for x in data["_comments"]
+            ],
+            [
+                (
+                    history["author"]["accountId"],
+                    parse_datetime(history["created"]),
+                    item["field"],
+                    item["fromString"],
+                    item["toString"],
+                )
+                for history in data["_histories"]
+                for item in history["items"]
+                if item["field"] == "status"
+            ],
+            parse_datetime(data["fields"]["updated"]),
+        )
+        for issue_id, data in fake.issues.items()
+    }
+
+
+def get_last_updated_on(fake: FakeJira) -> datetime.datetime:
+    return max(parse_datetime(x["fields"]["updated"]) for x in fake.issues.values())
+
+
+def delay_first_issues(path: str) -> float:
+    # comments of the issues listed first take longest to fetch, so that the
+    # fetches complete out of order
+    m = re.search(r"/issue/1(\d+)/", path)
+    return 0.002 * (len(ISSUES) - int(m[1])) if m else 0.0
+
+
+def test_truncated_change_log_is_fetched_in_pages(fake_jira):
+    state = ingest_jira(make_config(fake_jira), None)
+
+    assert describe_state(state) == describe_fake(fake_jira)
+    # 11 histories are fetched in pages of 4, 4 and 3
+    assert fake_jira.count_requests(r"/issue/10004/changelog$") == 3
+    assert fake_jira.count_requests(r"/issue/10014/changelog$") == 3
+    # change logs which are not truncated are not fetched
+    assert fake_jira.count_requests(r"/issue/10002/changelog$") == 0
+    assert fake_jira.count_requests(r"/issue/10005/changelog$") == 0
+    assert all(item.change_log_updated_on == item.updated_on for item in state.items_map.values())
+
+
+def test_unchanged_issue_change_log_is_not_fetched_again(fake_jira):
+    config = make_config(fake_jira)
+    state = ingest_jira(config, None)
+    fake_jira.update_issue("10004", new_histories_count=2)
+    fake_jira.requests.clear()
+
+    ingest_jira(config, state)
+
+    # the last updated issue is listed again by the cutoff date filter, but
+    # its change log is kept since the issue is not updated
+    assert fake_jira.count_requests(r"/issue/10014/comment$") == 2
+    assert fake_jira.count_requests(r"/issue/10014/changelog$") == 0
+    assert fake_jira.count_requests(r"/issue/10004/changelog$") == 4
+    assert describe_state(state) == describe_fake(fake_jira)
+    assert len(state.items_map["10004"].change_log) == 7
+    assert state.items_map["10014"].change_log_updated_on == state.items_map["10014"].updated_on
+    assert state.cutoff_date == get_last_updated_on(fake_jira)
+
+
+def test_truncated_comments_are_backfilled(fake_jira):
+    state = ingest_jira(make_config(fake_jira), None)
+
+    assert describe_state(state) == describe_fake(fake_jira)
+    assert len(state.items_map["10003"].comments) == 10
+    # 8 comments need another (empty) page to find out there are no more
+    assert fake_jira.count_requests(r"/issue/10003/comment$") == 3
+    assert fake_jira.count_requests(r"/issue/10004/comment$") == 3
+    # inlined comments are not fetched again
+    assert fake_jira.count_requests(r"/issue/10005/comment$") == 0
+    assert state.cutoff_date == get_last_updated_on(fake_jira)
+
+
+def test_concurrent_ingestion_matches_sequential(fake_jira):
+    sequential_state = ingest_jira(make_config(fake_jira, **{"max-concurrency": 1}), None)
+    fake_jira.max_concurrent_count = 0
+    fake_jira.latency = delay_first_issues
+
+    state = ingest_jira(make_config(fake_jira), None)
+
+    assert fake_jira.max_concurrent_count > 1
+    assert describe_state(state) == describe_state(sequential_state)
+    assert describe_state(state) == describe_fake(fake_jira)
+    assert list(state.items_map) == list(sequential_state.items_map)
+    assert state.cutoff_date == sequential_state.cutoff_date
+
+
+def test_failed_comments_fetch_keeps_cutoff_date(fake_jira):
+    config = make_config(fake_jira)
+    state = ingest_jira(config, None)
+    cutoff_date = state.cutoff_date
+    fake_jira.update_issue("10003", new_comments_count=2)
+    fake_jira.update_issue("10012", new_comments_count=1)
+    fake_jira.failing_paths.add("/rest/api/2/issue/10012/comment")
+
+    with pytest.raises(requests.HTTPError):
+        ingest_jira(config, state)
+
+    assert state.cutoff_date == cutoff_date
+
+    # next ingestion fetches the updated issues again
+    fake_jira.failing_paths.clear()
+    ingest_jira(config, state)
+
+    assert describe_state(state) == describe_fake(fake_jira)
+    assert state.cutoff_date == get_last_updated_on(fake_jira)
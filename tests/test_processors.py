@@ -0,0 +1,114 @@
+import re
+
+import pandas
+
+from codoscope import core
+from codoscope.datasets import Datasets
+from codoscope.processors.expand_references import (
+    ExpandReferencesProcessor,
+    ReferencesExpander,
+)
+from codoscope.state_store import open_state_store
+from codoscope.tools.discover_aliases import discover_aliases
+
+REMAP_USERS_CONFIG = {
+    "name": "remap-users",
+    "type": "remap-users",
+    "canonical-names": {
+        "Alice Canonical": [{"email": "alice@example.com"}],
+    },
+}
+
+
+def test_unused_processors_are_skipped(state):
+    datasets = Datasets.extract(state)
+    config = {"processors": [REMAP_USERS_CONFIG], "reports": []}
+
+    core.run_processors(config, datasets)
+
+    assert "Alice Canonical" not in set(datasets.commits_df["user"])
+
+
+def test_unused_processors_are_run_on_demand(state):
+    datasets = Datasets.extract(state)
+    config = {"processors": [REMAP_USERS_CONFIG], "reports": []}
+
+    core.run_processors(config, datasets, skip_unused=False)
+
+    assert "Alice Canonical" in set(datasets.commits_df["user"])
+    assert "Alice Smith" not in set(datasets.commits_df["user"])
+
+
+def test_discover_aliases_runs_all_processors(state, tmp_path, capsys):
+    config = {
+        "state-path": str(tmp_path / "state.sqlite"),
+        "state-backend": "sqlite",
+        "processors": [REMAP_USERS_CONFIG],
+    }
+    open_state_store(config).save(state)
+
+    discover_aliases(config)
+
+    # commits are attributed to the remapped name, so it is associated with
+    # the email rather than the original name
+    output = capsys.readouterr().out
+    assert "Alice Canonical:\n- email: alice@example.com\n" in output
+
+
+def test_references_are_expanded(state):
+    datasets = Datasets.extract(state)
+    comments_before = list(datasets.bitbucket_df["bitbucket_pr_comment"].dropna())
+
+    rows_touched = ExpandReferencesProcessor({}).execute(datasets)
+
+    assert list(datasets.jira_df["jira_description"].dropna().unique()) == [
+        "reported by (Bob Jones)"
+    ]
+    # mentions of unknown accounts are kept
+    assert set(datasets.bitbucket_df["bitbucket_pr_description"].dropna()) == {
+        "description of first PR, cc @Bob Jones @{acc-unknown}",
+        "description of second PR, cc @Bob Jones @{acc-unknown}",
+    }
+    assert list(datasets.bitbucket_df["bitbucket_pr_comment"].dropna()) == comments_before
+    assert rows_touched == datasets.jira_df["jira_description"].notna().sum() + (
+        datasets.bitbucket_df["bitbucket_pr_description"].notna().sum()
+    )
+
+
+class RecordingPattern:
+    def __init__(self, pattern: re.Pattern) -> None:
+        self.pattern: re.Pattern = pattern
+        self.values: list[str] = []
+
+    def sub(self, replacer, value: str) -> str:
+        self.values.append(value)
+        return self.pattern.sub(replacer, value)
+
+
+def test_references_expander_skips_rows_without_marker():
+    expander = ReferencesExpander(
+        marker="@{",
+        pattern=r"@\{([^}]+)}",
+        template="@%s",
+        display_names={"acc-alice": "Alice Smith"},
+    )
+    pattern = expander.pattern = RecordingPattern(expander.pattern)
+    # duplicate index labels are expected after concatenation
+    series = pandas.Series(
+        ["hi @{acc-alice}", "no mentions", None, "email@{x} and @{acc-alice}"],
+        index=[0, 0, 1, 2],
+        dtype="string",
+    )
+
+    expanded = expander.expand(series)
+
+    assert pattern.values == ["hi @{acc-alice}", "email@{x} and @{acc-alice}"]
+    assert list(expanded.fillna("<NA>")) == [
+        "hi @Alice Smith",
+        "no mentions",
+        "<NA>",
+        "email@{x} and @Alice Smith",
+    ]
+    assert list(expanded.index) == [0, 0, 1, 2]
+    assert expanded.dtype == series.dtype
+    assert (expander.replacements, expander.rows_touched) == (2, 2)
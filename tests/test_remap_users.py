@@ -0,0 +1,102 @@
+import pandas
+
+from codoscope.processors.remap_users import RemapUsersProcessor
+
+PROCESSOR = RemapUsersProcessor(
+    {
+        "name": "remap-users",
+        "type": "remap-users",
+        "canonical-names": {
+            "Alice Canonical": [{"email": "alice@example.com"}, {"name": "alice"}],
+            "Bob Canonical": [{"email": "bob@example.com"}, {"name": "Bobby"}],
+        },
+    }
+)
+
+
+def make_activity_df(users_and_emails: list[tuple[str | None, str | None]]) -> pandas.DataFrame:
+    return pandas.DataFrame(
+        {
+            "user": pandas.Series([x for x, _ in users_and_emails], dtype="category"),
+            "user_email": pandas.Series([x for _, x in users_and_emails], dtype="string"),
+        }
+    )
+
+
+def make_reviews_df(
+    reviewers_and_reviewees: list[tuple[str | None, str | None]],
+) -> pandas.DataFrame:
+    return pandas.DataFrame(
+        {
+            "reviewer_user": pandas.Series([x for x, _ in reviewers_and_reviewees], dtype="string"),
+            "reviewee_user": pandas.Series([x for _, x in reviewers_and_reviewees], dtype="string"),
+        }
+    )
+
+
+def test_activity_is_remapped_by_email():
+    activity_df = make_activity_df(
+        [("Alice Smith", "alice@example.com"), ("Carol", "carol@example.com")]
+    )
+
+    assert PROCESSOR.remap_activity("commits", activity_df) == 1
+    assert list(activity_df["user"]) == ["Alice Canonical", "Carol"]
+    assert isinstance(activity_df["user"].dtype, pandas.CategoricalDtype)
+
+
+def test_activity_is_remapped_by_name_without_mapped_email():
+    activity_df = make_activity_df(
+        [("alice", None), ("alice", "alice@other.com"), ("Bobby", None), ("Carol", None)]
+    )
+
+    assert PROCESSOR.remap_activity("jira", activity_df) == 3
+    assert list(activity_df["user"]) == [
+        "Alice Canonical",
+        "Alice Canonical",
+        "Bob Canonical",
+        "Carol",
+    ]
+
+
+def test_activity_email_takes_priority_over_name():
+    # the name is mapped to the other canonical name
+    activity_df = make_activity_df([("Bobby", "alice@example.com"), ("alice", "bob@example.com")])
+
+    assert PROCESSOR.remap_activity("bitbucket", activity_df) == 2
+    assert list(activity_df["user"]) == ["Alice Canonical", "Bob Canonical"]
+
+
+def test_activity_without_matches_is_kept():
+    activity_df = make_activity_df([("Carol", "carol@example.com"), (None, None)])
+
+    assert PROCESSOR.remap_activity("commits", activity_df) == 0
+    assert list(activity_df["user"].astype(object).fillna("")) == ["Carol", ""]
+
+
+def test_reviews_are_remapped_in_both_user_columns():
+    reviews_df = make_reviews_df(
+        [
+            ("alice", "Bobby"),
+            ("alice", "Carol"),
+            ("Carol", "Bobby"),
+            ("Carol", "Dave"),
+            (None, "alice"),
+        ]
+    )
+
+    # the rows are counted once even if both users are remapped
+    assert PROCESSOR.remap_reviews(reviews_df) == 4
+    assert list(reviews_df["reviewer_user"].fillna("")) == [
+        "Alice Canonical",
+        "Alice Canonical",
+        "Carol",
+        "Carol",
+        "",
+    ]
+    assert list(reviews_df["reviewee_user"]) == [
+        "Bob Canonical",
+        "Carol",
+        "Bob Canonical",
+        "Dave",
+        "Alice Canonical",
+    ]
@@ -0,0 +1,54 @@
+import pandas
+import pandas.testing
+
+from codoscope.datasets import Datasets
+from codoscope.snapshot import load_snapshot, save_snapshot
+
+
+def get_data_frames(datasets: Datasets) -> dict[str, pandas.DataFrame]:
+    return dict(
+        datasets.get_all_data_frames(),
+        jira_users=datasets.jira_users_df,
+        bitbucket_users=datasets.bitbucket_users_df,
+    )
+
+
+def test_snapshot_round_trip(state, tmp_path):
+    datasets = Datasets.extract(state)
+    path = str(tmp_path / "snapshot")
+
+    save_snapshot(datasets, path, "fingerprint")
+    loaded = load_snapshot(path, "fingerprint")
+
+    assert loaded is not None
+    expected_data_frames = get_data_frames(datasets)
+    loaded_data_frames = get_data_frames(loaded)
+    for name, expected_df in expected_data_frames.items():
+        pandas.testing.assert_frame_equal(
+            loaded_data_frames[name], expected_df, check_index_type=True, obj=name
+        )
+
+
+def test_snapshot_restores_timezones(state, tmp_path):
+    datasets = Datasets.extract(state)
+    path = str(tmp_path / "snapshot")
+
+    save_snapshot(datasets, path, "fingerprint")
+    loaded = load_snapshot(path, "fingerprint")
+
+    assert loaded is not None
+    for name, df in datasets.get_activity_data_frames().items():
+        expected = [(x, x.utcoffset()) if x is not None else None for x in df["timestamp"]]
+        actual = [
+            (x, x.utcoffset()) if x is not None else None
+            for x in loaded.get_activity_data_frames()[name]["timestamp"]
+        ]
+        assert actual == expected, name
+
+
+def test_snapshot_fingerprint_mismatch(state, tmp_path):
+    path = str(tmp_path / "snapshot")
+
+    save_snapshot(Datasets.extract(state), path, "fingerprint")
+
+    assert load_snapshot(path, "other") is None
@@ -0,0 +1,221 @@
+import datetime
+import pathlib
+import shutil
+import sqlite3
+
+import pandas.testing
+import pytest
+from conftest import CET, make_commit
+
+from codoscope.datasets import Datasets
+from codoscope.exceptions import InvalidOperationError
+from codoscope.state import SourceType, StateModel
+from codoscope.state_store import PickleStateStore, SqliteStateStore
+
+
+def get_chunks(path: str) -> dict[str, list[tuple[int, int]]]:
+    """
+    Returns (seq, items count) of the saved chunks by source name.
+    """
+    connection = sqlite3.connect(path)
+    try:
+        result: dict[str, list[tuple[int, int]]] = {}
+        for source_name, seq, items_count in connection.execute(
+            "SELECT source_name, seq, items_count FROM chunks ORDER BY source_name, seq"
+        ):
+            result.setdefault(source_name, []).append((seq, items_count))
+        return result
+    finally:
+        connection.close()
+
+
+def add_commits(state, count: int) -> None:
+    repo = state.sources["repo"]
+    for _ in range(count):
+        hexsha = "%040x" % (len(repo.commits_map) + 100)
+        repo.commits_map[hexsha] = make_commit(
+            hexsha,
+            "Carol White",
+            datetime.datetime(2024, 2, 1, 10, tzinfo=CET)
+            + datetime.timedelta(hours=len(repo.commits_map)),
+            {"src/other.py": (1, 0)},
+        )
+
+
+def assert_same_datasets(actual, expected) -> None:
+    expected_data_frames = Datasets.extract(expected).get_all_data_frames()
+    actual_data_frames = Datasets.extract(actual).get_all_data_frames()
+    assert set(actual_data_frames) == set(expected_data_frames)
+    for name, expected_df in expected_data_frames.items():
+        pandas.testing.assert_frame_equal(actual_data_frames[name], expected_df, obj=name)
+
+
+def test_sqlite_round_trip(state, tmp_path):
+    path = str(tmp_path / "state.sqlite")
+
+    SqliteStateStore(path).save(state)
+    loaded = SqliteStateStore(path).load()
+
+    assert loaded is not None
+    assert loaded.created_at == state.created_at
+    assert set(loaded.sources) == set(state.sources)
+    for name, source in state.sources.items():
+        assert [key for key, _, _ in loaded.sources[name].iter_items()] == [
+            key for key, _, _ in source.iter_items()
+        ]
+    assert loaded.sources["jira"].users_map.keys() == state.sources["jira"].users_map.keys()
+    assert_same_datasets(loaded, state)
+
+
+def test_sqlite_save_appends_only_changed_items(state, tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    store = SqliteStateStore(path)
+    store.save(state)
+    chunks_before = get_chunks(path)
+    fingerprint_before = store.get_fingerprint()
+
+    # nothing is written when nothing changed
+    store.save(state)
+    assert get_chunks(path) == chunks_before
+    assert store.get_fingerprint() == fingerprint_before
+
+    add_commits(state, 3)
+    store.save(state)
+
+    chunks = get_chunks(path)
+    assert chunks["repo"] == chunks_before["repo"] + [(2, 3)]
+    assert {k: v for k, v in chunks.items() if k != "repo"} == {
+        k: v for k, v in chunks_before.items() if k != "repo"
+    }
+    assert store.get_fingerprint() != fingerprint_before
+
+    loaded = SqliteStateStore(path).load()
+    assert loaded is not None
+    assert list(loaded.sources["repo"].commits_map) == list(state.sources["repo"].commits_map)
+
+
+def test_sqlite_compaction_keeps_all_items(state, tmp_path, monkeypatch):
+    monkeypatch.setattr(SqliteStateStore, "CHUNK_SIZE", 10)
+    monkeypatch.setattr(SqliteStateStore, "MAX_CHUNKS_PER_SOURCE", 4)
+    path = str(tmp_path / "state.sqlite")
+    store = SqliteStateStore(path)
+    store.save(state)
+
+    for _ in range(3):
+        add_commits(state, 1)
+        store.save(state)
+    assert get_chunks(path)["repo"] == [(1, 2), (2, 1), (3, 1), (4, 1)]
+
+    # one more chunk would exceed the limit, so all items are rewritten
+    add_commits(state, 1)
+    store.save(state)
+    assert get_chunks(path)["repo"] == [(1, 6)]
+
+    loaded = SqliteStateStore(path).load()
+    assert loaded is not None
+    assert list(loaded.sources["repo"].commits_map) == list(state.sources["repo"].commits_map)
+    assert_same_datasets(loaded, state)
+
+
+def test_sqlite_load_source_types(state, tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    SqliteStateStore(path).save(state)
+
+    loaded = SqliteStateStore(path).load(source_types=[SourceType.GIT, SourceType.JIRA])
+
+    assert loaded is not None
+    assert set(loaded.sources) == {"repo", "jira"}
+    assert list(loaded.sources["repo"].commits_map) == list(state.sources["repo"].commits_map)
+    assert list(loaded.sources["jira"].items_map) == list(state.sources["jira"].items_map)
+
+
+def test_sqlite_newer_format_version_is_rejected(state, tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    SqliteStateStore(path).save(state)
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute(
+            "UPDATE meta SET value = ? WHERE key = 'format_version'",
+            (str(SqliteStateStore.FORMAT_VERSION + 1),),
+        )
+    connection.close()
+
+    with pytest.raises(InvalidOperationError):
+        SqliteStateStore(path).load()
+
+
+# pickled by the version of codoscope from before the actors registries (and
+# slotted models) with "StateModel.save" of the state alike "state" fixture
+BASELINE_STATE_PATH = pathlib.Path(__file__).parent / "fixtures" / "baseline-state.pickle.gz"
+
+
+def load_baseline_state(tmp_path) -> StateModel:
+    path = str(tmp_path / "state.pickle.gz")
+    shutil.copy(BASELINE_STATE_PATH, path)
+    state = PickleStateStore(path).load()
+    assert state is not None
+    return state
+
+
+def assert_actors_registered(state: StateModel) -> None:
+    bitbucket_state = state.sources["bitbucket"]
+    assert bitbucket_state.version == 2
+    assert {x.account_id for x in bitbucket_state.actors} == {"acc-alice", "acc-bob"}
+    pr = bitbucket_state.projects_map["project"].repositories_map["repo"].pull_requests_map[1]
+    actors = bitbucket_state.actors
+    assert actors.intern(pr.author) is pr.author
+    assert actors.intern(pr.commentaries[0].author) is pr.commentaries[0].author
+    assert pr.participants[0].user is pr.commentaries[0].author
+    assert pr.participants[1].user is pr.author
+
+    jira_state = state.sources["jira"]
+    assert jira_state.version == 3
+    assert {x.account_id for x in jira_state.actors} == {"acc-alice", "acc-bob"}
+    item = jira_state.items_map["10001"]
+    actors = jira_state.actors
+    assert actors.intern(item.creator) is item.creator
+    assert actors.intern(item.comments[0].created_by) is item.comments[0].created_by
+    assert item.reporter is item.creator
+    assert item.assignee is item.comments[0].created_by
+    assert item.change_log[0].actor is item.comments[0].created_by
+
+
+def test_baseline_pickle_actors_are_registered(tmp_path):
+    state = load_baseline_state(tmp_path)
+
+    assert_actors_registered(state)
+
+
+def test_baseline_pickle_actors_are_kept_by_sqlite(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    SqliteStateStore(path).save(load_baseline_state(tmp_path))
+
+    loaded = SqliteStateStore(path).load()
+
+    assert loaded is not None
+    assert_actors_registered(loaded)
+    assert_same_datasets(loaded, load_baseline_state(tmp_path))
+
+
+def test_baseline_pickle_models_get_defaults(tmp_path):
+    state = load_baseline_state(tmp_path)
+
+    repo = state.sources["repo"]
+    assert repo.ref_tips == {}
+    commit = repo.commits_map["b" * 40]
+    assert not hasattr(commit, "__dict__")
+    assert commit.parent_hexsha == ["a" * 40]
+    assert commit.stats.changed_files["src/main.py"].deletions == 1
+
+    repo_state = state.sources["bitbucket"].projects_map["project"].repositories_map["repo"]
+    pr = repo_state.pull_requests_map[1]
+    assert not hasattr(pr, "__dict__")
+    assert pr.comments_updated_on is None
+    assert pr.title == "first PR"
+    assert pr.commentaries[0].message == "comment"
+
+    item = state.sources["jira"].items_map["10001"]
+    assert not hasattr(item, "__dict__")
+    assert item.change_log_updated_on is None
+    assert item.summary == "first bug"
+    assert item.change_log[0].to_value == "Done"